@@ -64,6 +64,19 @@ IPTABLES_OPTS = [
                        "generated iptables rules that describe each rule's "
                        "purpose. System must support the iptables comments "
                        "module for addition of comments.")),
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_("Keep the iptables rules applied by the agent in "
+                       "memory and, as long as only the chains of the agent "
+                       "change, send iptables-restore the changes to them "
+                       "without reading the current rules with "
+                       "iptables-save first. The current rules are still "
+                       "read when the built-in or shared chains change, "
+                       "every iptables_resync_interval seconds and after a "
+                       "failure.")),
+    cfg.IntOpt('iptables_resync_interval', default=300,
+               help=_("Seconds after which the iptables rules kept in "
+                      "memory by iptables_incremental_apply are compared "
+                      "with the current rules again.")),
 ]
 
 PROCESS_MONITOR_OPTS = [
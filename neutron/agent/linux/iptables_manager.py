@@ -24,6 +24,7 @@ import difflib
 import os
 import re
 import sys
+import time
 
 from oslo_concurrency import lockutils
 from oslo_config import cfg
@@ -308,6 +309,9 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        # The rules of each table last applied, by command, with the time
+        # they were last read with iptables-save, when applying incrementally
+        self._applied_rules = {}
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -488,6 +492,68 @@ class IptablesManager(object):
             args = ['ip', 'netns', 'exec', self.namespace] + args
         return self.execute(args, run_as_root=True).split('\n')
 
+    def _get_applied_rules(self, cmd):
+        """Return the time and the rules by table last applied with cmd.
+
+        None is returned, and the current rules have to be read with
+        iptables-save, unless incremental apply is enabled and the rules
+        were read less than iptables_resync_interval seconds ago.
+        """
+        if not cfg.CONF.AGENT.iptables_incremental_apply:
+            return
+        applied = self._applied_rules.get(cmd)
+        if applied and (time.time() - applied[0] <
+                        cfg.CONF.AGENT.iptables_resync_interval):
+            return applied
+
+    def _get_current_rules(self, cmd, tables):
+        """Read the current rules of tables with iptables-save, by table."""
+        args = ['%s-save' % (cmd,)]
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        save_output = self.execute(args, run_as_root=True)
+        all_lines = save_output.split('\n')
+        current_tables = {}
+        for table_name in tables:
+            # isolate the lines of the table we are modifying
+            start, end = self._find_table(all_lines, table_name)
+            current_tables[table_name] = all_lines[start:end]
+        return current_tables
+
+    def _generate_commands(self, tables, old_tables):
+        """Return the iptables-restore commands getting tables from the
+        old_tables rules to the current set of rules, and the new rules.
+
+        Returns a tuple of the commands, the new rules by table and whether
+        any of the commands changes a chain not wrapped by this manager.
+        """
+        commands = []
+        new_tables = {}
+        changes_shared_chains = False
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            old_rules = old_tables[table_name]
+            # generate the new table state we want
+            new_rules = self._modify_rules(old_rules, table, table_name)
+            new_tables[table_name] = new_rules
+            # generate the iptables commands to get between the old state
+            # and the new state
+            changes = _generate_path_between_rules(old_rules, new_rules)
+            if changes:
+                # if there are changes to the table, we put on the header
+                # and footer that iptables-save needs
+                commands += (['# Generated by iptables_manager'] +
+                             ['*%s' % table_name] + changes +
+                             ['COMMIT', '# Completed by iptables_manager'])
+                changes_shared_chains = changes_shared_chains or any(
+                    not self._is_wrapped_chain(_get_command_chain(change))
+                    for change in changes)
+        return commands, new_tables, changes_shared_chains
+
+    def _is_wrapped_chain(self, chain):
+        return chain.startswith('%s-' % self.wrap_name)
+
     def _apply_synchronized(self):
         """Apply the current in-memory set of iptables rules.
 
@@ -495,6 +561,14 @@ class IptablesManager(object):
         and replace them with the current set of rules.
         This happens atomically, thanks to iptables-restore.
 
+        With incremental apply, the rules of the previous run are the ones
+        kept in memory instead of the output of iptables-save, which is only
+        run every iptables_resync_interval seconds. Other programs, like the
+        other managers of the namespace, add rules to the built-in and
+        unwrapped chains too, which moves the positions the commands use.
+        So whenever one of those chains changes, the current rules are read
+        with iptables-save instead.
+
         Returns a list of the changes that were sent to iptables-save.
         """
         s = [('iptables', self.ipv4)]
@@ -502,65 +576,68 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
         all_commands = []  # variable to keep track all commands for return val
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,)]
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            save_output = self.execute(args, run_as_root=True)
-            all_lines = save_output.split('\n')
-            commands = []
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                # isolate the lines of the table we are modifying
-                start, end = self._find_table(all_lines, table_name)
-                old_rules = all_lines[start:end]
-                # generate the new table state we want
-                new_rules = self._modify_rules(old_rules, table, table_name)
-                # generate the iptables commands to get between the old state
-                # and the new state
-                changes = _generate_path_between_rules(old_rules, new_rules)
-                if changes:
-                    # if there are changes to the table, we put on the header
-                    # and footer that iptables-save needs
-                    commands += (['# Generated by iptables_manager'] +
-                                 ['*%s' % table_name] + changes +
-                                 ['COMMIT', '# Completed by iptables_manager'])
-            if not commands:
-                continue
-            all_commands += commands
-            args = ['%s-restore' % (cmd,), '-n']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                # always end with a new line
-                commands.append('')
-                self.execute(args, process_input='\n'.join(commands),
-                             run_as_root=True)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(commands)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     commands[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_LE("IPTablesManager.apply failed to apply the "
-                                  "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
+            applied = self._get_applied_rules(cmd)
+            if applied:
+                # _modify_rules() forgets the rules and chains to remove
+                removed = dict((table_name, (set(table.remove_chains),
+                                             list(table.remove_rules)))
+                               for table_name, table in tables.items())
+                saved_at, old_tables = applied
+                commands, new_tables, changes_shared_chains = (
+                    self._generate_commands(tables, old_tables))
+                if changes_shared_chains:
+                    applied = None
+                    for table_name, table in tables.items():
+                        table.remove_chains, table.remove_rules = (
+                            removed[table_name])
+            if not applied:
+                saved_at = time.time()
+                old_tables = self._get_current_rules(cmd, tables)
+                commands, new_tables, changes_shared_chains = (
+                    self._generate_commands(tables, old_tables))
+            if commands:
+                all_commands += commands
+                self._restore(cmd, commands)
+            if cfg.CONF.AGENT.iptables_incremental_apply:
+                self._applied_rules[cmd] = (saved_at, new_tables)
         LOG.debug("IPTablesManager.apply completed with success. %d iptables "
                   "commands were issued", len(all_commands))
         return all_commands
 
+    def _restore(self, cmd, commands):
+        """Send commands to iptables-restore, without flushing the tables."""
+        args = ['%s-restore' % (cmd,), '-n']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            # always end with a new line
+            commands.append('')
+            self.execute(args, process_input='\n'.join(commands),
+                         run_as_root=True)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                # the rules kept in memory can't be trusted anymore
+                self._applied_rules.pop(cmd, None)
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(commands)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 commands[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_LE("IPTablesManager.apply failed to apply the "
+                              "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -612,6 +689,7 @@ class IptablesManager(object):
 
         our_top_rules = []
         our_bottom_rules = []
+        unwrapped_rules = []
         for rule in table.rules:
             rule_str = str(rule)
             # similar to the unwrapped chains, there are some rules that belong
@@ -619,13 +697,19 @@ class IptablesManager(object):
             # from the new_filter and then add them in the right location in
             # case our new rules changed the order.
             # (e.g. '-A FORWARD -j neutron-filter-top')
-            new_filter = [s for s in new_filter if rule_str not in s]
+            # Rules with the wrap name can't be part of the new_filter.
+            if self.wrap_name not in rule_str:
+                unwrapped_rules.append(rule_str)
 
             if rule.top:
                 # rule.top == True means we want this rule to be at the top.
                 our_top_rules += [rule_str]
             else:
                 our_bottom_rules += [rule_str]
+        if unwrapped_rules:
+            new_filter = [s for s in new_filter
+                          if not any(rule_str in s
+                                     for rule_str in unwrapped_rules)]
 
         our_chains_and_rules = our_chains + our_top_rules + our_bottom_rules
 
@@ -759,6 +843,13 @@ def _generate_path_between_rules(old_rules, new_rules):
     return statements
 
 
+def _get_command_chain(command):
+    """Return the chain changed by a command of iptables-restore."""
+    if command.startswith(':'):
+        return command[1:].split(' ', 1)[0]
+    return command.split(' ', 2)[1]
+
+
 def _get_rules_by_chain(rules):
     by_chain = collections.defaultdict(list)
     for line in rules:
@@ -779,6 +870,9 @@ def _generate_chain_diff_iptables_commands(chain, old_chain_rules,
                                           new_chain_rules):
     # keep track of the old index because we have to insert rules
     # in the right position
+    if old_chain_rules == new_chain_rules:
+        # most chains are left alone by an apply
+        return []
     old_index = 1
     statements = []
     for line in difflib.ndiff(old_chain_rules, new_chain_rules):
@@ -996,6 +996,129 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
             '\n'.join(logged)
         )
 
+    def _add_filter_rules(self, iptables=None):
+        iptables = iptables or self.iptables
+        iptables.ipv4['filter'].add_chain('filter')
+        iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        iptables.ipv4['filter'].add_rule('INPUT',
+                                         '-s 0/0 -d 192.168.0.2 -j'
+                                         ' %(bn)s-filter' % IPTABLES_ARG)
+        return [line % IPTABLES_ARG for line in (
+            '# Generated by iptables_manager',
+            '*filter',
+            ':%(bn)s-filter - [0:0]',
+            '-I %(bn)s-INPUT 1 -s 0/0 -d 192.168.0.2 -j %(bn)s-filter',
+            '-I %(bn)s-filter 1 -j DROP',
+            'COMMIT',
+            '# Completed by iptables_manager')]
+
+    def test_apply_incremental(self):
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        expected = self._add_filter_rules()
+        self.assertEqual(expected, self.iptables.apply())
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'],
+            process_input='\n'.join(expected + ['']), run_as_root=True)
+
+        self.execute.reset_mock()
+        self.assertEqual([], self.iptables.apply())
+        self.assertFalse(self.execute.called)
+
+    def test_apply_incremental_shared_chain_changes(self):
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        self.execute.return_value = '\n'.join([
+            '*filter',
+            ':FORWARD ACCEPT [0:0]',
+            ':neutron-meter-FORWARD - [0:0]',
+            '-A FORWARD -j neutron-meter-FORWARD',
+            'COMMIT',
+            ''])
+        self.iptables.apply()
+
+        # Only chains of this manager change, the rules in memory are used
+        self.execute.reset_mock()
+        self._add_filter_rules()
+        self.iptables.apply()
+        self.assertEqual(1, self.execute.call_count)
+        self.assertEqual(['iptables-restore', '-n'],
+                         self.execute.call_args[0][0])
+
+        # Another manager moved its rule to the top of FORWARD meanwhile,
+        # so the positions in FORWARD must come from the current rules
+        save_output = '\n'.join([
+            '*filter',
+            ':FORWARD ACCEPT [0:0]',
+            ':neutron-filter-top - [0:0]',
+            ':neutron-meter-FORWARD - [0:0]',
+            ':%(bn)s-FORWARD - [0:0]' % IPTABLES_ARG,
+            '-A FORWARD -j neutron-meter-FORWARD',
+            '-A FORWARD -j neutron-filter-top',
+            '-A FORWARD -j %(bn)s-FORWARD' % IPTABLES_ARG,
+            'COMMIT',
+            ''])
+        self.execute.reset_mock()
+        self.execute.return_value = save_output
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        commands = self.iptables.apply()
+        self.assertEqual(mock.call(['iptables-save'], run_as_root=True),
+                         self.execute.call_args_list[0])
+
+        cfg.CONF.set_override('iptables_incremental_apply', False, 'AGENT')
+        iptables = iptables_manager.IptablesManager()
+        mock.patch.object(iptables, 'execute',
+                          return_value=save_output).start()
+        self._add_filter_rules(iptables)
+        iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP', wrap=False)
+        self.assertEqual(iptables.apply(), commands)
+
+    @mock.patch.object(iptables_manager, 'time')
+    def test_apply_incremental_resync(self, time):
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        cfg.CONF.set_override('iptables_resync_interval', 60, 'AGENT')
+        self.execute.return_value = ''
+        time.time.return_value = 100
+        self.iptables.apply()
+        self.execute.reset_mock()
+        time.time.return_value = 159
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+        # The rules read again don't have the ones applied before
+        time.time.return_value = 160
+        self.iptables.apply()
+        self.assertEqual(
+            [mock.call(['iptables-save'], run_as_root=True),
+             mock.call(['iptables-restore', '-n'],
+                       process_input=(FILTER_DUMP + MANGLE_DUMP + NAT_DUMP +
+                                      RAW_DUMP),
+                       run_as_root=True)],
+            self.execute.call_args_list)
+
+    def test_apply_incremental_failure_resyncs(self):
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self._add_filter_rules()
+        self.execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, self.iptables.apply)
+
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self.iptables.apply()
+        self.assertEqual(mock.call(['iptables-save'], run_as_root=True),
+                         self.execute.call_args_list[0])
+
+    def test_generate_chain_diff_unchanged_chain(self):
+        rules = ['-A chain -j ACCEPT', '-A chain -j DROP']
+        self.assertEqual(
+            [], iptables_manager._generate_chain_diff_iptables_commands(
+                'chain', rules, list(rules)))
+
     def test_get_traffic_counters_chain_notexists(self):
         with mock.patch.object(iptables_manager, "LOG") as log:
             acc = self.iptables.get_traffic_counters('chain1')
@@ -154,15 +154,19 @@ class ViewBuilder(common.ViewBuilder):
 
         :param func: Function used to format the server data
         :param request: API request
-        :param servers: List of servers in dictionary format
+        :param servers: List of servers in dictionary format, or any iterable
+                        of them, e.g. InstanceList.iter_by_filters(): the
+                        servers are formatted as they are read
         :param coll_name: Name of collection, used to generate the next link
                           for a pagination query
         :returns: Server data in dictionary format
         """
         server_list = [func(request, server)["server"] for server in servers]
+        # The formatted servers carry the uuid of the instances as "id"
         servers_links = self._get_collection_links(request,
-                                                   servers,
-                                                   coll_name)
+                                                   server_list,
+                                                   coll_name,
+                                                   id_key="id")
         servers_dict = dict(servers=server_list)
 
         if servers_links:
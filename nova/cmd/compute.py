@@ -25,6 +25,7 @@ from oslo_reports import guru_meditation_report as gmr
 from nova.conductor import rpcapi as conductor_rpcapi
 import nova.conf
 from nova import config
+from nova import counters
 import nova.db.api
 from nova import exception
 from nova.i18n import _LE, _LW
@@ -59,6 +60,8 @@ def main():
     utils.monkey_patch()
     objects.register_all()
 
+    gmr.TextGuruMeditation.register_section(
+        'Counters', counters.CountersReportGenerator())
     gmr.TextGuruMeditation.setup_autorun(version)
 
     if not CONF.conductor.use_local:
@@ -65,12 +65,14 @@ from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
 from oslo_utils import importutils
 from oslo_utils import uuidutils
 import six
 
 from nova.api.ec2 import ec2utils
 from nova import availability_zones
+from nova import compute
 from nova import config
 from nova import context
 from nova import db
@@ -900,7 +902,7 @@ class ServiceCommands(object):
 
 
 class HostCommands(object):
-    """List hosts."""
+    """List hosts and prefetch images to them."""
 
     def list(self, zone=None):
         """Show a list of all physical hosts. Filter by zone.
@@ -921,6 +923,23 @@ class HostCommands(object):
         for h in hosts:
             print("%-25s\t%-15s" % (h['host'], h['availability_zone']))
 
+    @args('--host', metavar='<host>', help='Compute host')
+    @args('--image', dest='image_ids', metavar='<image id>',
+          action='append', help='Image to prefetch, may be repeated')
+    def prefetch_images(self, host, image_ids):
+        """Download images to the image cache of a compute host, ahead of
+        booting instances from them there.
+        """
+        ctxt = context.get_admin_context()
+        try:
+            compute.HostAPI().prefetch_images(ctxt, host, image_ids)
+        except (exception.NotFound,
+                exception.ComputeServiceUnavailable) as ex:
+            print(_("error: %s") % ex)
+            return(2)
+        print(_("Prefetching %(count)d images to host %(host)s.") %
+              {'count': len(image_ids), 'host': host})
+
 
 class DbCommands(object):
     """Class for managing the main database."""
@@ -947,7 +966,17 @@ class DbCommands(object):
             help='Maximum number of deleted rows to archive')
     @args('--verbose', action='store_true', dest='verbose', default=False,
           help='Print how many rows were archived per table.')
-    def archive_deleted_rows(self, max_rows, verbose=False):
+    @args('--chunk_size', metavar='<number>',
+          help='Maximum number of rows moved per transaction. By default '
+               'the rows of each table are moved in one transaction.')
+    @args('--workers', metavar='<number>', default=1,
+          help='Number of tables archived concurrently, among the tables '
+               'not referencing each other.')
+    @args('--checkpoint_file', metavar='<path>',
+          help='File recording how far the archiving of each table went. '
+               'The next run with the same file resumes from there.')
+    def archive_deleted_rows(self, max_rows, verbose=False, chunk_size=None,
+                             workers=1, checkpoint_file=None):
         """Move up to max_rows deleted rows from production tables to shadow
         tables.
         """
@@ -960,11 +989,47 @@ class DbCommands(object):
                 print(_('max rows must be <= %(max_value)d') %
                       {'max_value': db.MAX_INT})
                 return(1)
-        table_to_rows_archived = db.archive_deleted_rows(max_rows)
+        if chunk_size is not None:
+            chunk_size = int(chunk_size)
+            if chunk_size <= 0:
+                print(_("Must supply a positive value for chunk_size"))
+                return(1)
+        workers = int(workers)
+        if workers <= 0:
+            print(_("Must supply a positive value for workers"))
+            return(1)
+
+        checkpoints = {}
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            with open(checkpoint_file) as f:
+                checkpoints = jsonutils.load(f)
+        durations = {}
+        try:
+            table_to_rows_archived = db.archive_deleted_rows(
+                max_rows, chunk_size=chunk_size, workers=workers,
+                checkpoints=checkpoints, durations=durations)
+        finally:
+            # Also record the progress of an interrupted run
+            if checkpoint_file:
+                with open(checkpoint_file, 'w') as f:
+                    jsonutils.dump(checkpoints, f)
+
         if verbose:
             if table_to_rows_archived:
-                cliutils.print_dict(table_to_rows_archived, _('Table'),
-                                    dict_value=_('Number of Rows Archived'))
+                def _rate(tablename):
+                    if durations.get(tablename):
+                        return int(table_to_rows_archived[tablename] /
+                                   durations[tablename])
+                    return ''
+
+                cliutils.print_list(
+                    table_to_rows_archived, ['table', 'rows', 'rate'],
+                    formatters={
+                        'table': lambda tablename: tablename,
+                        'rows': table_to_rows_archived.get,
+                        'rate': _rate},
+                    field_labels=[_('Table'), _('Number of Rows Archived'),
+                                  _('Rows/sec')])
             else:
                 print(_('Nothing was archived.'))
 
@@ -3630,6 +3630,13 @@ class HostAPI(base.Base):
                          must_be_up=True)
         return self.rpcapi.get_host_uptime(context, host=host_name)
 
+    def prefetch_images(self, context, host_name, image_ids):
+        """Downloads images to the image cache of a host, asynchronously."""
+        host_name = self._assert_host_exists(context, host_name,
+                                             must_be_up=True)
+        self.rpcapi.prefetch_images(context, host=host_name,
+                                    image_ids=image_ids)
+
     @wrap_exception()
     def host_power_action(self, context, host_name, action):
         """Reboots, shuts down or powers up the host."""
@@ -481,6 +481,29 @@ def object_compat(function):
     return decorated_function
 
 
+def _power_state_in_sync(vm_state, db_power_state, vm_power_state):
+    """Whether _sync_instance_power_state() would leave an instance as is.
+
+    That is when the database already has the power state of the
+    hypervisor and the vm_state agrees with it.
+    """
+    if db_power_state != vm_power_state:
+        return False
+    if vm_state == vm_states.ACTIVE:
+        return vm_power_state == power_state.RUNNING
+    if vm_state == vm_states.STOPPED:
+        return vm_power_state in (power_state.NOSTATE,
+                                  power_state.SHUTDOWN,
+                                  power_state.CRASHED)
+    if vm_state == vm_states.PAUSED:
+        return vm_power_state not in (power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+    if vm_state in (vm_states.SOFT_DELETED, vm_states.DELETED):
+        return vm_power_state in (power_state.NOSTATE,
+                                  power_state.SHUTDOWN)
+    return True
+
+
 class InstanceEvents(object):
     def __init__(self):
         self._events = {}
@@ -676,7 +699,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='4.11')
+    target = messaging.Target(version='4.12')
 
     # How long to wait in seconds before re-issuing a shutdown
     # signal to an instance during power off.  The overall
@@ -4153,6 +4176,15 @@ class ComputeManager(manager.Manager):
         """Returns the result of calling "uptime" on the target host."""
         return self.driver.get_host_uptime()
 
+    @wrap_exception()
+    def prefetch_images(self, context, image_ids):
+        """Download images to the image cache of this host."""
+        try:
+            self.driver.prefetch_images(context, image_ids)
+        except NotImplementedError:
+            LOG.info(_LI("The compute driver of this host has no image "
+                         "cache to prefetch images to."))
+
     @wrap_exception()
     @wrap_instance_fault
     def get_diagnostics(self, context, instance):
@@ -6169,17 +6201,26 @@ class ComputeManager(manager.Manager):
     def _sync_power_states(self, context):
         """Align power states between the database and the hypervisor.
 
-        To sync power state data we make a DB call to get the number of
-        virtual machines known by the hypervisor and if the number matches the
-        number of virtual machines known by the database, we proceed in a lazy
-        loop, one database record at a time, checking if the hypervisor has the
-        same power state as is in the database.
+        To sync power state data we make a DB call to get the instances of
+        the host and, where the driver supports it, a single driver call to
+        get the power state of all the virtual machines known by the
+        hypervisor. The instances already in sync are left alone, the others
+        are synced one at a time, in a lazy loop, with their own hypervisor
+        query. If the driver can't report all the power states at once, the
+        number of virtual machines is compared with the number of database
+        records and every instance is synced.
         """
         db_instances = objects.InstanceList.get_by_host(context, self.host,
                                                         expected_attrs=[],
                                                         use_slave=True)
 
-        num_vm_instances = self.driver.get_num_instances()
+        try:
+            vm_power_states = self.driver.get_power_states()
+        except NotImplementedError:
+            vm_power_states = None
+            num_vm_instances = self.driver.get_num_instances()
+        else:
+            num_vm_instances = len(vm_power_states)
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -6211,6 +6252,17 @@ class ComputeManager(manager.Manager):
             # process syncs asynchronously - don't want instance locking to
             # block entire periodic task thread
             uuid = db_instance.uuid
+            # NOTE: nothing to write nor to resolve for this instance, so
+            # don't spend a database refresh and a lock on it. The power
+            # state read in bulk may be stale by the time the lock is held,
+            # so the instances which are synced query the driver again.
+            if (vm_power_states is not None and
+                    db_instance.task_state is None and
+                    _power_state_in_sync(db_instance.vm_state,
+                                         db_instance.power_state,
+                                         vm_power_states.get(
+                                             uuid, power_state.NOSTATE))):
+                continue
             if uuid in self._syncs_in_progress:
                 LOG.debug('Sync already in progress for %s' % uuid)
             else:
@@ -19,7 +19,9 @@ scheduler with useful information about availability through the ComputeNode
 model.
 """
 import copy
+import time
 
+from eventlet import greenthread
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
@@ -30,6 +32,7 @@ from nova.compute import monitors
 from nova.compute import resources as ext_resources
 from nova.compute import task_states
 from nova.compute import vm_states
+from nova import counters
 from nova import exception
 from nova.i18n import _, _LE, _LI, _LW
 from nova import objects
@@ -62,6 +65,15 @@ resource_tracker_opts = [
                      'openstack-dev mailing list. There is no future planned '
                      'support for the tracking of custom resources.',
                 deprecated_for_removal=True),
+    cfg.FloatOpt('resource_tracker_update_window',
+                 default=0.0,
+                 min=0.0,
+                 help='Minimum number of seconds between two saves of the '
+                      'compute node resources by the resource tracker. The '
+                      'changes made by the instance claims and usage updates '
+                      'within this window are coalesced into a single save, '
+                      'sent at the end of the window. 0 saves every change '
+                      'right away.'),
 ]
 
 allocation_ratio_opts = [
@@ -150,11 +162,14 @@ class ResourceTracker(object):
         self.ext_resources_handler = \
             ext_resources.ResourceHandler(CONF.compute_resources)
         self.old_resources = objects.ComputeNode()
+        self._last_save_time = None
+        self._pending_save = None
         self.scheduler_client = scheduler_client.SchedulerClient()
         self.ram_allocation_ratio = CONF.ram_allocation_ratio
         self.cpu_allocation_ratio = CONF.cpu_allocation_ratio
         self.disk_allocation_ratio = CONF.disk_allocation_ratio
 
+    @counters.timed('resource_tracker.instance_claim')
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def instance_claim(self, context, instance_ref, limits=None):
         """Indicate that some resources are needed for an upcoming compute
@@ -235,6 +250,7 @@ class ResourceTracker(object):
         return self._move_claim(context, instance, instance_type,
                                 image_meta=image_meta, limits=limits)
 
+    @counters.timed('resource_tracker.move_claim')
     def _move_claim(self, context, instance, new_instance_type, move_type=None,
                     image_meta=None, limits=None, migration=None):
         """Indicate that resources are needed for a move to this host.
@@ -386,6 +402,7 @@ class ResourceTracker(object):
 
             instance.drop_migration_context()
 
+    @counters.timed('resource_tracker.update_usage')
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def update_usage(self, context, instance):
         """Update the resource usage and stats after a change in an
@@ -533,6 +550,7 @@ class ResourceTracker(object):
                               'another host\'s instance!'),
                           {'uuid': migration.instance_uuid})
 
+    @counters.timed('resource_tracker.update_available_resource')
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def _update_available_resource(self, context, resources):
 
@@ -692,18 +710,63 @@ class ResourceTracker(object):
 
     def _resource_change(self):
         """Check to see if any resources have changed."""
-        if not obj_base.obj_equal_prims(self.compute_node, self.old_resources):
-            self.old_resources = copy.deepcopy(self.compute_node)
-            return True
-        return False
+        return not obj_base.obj_equal_prims(self.compute_node,
+                                            self.old_resources)
+
+    def _reset_unchanged_fields(self):
+        """Reset the changes of the compute node fields still holding the
+        values last saved, so that only the changed fields get saved.
+        """
+        for field in self.compute_node.obj_what_changed():
+            if (self.old_resources.obj_attr_is_set(field) and
+                    self.compute_node.obj_attr_is_set(field) and
+                    obj_base.obj_to_primitive(
+                        getattr(self.compute_node, field)) ==
+                    obj_base.obj_to_primitive(
+                        getattr(self.old_resources, field))):
+                self.compute_node.obj_reset_changes([field], recursive=True)
 
     def _update(self, context):
         """Update partial stats locally and populate them to Scheduler."""
         self._write_ext_resources(self.compute_node)
         if not self._resource_change():
             return
+        window = CONF.resource_tracker_update_window
+        if window and self._last_save_time is not None:
+            delay = self._last_save_time + window - time.time()
+            if delay > 0:
+                # Coalesce with the other changes made until the end of the
+                # window
+                counters.increment('resource_tracker.coalesced_update')
+                if self._pending_save is None:
+                    self._pending_save = greenthread.spawn_after(
+                        delay, self._save_pending_update, context)
+                return
+        self._save(context)
+
+    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    def _save_pending_update(self, context):
+        self._pending_save = None
+        if self.disabled or not self._resource_change():
+            return
+        try:
+            self._save(context)
+        except Exception:
+            # The next periodic update will save the resources again
+            LOG.exception(_LE('Error saving the coalesced resource updates '
+                              'for %(host)s:%(node)s'),
+                          {'host': self.host, 'node': self.nodename})
+
+    def _save(self, context):
+        if self._pending_save is not None:
+            self._pending_save.cancel()
+            self._pending_save = None
+        self._last_save_time = time.time()
+        self._reset_unchanged_fields()
         # Persist the stats to the Scheduler
-        self.scheduler_client.update_resource_stats(self.compute_node)
+        with counters.measure('resource_tracker.save'):
+            self.scheduler_client.update_resource_stats(self.compute_node)
+        self.old_resources = copy.deepcopy(self.compute_node)
         if self.pci_tracker:
             self.pci_tracker.save(context)
 
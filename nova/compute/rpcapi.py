@@ -328,6 +328,7 @@ class ComputeAPI(object):
         * 4.9  - Add live_migration_force_complete()
         * 4.10  - Add live_migration_abort()
         * 4.11 - Allow block_migration and disk_over_commit be None
+        * 4.12 - Add prefetch_images()
     '''
 
     VERSION_ALIASES = {
@@ -876,6 +877,11 @@ class ComputeAPI(object):
         cctxt = self.client.prepare(server=host, version=version)
         return cctxt.call(ctxt, 'get_host_uptime')
 
+    def prefetch_images(self, ctxt, host, image_ids):
+        version = '4.12'
+        cctxt = self.client.prepare(server=host, version=version)
+        cctxt.cast(ctxt, 'prefetch_images', image_ids=image_ids)
+
     def reserve_block_device_name(self, ctxt, instance, device, volume_id,
                                   disk_bus=None, device_type=None):
         kw = {'instance': instance, 'device': device,
@@ -208,6 +208,76 @@ a different scheduler, this option has no effect.
     None
 """)
 
+host_mgr_tracks_cn_chg_opt = cfg.BoolOpt(
+        "scheduler_tracks_compute_node_changes",
+        default=False,
+        help="""
+When enabled, every compute service sends the resource usage of its compute
+nodes to the schedulers whenever its resource tracker saves it, along with a
+per-node generation counter. The 'incremental_scheduler' driver applies these
+updates to the host states it keeps in memory instead of reading all compute
+nodes from the database for each request.
+
+Enable this on the compute services when the schedulers use the
+'incremental_scheduler' driver; other drivers ignore the updates.
+
+* Services that use this:
+
+    ``nova-compute``
+
+* Related options:
+
+    ``scheduler_driver``
+""")
+
+columnar_engine_opt = cfg.BoolOpt(
+        "scheduler_use_columnar_engine",
+        default=False,
+        help="""
+When enabled, the HostManager copies the numeric attributes of the host
+states (free RAM, disk and vCPUs, allocation ratios, instance and I/O
+operation counts) into NumPy arrays once per filtering or weighing pass and
+runs the filters and weighers that support it as array operations: the
+RamFilter, CoreFilter, DiskFilter, NumInstancesFilter and IoOpsFilter, and
+the RAM, disk and I/O ops weighers. All other filters and weighers run per
+host on the hosts left, as usual, and the results are the same as without
+this option. This reduces the CPU time the scheduler spends per request in
+large deployments.
+
+NumPy has to be installed on the scheduler hosts; if it isn't, a warning is
+logged and the regular filtering and weighing is used.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    ``scheduler_default_filters``, ``scheduler_weight_classes``
+""")
+
+service_refresh_interval_opt = cfg.IntOpt(
+        "scheduler_service_refresh_interval",
+        default=10,
+        min=1,
+        help="""
+How often (in seconds) the 'incremental_scheduler' driver re-reads the
+nova-compute service records, so that the service heartbeats and disabled
+flags seen by filters such as the ComputeFilter stay current. Compute nodes
+themselves are only read from the database on the full resync done every
+'scheduler_driver_task_period' seconds, or for a node whose updates were
+lost. Keep this well below 'service_down_time'.
+
+* Services that use this:
+
+    ``nova-scheduler``
+
+* Related options:
+
+    ``scheduler_driver``, ``scheduler_tracks_compute_node_changes``,
+    ``service_down_time``
+""")
+
 rpc_sched_topic_opt = cfg.StrOpt("scheduler_topic",
         default="scheduler",
         help="""
@@ -287,6 +357,11 @@ Other options are:
     individual scheduler performance at the risk of more retries when running
     multiple schedulers.
 
+    * 'incremental_scheduler' which keeps the host states in memory and
+    applies the updates sent by the compute services (see
+    'scheduler_tracks_compute_node_changes'), resyncing from the database
+    periodically.
+
     * 'chance_scheduler' which simply picks a host at random.
 
     * 'fake_scheduler' which is used for testing.
@@ -920,6 +995,9 @@ default_opts = [host_subset_size_opt,
                host_mgr_default_filt_opt,
                host_mgr_sched_wgt_cls_opt,
                host_mgr_tracks_inst_chg_opt,
+               host_mgr_tracks_cn_chg_opt,
+               service_refresh_interval_opt,
+               columnar_engine_opt,
                rpc_sched_topic_opt,
                sched_driver_host_mgr_opt,
                driver_opt,
@@ -0,0 +1,110 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+In-process counters and timings of the hot code paths of a service.
+
+Each counter records how many times something happened and, for timed
+code, the total and longest time it took. The counters of a process are
+shown in the 'Counters' section of its Guru Meditation Report, next to the
+timings of its periodic tasks.
+"""
+
+import contextlib
+import functools
+import time
+
+from oslo_reports.models import with_default_views as mwdv
+
+
+class Counter(object):
+    """A count of events, with the total and longest duration of the timed
+    ones, in seconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, count=1, duration=0.0):
+        self.count += count
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def to_dict(self):
+        return {'count': self.count,
+                'total': self.total,
+                'max': self.max,
+                'average': self.total / self.count if self.count else 0.0}
+
+
+_counters = {}
+
+
+def _get_counter(name):
+    try:
+        return _counters[name]
+    except KeyError:
+        return _counters.setdefault(name, Counter())
+
+
+def increment(name, count=1):
+    """Add count events to the name counter."""
+    _get_counter(name).add(count)
+
+
+@contextlib.contextmanager
+def measure(name):
+    """Count and time the wrapped block of code as the name counter.
+
+    Blocks raising an exception are counted too.
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        _get_counter(name).add(duration=time.time() - start)
+
+
+def timed(name):
+    """Decorator counting and timing the calls of a function as the name
+    counter.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_counters():
+    """Return a dict of the counters, by name, as dicts."""
+    return {name: counter.to_dict()
+            for name, counter in list(_counters.items())}
+
+
+def reset():
+    """Forget all the counters."""
+    _counters.clear()
+
+
+class CountersReportGenerator(object):
+    """A Guru Meditation Report generator showing the counters."""
+
+    def __call__(self):
+        return mwdv.ModelWithDefaultViews(get_counters())
@@ -1157,6 +1157,19 @@ def quota_reserve(context, resources, quotas, user_quotas, deltas, expire,
                               project_id=project_id, user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None):
+    """Check quotas and create appropriate reservations, without locking
+    the quota usages.
+    """
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
@@ -1954,10 +1967,20 @@ def task_log_get(context, task_name, period_beginning,
 ####################
 
 
-def archive_deleted_rows(max_rows=None):
+def archive_deleted_rows(max_rows=None, chunk_size=None, workers=1,
+                         checkpoints=None, durations=None):
     """Move up to max_rows rows from production tables to corresponding shadow
     tables.
 
+    :param chunk_size: maximum number of rows moved per transaction, None
+                       to move the rows of each table in one transaction
+    :param workers: number of tables archived concurrently, among the tables
+                    not referencing each other
+    :param checkpoints: dict mapping table names to the primary key of the
+                        last row archived, to resume archiving from there;
+                        updated as the rows are archived
+    :param durations: dict which is updated with the number of seconds spent
+                      archiving each table
     :returns: dict that maps table name to number of rows archived from that
               table, for example:
 
@@ -1970,7 +1993,11 @@ def archive_deleted_rows(max_rows=None):
         }
 
     """
-    return IMPL.archive_deleted_rows(max_rows=max_rows)
+    return IMPL.archive_deleted_rows(max_rows=max_rows,
+                                     chunk_size=chunk_size,
+                                     workers=workers,
+                                     checkpoints=checkpoints,
+                                     durations=durations)
 
 
 def pcidevice_online_data_migration(context, max_count):
@@ -25,6 +25,7 @@ import inspect
 import sys
 import uuid
 
+import eventlet
 from oslo_config import cfg
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
@@ -44,7 +45,9 @@ from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import MetaData
 from sqlalchemy import or_
 from sqlalchemy.orm import aliased
+from sqlalchemy.orm import attributes as orm_attributes
 from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm import exc as orm_exc
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
 from sqlalchemy.orm import noload
@@ -62,6 +65,7 @@ from nova import block_device
 from nova.compute import task_states
 from nova.compute import vm_states
 import nova.context
+from nova import counters
 from nova.db.sqlalchemy import models
 from nova import exception
 from nova.i18n import _, _LI, _LE, _LW
@@ -2025,8 +2029,10 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     :param context: security context
     :param instances: list of instances to fill
     :param manual_joins: list of tables to manually join (can be any
-                         combination of 'metadata' and 'system_metadata' or
-                         None to take the default of both)
+                         combination of 'metadata', 'system_metadata',
+                         'pci_devices', 'info_cache' and 'security_groups'
+                         or None to take the default of 'metadata' and
+                         'system_metadata')
     """
     uuids = [inst['uuid'] for inst in instances]
 
@@ -2048,6 +2054,17 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
         for row in _instance_pcidevs_get_multi(context, uuids):
             pcidevs[row['instance_uuid']].append(row)
 
+    info_caches = {}
+    if 'info_cache' in manual_joins:
+        for row in _instance_info_cache_get_multi(context, uuids):
+            info_caches[row['instance_uuid']] = row
+
+    sec_groups = collections.defaultdict(list)
+    if 'security_groups' in manual_joins:
+        for instance_uuid, row in _instance_security_groups_get_multi(
+                context, uuids):
+            sec_groups[instance_uuid].append(row)
+
     filled_instances = []
     for inst in instances:
         inst = dict(inst)
@@ -2055,28 +2072,44 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
         inst['metadata'] = meta[inst['uuid']]
         if 'pci_devices' in manual_joins:
             inst['pci_devices'] = pcidevs[inst['uuid']]
+        if 'info_cache' in manual_joins:
+            inst['info_cache'] = info_caches.get(inst['uuid'])
+        if 'security_groups' in manual_joins:
+            # NOTE: like the Instance.security_groups relationship, only
+            # join the groups of the instances not deleted
+            inst['security_groups'] = (
+                [] if inst['deleted'] else sec_groups[inst['uuid']])
         filled_instances.append(inst)
 
     return filled_instances
 
 
-def _manual_join_columns(columns_to_join):
+# The columns instance_get_all_by_filters_sort() joins with IN queries
+_INSTANCE_LIST_MANUAL_JOINS = ('metadata', 'system_metadata', 'pci_devices',
+                               'info_cache', 'security_groups')
+
+
+def _manual_join_columns(columns_to_join,
+                         manual_columns=('metadata', 'system_metadata',
+                                         'pci_devices')):
     """Separate manually joined columns from columns_to_join
 
-    If columns_to_join contains 'metadata', 'system_metadata', or
-    'pci_devices' those columns are removed from columns_to_join and added
-    to a manual_joins list to be used with the _instances_fill_metadata method.
+    If columns_to_join contains any of the manual_columns ('metadata',
+    'system_metadata', or 'pci_devices' by default) those columns are removed
+    from columns_to_join and added to a manual_joins list to be used with the
+    _instances_fill_metadata method.
 
     The columns_to_join formal parameter is copied and not modified, the return
     tuple has the modified columns_to_join list to be used with joinedload in
     a model query.
 
     :param:columns_to_join: List of columns to join in a model query.
+    :param:manual_columns: The columns to join manually.
     :return: tuple of (manual_joins, columns_to_join)
     """
     manual_joins = []
     columns_to_join_new = copy.copy(columns_to_join)
-    for column in ('metadata', 'system_metadata', 'pci_devices'):
+    for column in manual_columns:
         if column in columns_to_join_new:
             columns_to_join_new.remove(column)
             manual_joins.append(column)
@@ -2187,12 +2220,17 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                                sort_dirs,
                                                default_dir='desc')
 
+    # NOTE: the one-to-many joins are read with one IN query each after the
+    # page of instances, instead of multiplying and widening the rows of the
+    # paginated query itself
     if columns_to_join is None:
-        columns_to_join_new = ['info_cache', 'security_groups']
-        manual_joins = ['metadata', 'system_metadata']
+        columns_to_join_new = []
+        manual_joins = ['metadata', 'system_metadata', 'info_cache',
+                        'security_groups']
     else:
         manual_joins, columns_to_join_new = (
-            _manual_join_columns(columns_to_join))
+            _manual_join_columns(columns_to_join,
+                                 manual_columns=_INSTANCE_LIST_MANUAL_JOINS))
 
     query_prefix = context.session.query(models.Instance)
     for column in columns_to_join_new:
@@ -2291,11 +2329,7 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
 
     # paginate query
     if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(
-                    context.elevated(read_deleted='yes'), marker)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
+        marker = _instance_get_marker(context, marker, sort_keys)
     try:
         query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                                models.Instance, limit,
@@ -2308,6 +2342,27 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+def _instance_get_marker(context, marker, sort_keys):
+    """Return the sort key values of the marker instance.
+
+    The page after the marker is selected by comparing the sort keys with
+    these values (keyset pagination), so only those columns are read: the
+    marker is not joined to any other table.  The marker may be a deleted
+    instance, as it may have been deleted since the previous page was listed.
+    """
+    try:
+        columns = [getattr(models.Instance, key) for key in sort_keys]
+    except AttributeError:
+        raise exception.InvalidSortKey()
+    result = model_query(context, models.Instance, columns,
+                         read_deleted='yes').\
+                filter_by(uuid=marker).\
+                first()
+    if result is None:
+        raise exception.MarkerNotFound(marker)
+    return result
+
+
 def _tag_instance_filter(context, query, filters):
     """Applies tag filtering to an Instance query.
 
@@ -2934,6 +2989,14 @@ def instance_info_cache_update(context, instance_uuid, values):
     return info_cache
 
 
+def _instance_info_cache_get_multi(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return model_query(context, models.InstanceInfoCache,
+                       read_deleted='yes').filter(
+        models.InstanceInfoCache.instance_uuid.in_(instance_uuids))
+
+
 @require_context
 @pick_context_manager_writer
 def instance_info_cache_delete(context, instance_uuid):
@@ -3599,6 +3662,7 @@ def quota_usage_update(context, project_id, user_id, resource, **kwargs):
     for key in ['in_use', 'reserved', 'until_refresh']:
         if key in kwargs:
             updates[key] = kwargs[key]
+    updates['generation'] = models.QuotaUsage.generation + 1
 
     result = model_query(context, models.QuotaUsage, read_deleted="no").\
                      filter_by(project_id=project_id).\
@@ -3643,6 +3707,10 @@ def _get_project_user_quota_usages(context, project_id, user_id):
         order_by(models.QuotaUsage.id.asc()).\
         with_lockmode('update').\
         all()
+    return _sum_project_user_quota_usages(rows, user_id)
+
+
+def _sum_project_user_quota_usages(rows, user_id):
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3779,12 +3847,31 @@ def _calculate_overquota(project_quotas, user_quotas, deltas,
     return overs
 
 
-@require_context
-@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
-@main_context_manager.writer
-def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
-                  expire, until_refresh, max_age, project_id=None,
-                  user_id=None):
+def _save_quota_usages_optimistic(context, project_id, project_quotas,
+                                  deltas, usage_rows, user_usages):
+    """Write the usages updated by a reservation, unless any usage the
+    reservation was checked against was updated since it was read.
+
+    :raises: QuotaUsageConflict if a usage was updated concurrently.
+    """
+    # NOTE: The project limits were checked against the usages of all the
+    # users of the project, so the usages of the other users are flagged as
+    # modified too, which makes the flush check and bump their generation.
+    user_usage_ids = set(usage.id for usage in user_usages.values())
+    for row in usage_rows:
+        if (row.id not in user_usage_ids and
+                deltas.get(row.resource, 0) > 0 and
+                project_quotas.get(row.resource, -1) >= 0):
+            orm_attributes.flag_modified(row, 'reserved')
+    try:
+        context.session.flush()
+    except orm_exc.StaleDataError:
+        raise exception.QuotaUsageConflict(project_id=project_id)
+
+
+def _quota_reserve(context, resources, project_quotas, user_quotas, deltas,
+                   expire, until_refresh, max_age, project_id, user_id,
+                   optimistic=False):
     elevated = context.elevated()
 
     if project_id is None:
@@ -3793,8 +3880,16 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         user_id = context.user_id
 
     # Get the current usages
-    project_usages, user_usages = _get_project_user_quota_usages(
-            context, project_id, user_id)
+    if optimistic:
+        usage_rows = model_query(context, models.QuotaUsage,
+                                 read_deleted="no").\
+            filter_by(project_id=project_id).\
+            all()
+        project_usages, user_usages = _sum_project_user_quota_usages(
+                usage_rows, user_id)
+    else:
+        project_usages, user_usages = _get_project_user_quota_usages(
+                context, project_id, user_id)
 
     # Handle usage refresh
     work = set(deltas.keys())
@@ -3864,15 +3959,29 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
     # Create the reservations
     if not overs:
         reservations = []
+        reservation_values = []
         for res, delta in deltas.items():
-            reservation = _reservation_create(
-                                             str(uuid.uuid4()),
-                                             user_usages[res],
-                                             project_id,
-                                             user_id,
-                                             res, delta, expire,
-                                             context.session)
-            reservations.append(reservation.uuid)
+            if optimistic:
+                # NOTE: These are all inserted by a single statement once
+                # the usages are saved, see below.
+                reservation_values.append(
+                    {'uuid': str(uuid.uuid4()),
+                     'usage_id': user_usages[res].id,
+                     'project_id': project_id,
+                     'user_id': user_id,
+                     'resource': res,
+                     'delta': delta,
+                     'expire': expire})
+                reservations.append(reservation_values[-1]['uuid'])
+            else:
+                reservation = _reservation_create(
+                                                 str(uuid.uuid4()),
+                                                 user_usages[res],
+                                                 project_id,
+                                                 user_id,
+                                                 res, delta, expire,
+                                                 context.session)
+                reservations.append(reservation.uuid)
 
             # Also update the reserved quantity
             # NOTE(Vek): Again, we are only concerned here about
@@ -3893,6 +4002,13 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
     for usage_ref in user_usages.values():
         context.session.add(usage_ref)
 
+    if optimistic and not overs:
+        _save_quota_usages_optimistic(context, project_id, project_quotas,
+                                      deltas, usage_rows, user_usages)
+        if reservation_values:
+            context.session.execute(models.Reservation.__table__.insert(),
+                                    reservation_values)
+
     if unders:
         LOG.warning(_LW("Change will make usage less than 0 for the following "
                         "resources: %s"), unders)
@@ -3928,6 +4044,50 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
     return reservations
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
+                  expire, until_refresh, max_age, project_id=None,
+                  user_id=None):
+    return _quota_reserve(context, resources, project_quotas, user_quotas,
+                          deltas, expire, until_refresh, max_age, project_id,
+                          user_id)
+
+
+def _retry_quota_reserve():
+    """Wrap with oslo_db_api.wrap_db_retry, and also retry on
+    QuotaUsageConflict, after a short wait.
+    """
+    def exception_checker(exc):
+        if isinstance(exc, exception.QuotaUsageConflict):
+            counters.increment('db.quota_usage_conflict')
+            return True
+        return False
+    return oslo_db_api.wrap_db_retry(max_retries=20, retry_interval=0.01,
+                                     max_retry_interval=1,
+                                     retry_on_deadlock=True,
+                                     exception_checker=exception_checker)
+
+
+@require_context
+@_retry_quota_reserve()
+@main_context_manager.writer
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None):
+    """Same as quota_reserve(), except that the usages are read without
+    locking them.
+
+    The usages are then updated only if they still are as they were read,
+    see _save_quota_usages_optimistic(), and the reservation is retried
+    otherwise. The reservations are inserted with a single statement.
+    """
+    return _quota_reserve(context, resources, project_quotas, user_quotas,
+                          deltas, expire, until_refresh, max_age, project_id,
+                          user_id, optimistic=True)
+
+
 def _quota_reservations_query(context, reservations):
     """Return the relevant reservations."""
 
@@ -4003,7 +4163,18 @@ def quota_destroy_all_by_project(context, project_id):
         soft_delete(synchronize_session=False)
 
 
-@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def _retry_stale_quota_usage():
+    """Wrap with oslo_db_api.wrap_db_retry, and also retry on
+    StaleDataError, raised when a usage saved without being locked has
+    been updated since it was read.
+    """
+    exception_checker = \
+        lambda exc: isinstance(exc, (orm_exc.StaleDataError,))
+    return oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                                     exception_checker=exception_checker)
+
+
+@_retry_stale_quota_usage()
 @main_context_manager.writer
 def reservation_expire(context):
     current_time = timeutils.utcnow()
@@ -4386,6 +4557,21 @@ def security_group_get_by_instance(context, instance_uuid):
                    all()
 
 
+def _instance_security_groups_get_multi(context, instance_uuids):
+    """Return (instance_uuid, security group) tuples for the security groups
+    of the given instances.
+    """
+    if not instance_uuids:
+        return []
+    assoc = models.SecurityGroupInstanceAssociation
+    return model_query(context, models.SecurityGroup,
+                       (assoc.instance_uuid, models.SecurityGroup),
+                       read_deleted='no').\
+        filter(models.SecurityGroup.id == assoc.security_group_id).\
+        filter(assoc.deleted == 0).\
+        filter(assoc.instance_uuid.in_(instance_uuids))
+
+
 @require_context
 @main_context_manager.reader
 def security_group_in_use(context, group_id):
@@ -4476,7 +4662,9 @@ def _security_group_ensure_default(context):
                                 CONF.until_refresh,
                                 context.session)
         else:
-            usage.update({'in_use': int(usage.first().in_use) + 1})
+            usage.update({'in_use': int(usage.first().in_use) + 1,
+                          'generation': models.QuotaUsage.generation + 1},
+                         synchronize_session=False)
 
         default_rules = _security_group_rule_get_default_query(context).all()
         for default_rule in default_rules:
@@ -6285,15 +6473,63 @@ def task_log_end_task(context, task_name, period_beginning, period_ending,
 ##################
 
 
-def _archive_deleted_rows_for_table(tablename, max_rows):
+class _ArchiveBudget(object):
+    """The number of rows left to archive, shared by the tables archived
+    concurrently. None means no limit.
+    """
+
+    def __init__(self, max_rows):
+        self.rows = max_rows
+
+    def claim(self, rows):
+        """Reserve up to rows rows (None for all the rows left) and return
+        how many were reserved.
+        """
+        if self.rows is None:
+            return rows
+        claimed = self.rows if rows is None else min(rows, self.rows)
+        self.rows -= claimed
+        return claimed
+
+    def release(self, rows):
+        """Give back reserved rows which were not archived."""
+        if self.rows is not None:
+            self.rows += rows
+
+
+def _archive_deleted_rows_for_table(tablename, max_rows, chunk_size=None,
+                                    checkpoints=None):
     """Move up to max_rows rows from one tables to the corresponding
     shadow table.
 
+    :param chunk_size: maximum number of rows moved per transaction, None
+                       to move all the rows in one transaction
+    :param checkpoints: dict mapping table names to the primary key of the
+                        last row archived, see _archive_table()
     :returns: number of rows archived
     """
-    # NOTE(guochbo): There is a circular import, nova.db.sqlalchemy.utils
-    # imports nova.db.sqlalchemy.api.
-    from nova.db.sqlalchemy import utils as db_utils
+    return _archive_table(tablename, _ArchiveBudget(max_rows), chunk_size,
+                          checkpoints)
+
+
+def _archive_table(tablename, budget, chunk_size, checkpoints):
+    """Move the deleted rows of a table to the corresponding shadow table,
+    in chunks of up to chunk_size rows, as long as the budget allows.
+
+    Each chunk is the range of primary keys up to the key of its last row,
+    which is moved in its own short transaction. The next chunk starts after
+    that key, so that the rows already passed over are not scanned again.
+    If checkpoints is a dict, this key is recorded in it under the table
+    name and the archiving starts after the key recorded there by a previous
+    run, e.g. one interrupted or stopped by max_rows. The entry is removed
+    when no deleted rows are left after it: the next run starts from the
+    first row again, to archive the rows deleted since.
+
+    :returns: number of rows archived
+    """
+    rows_archived = 0
+    if budget.rows == 0:
+        return rows_archived
 
     engine = get_engine()
     conn = engine.connect()
@@ -6306,7 +6542,6 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
     table = models.BASE.metadata.tables[tablename]
 
     shadow_tablename = _SHADOW_TABLE_PREFIX + tablename
-    rows_archived = 0
     try:
         shadow_table = Table(shadow_tablename, metadata, autoload=True)
     except NoSuchTableError:
@@ -6319,8 +6554,6 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
         column = table.c.domain
     else:
         column = table.c.id
-    # NOTE(guochbo): Use DeleteFromSelect to avoid
-    # database's limit of maximum parameter in one SQL statement.
     deleted_column = table.c.deleted
     columns = [c.name for c in table.c]
 
@@ -6352,39 +6585,101 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
 
         conn.execute(update_statement)
 
-    insert = shadow_table.insert(inline=True).\
-        from_select(columns,
-                    sql.select([table],
-                               deleted_column != deleted_column.default.arg).
-                    order_by(column).limit(max_rows))
-    query_delete = sql.select([column],
-                          deleted_column != deleted_column.default.arg).\
-                          order_by(column).limit(max_rows)
-
-    delete_statement = db_utils.DeleteFromSelect(table, query_delete, column)
-    try:
-        # Group the insert and delete in a transaction.
-        with conn.begin():
-            conn.execute(insert)
-            result_delete = conn.execute(delete_statement)
-    except db_exc.DBReferenceError as ex:
-        # A foreign key constraint keeps us from deleting some of
-        # these rows until we clean up a dependent table.  Just
-        # skip this table for now; we'll come back to it later.
-        LOG.warning(_LW("IntegrityError detected when archiving table "
-                     "%(tablename)s: %(error)s"),
-                 {'tablename': tablename, 'error': six.text_type(ex)})
-        return rows_archived
+    last_key = None
+    if checkpoints is not None:
+        last_key = checkpoints.get(tablename)
+    while True:
+        limit = budget.claim(chunk_size)
+        if limit == 0:
+            break
+        deleted = deleted_column != deleted_column.default.arg
+        if last_key is not None:
+            deleted = and_(deleted, column > last_key)
+        chunk = sql.select([column], deleted).\
+            order_by(column).limit(limit).alias()
+        upper_key = conn.execute(
+            sql.select([func.max(chunk.c[column.name])])).scalar()
+        if upper_key is None:
+            budget.release(limit)
+            # Nothing left to archive in this table
+            if checkpoints is not None:
+                checkpoints.pop(tablename, None)
+            break
+        chunk_rows = and_(deleted, column <= upper_key)
+        insert = shadow_table.insert(inline=True).\
+            from_select(columns, sql.select([table], chunk_rows))
+        delete_statement = table.delete().where(chunk_rows)
+        try:
+            # Group the insert and delete in a transaction.
+            with conn.begin():
+                conn.execute(insert)
+                result_delete = conn.execute(delete_statement)
+        except db_exc.DBReferenceError as ex:
+            budget.release(limit)
+            # A foreign key constraint keeps us from deleting some of
+            # these rows until we clean up a dependent table.  Just
+            # skip this table for now; we'll come back to it later.
+            LOG.warning(_LW("IntegrityError detected when archiving table "
+                         "%(tablename)s: %(error)s"),
+                     {'tablename': tablename, 'error': six.text_type(ex)})
+            break
 
-    rows_archived = result_delete.rowcount
+        rows_archived += result_delete.rowcount
+        if limit is not None:
+            budget.release(limit - result_delete.rowcount)
+        last_key = upper_key
+        if checkpoints is not None:
+            checkpoints[tablename] = upper_key
 
     return rows_archived
 
 
-def archive_deleted_rows(max_rows=None):
+def _archive_table_groups(meta):
+    """Return lists of the names of the tables to archive, in the order in
+    which to archive them.
+
+    A table is only listed after all the tables with a foreign key to it,
+    which are in the previous lists: the tables of a list don't reference
+    each other, so they can be archived concurrently.
+    """
+    referencing = collections.defaultdict(set)
+    for table in meta.sorted_tables:
+        for fk in table.foreign_keys:
+            if fk.column.table is not table:
+                referencing[fk.column.table.name].add(table.name)
+
+    depths = {}
+    groups = collections.defaultdict(list)
+    # Reverse sort the tables so we get the leaf nodes first for processing.
+    for table in reversed(meta.sorted_tables):
+        tablename = table.name
+        depths[tablename] = max([depths.get(name, 0) + 1
+                                 for name in referencing[tablename]] or [0])
+        # skip the special sqlalchemy-migrate migrate_version table and any
+        # shadow tables
+        if (tablename == 'migrate_version' or
+                tablename.startswith(_SHADOW_TABLE_PREFIX)):
+            continue
+        groups[depths[tablename]].append(tablename)
+    return [groups[depth] for depth in sorted(groups)]
+
+
+def archive_deleted_rows(max_rows=None, chunk_size=None, workers=1,
+                         checkpoints=None, durations=None):
     """Move up to max_rows rows from production tables to the corresponding
     shadow tables.
 
+    The tables are archived children first, so that the foreign keys of the
+    rows archived don't stop the archiving of the rows they reference. Up to
+    workers tables which don't reference each other are archived at once.
+
+    :param chunk_size: maximum number of rows moved per transaction, None
+                       to move the rows of each table in one transaction
+    :param checkpoints: dict mapping table names to the primary key of the
+                        last row archived, to resume archiving from there;
+                        updated as the rows are archived
+    :param durations: dict which is updated with the number of seconds spent
+                      archiving each table
     :returns: dict that maps table name to number of rows archived from that
               table, for example:
 
@@ -6398,25 +6693,31 @@ def archive_deleted_rows(max_rows=None):
 
     """
     table_to_rows_archived = {}
-    total_rows_archived = 0
+    budget = _ArchiveBudget(max_rows)
     meta = MetaData(get_engine(use_slave=True))
     meta.reflect()
-    # Reverse sort the tables so we get the leaf nodes first for processing.
-    for table in reversed(meta.sorted_tables):
-        tablename = table.name
-        # skip the special sqlalchemy-migrate migrate_version table and any
-        # shadow tables
-        if (tablename == 'migrate_version' or
-                tablename.startswith(_SHADOW_TABLE_PREFIX)):
-            continue
-        rows_archived = _archive_deleted_rows_for_table(
-            tablename, max_rows=max_rows - total_rows_archived)
-        total_rows_archived += rows_archived
+
+    def _archive(tablename):
+        with timeutils.StopWatch() as timer:
+            rows_archived = _archive_table(tablename, budget, chunk_size,
+                                           checkpoints)
+        if durations is not None:
+            durations[tablename] = timer.elapsed()
         # Only report results for tables that had updates.
         if rows_archived:
             table_to_rows_archived[tablename] = rows_archived
-        if total_rows_archived >= max_rows:
-            break
+
+    pool = eventlet.GreenPool(workers)
+    for tablenames in _archive_table_groups(meta):
+        threads = []
+        for tablename in tablenames:
+            if budget.rows == 0:
+                break
+            threads.append(pool.spawn(_archive, tablename))
+        # The next tables are referenced by these ones, wait for them and
+        # raise their errors
+        for thread in threads:
+            thread.wait()
     return table_to_rows_archived
 
 
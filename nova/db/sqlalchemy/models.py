@@ -503,6 +503,13 @@ class QuotaUsage(BASE, NovaBase, models.SoftDeleteMixin):
 
     until_refresh = Column(Integer)
 
+    # NOTE: Every update of a usage bumps its generation, and only applies
+    # if the row still has the generation it was read with. This is what
+    # lets quota_reserve_optimistic() read usages without locking them.
+    generation = Column(Integer, default=0)
+
+    __mapper_args__ = {'version_id_col': generation}
+
 
 class Reservation(BASE, NovaBase, models.SoftDeleteMixin):
     """Represents a resource reservation for quotas."""
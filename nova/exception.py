@@ -1076,6 +1076,12 @@ class ReservationNotFound(QuotaNotFound):
     msg_fmt = _("Quota reservation %(uuid)s could not be found.")
 
 
+class QuotaUsageConflict(NovaException):
+    msg_fmt = _("Quota usages of project %(project_id)s were updated "
+                "concurrently.")
+    code = 409
+
+
 class OverQuota(NovaException):
     msg_fmt = _("Quota exceeded for resources: %(overs)s")
 
@@ -103,29 +103,34 @@ class BaseFilterHandler(loadables.BaseLoader):
                           "%(obj_len)d host(s)",
                           {'cls_name': cls_name, 'obj_len': len(list_objs)})
         if not list_objs:
-            # Log the filtration history
-            # NOTE(sbauza): Since the Cells scheduler still provides a legacy
-            # dictionary for filter_props, and since we agreed on not modifying
-            # the Cells scheduler to support that because of Cells v2, we
-            # prefer to define a compatible way to address both types
-            if isinstance(spec_obj, dict):
-                rspec = spec_obj.get("request_spec", {})
-                inst_props = rspec.get("instance_properties", {})
-                inst_uuid = inst_props.get("uuid", "")
-            else:
-                inst_uuid = spec_obj.instance_uuid
-            msg_dict = {"inst_uuid": inst_uuid,
-                        "str_results": str(full_filter_results),
-                       }
-            full_msg = ("Filtering removed all hosts for the request with "
-                        "instance ID "
-                        "'%(inst_uuid)s'. Filter results: %(str_results)s"
-                       ) % msg_dict
-            msg_dict["str_results"] = str(part_filter_results)
-            part_msg = _LI("Filtering removed all hosts for the request with "
-                           "instance ID "
-                           "'%(inst_uuid)s'. Filter results: %(str_results)s"
-                           ) % msg_dict
-            LOG.debug(full_msg)
-            LOG.info(part_msg)
+            self._log_filtration_history(spec_obj, part_filter_results,
+                                         full_filter_results)
         return list_objs
+
+    def _log_filtration_history(self, spec_obj, part_filter_results,
+                                full_filter_results):
+        """Log the results of each filter once all objects were removed."""
+        # NOTE(sbauza): Since the Cells scheduler still provides a legacy
+        # dictionary for filter_props, and since we agreed on not modifying
+        # the Cells scheduler to support that because of Cells v2, we
+        # prefer to define a compatible way to address both types
+        if isinstance(spec_obj, dict):
+            rspec = spec_obj.get("request_spec", {})
+            inst_props = rspec.get("instance_properties", {})
+            inst_uuid = inst_props.get("uuid", "")
+        else:
+            inst_uuid = spec_obj.instance_uuid
+        msg_dict = {"inst_uuid": inst_uuid,
+                    "str_results": str(full_filter_results),
+                   }
+        full_msg = ("Filtering removed all hosts for the request with "
+                    "instance ID "
+                    "'%(inst_uuid)s'. Filter results: %(str_results)s"
+                   ) % msg_dict
+        msg_dict["str_results"] = str(part_filter_results)
+        part_msg = _LI("Filtering removed all hosts for the request with "
+                       "instance ID "
+                       "'%(inst_uuid)s'. Filter results: %(str_results)s"
+                       ) % msg_dict
+        LOG.debug(full_msg)
+        LOG.info(part_msg)
@@ -54,6 +54,7 @@ This module provides Manager, a base class for managers.
 from oslo_config import cfg
 from oslo_service import periodic_task
 
+from nova import counters
 from nova.db import base
 from nova import rpc
 
@@ -65,6 +66,11 @@ CONF.import_opt('host', 'nova.netconf')
 class PeriodicTasks(periodic_task.PeriodicTasks):
     def __init__(self):
         super(PeriodicTasks, self).__init__(CONF)
+        # Time every run of the periodic tasks in the counters, as
+        # 'periodic_task.<task name>'
+        self._periodic_tasks = [
+            (name, counters.timed('periodic_task.%s' % name)(task))
+            for name, task in self._periodic_tasks]
 
 
 class Manager(base.Base, PeriodicTasks):
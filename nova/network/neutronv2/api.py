@@ -19,6 +19,7 @@ import copy
 import time
 import uuid
 
+import eventlet
 from keystoneauth1 import loading as ks_loading
 from neutronclient.common import exceptions as neutron_client_exc
 from neutronclient.v2_0 import client as clientv20
@@ -54,6 +55,20 @@ neutron_opts = [
                 default=600,
                 help='Number of seconds before querying neutron for'
                      ' extensions'),
+    cfg.IntOpt('port_request_concurrency',
+               default=4,
+               min=1,
+               help='Maximum number of the ports of an instance created or '
+                    'updated concurrently when allocating its network '
+                    'resources'),
+    cfg.IntOpt('details_cache_ttl',
+               default=0,
+               min=0,
+               help='Number of seconds the details of the networks and '
+                    'subnets fetched from neutron are cached for, so that '
+                    'the network info of the instances being built can be '
+                    'refreshed without fetching them again. 0 disables the '
+                    'cache'),
    ]
 
 NEUTRON_GROUP = 'neutron'
@@ -170,6 +185,39 @@ def _is_not_duplicate(item, items, items_list_name, instance):
     return not present
 
 
+class _DetailsCache(object):
+    """A short-lived cache of the details of neutron resources, e.g. the
+    networks or subnets, by project and ID.
+
+    The items expire CONF.neutron.details_cache_ttl seconds after being
+    added, nothing is cached if that is 0.
+    """
+
+    def __init__(self):
+        self._items = {}
+
+    def get(self, kind, project_id, ids):
+        """Return a dict of the unexpired items of the given IDs, by ID."""
+        now = time.time()
+        found = {}
+        for id_ in ids:
+            entry = self._items.get((kind, project_id, id_))
+            if entry is not None and entry[0] > now:
+                found[id_] = entry[1]
+        return found
+
+    def add(self, kind, project_id, items):
+        """Add the given dict of items, by ID."""
+        ttl = CONF.neutron.details_cache_ttl
+        if not ttl:
+            return
+        now = time.time()
+        self._items = {key: entry for key, entry in self._items.items()
+                       if entry[0] > now}
+        for id_, item in items.items():
+            self._items[(kind, project_id, id_)] = (now + ttl, item)
+
+
 class API(base_api.NetworkAPI):
     """API for interacting with the neutron 2.x API."""
 
@@ -177,6 +225,7 @@ class API(base_api.NetworkAPI):
         super(API, self).__init__(skip_policy_check=skip_policy_check)
         self.last_neutron_extension_sync = None
         self.extensions = {}
+        self._details_cache = _DetailsCache()
 
     def setup_networks_on_host(self, context, instance, host=None,
                                teardown=False):
@@ -195,8 +244,17 @@ class API(base_api.NetworkAPI):
             # If user has specified to attach instance only to specific
             # networks then only add these to **search_opts. This search will
             # also include 'shared' networks.
-            search_opts = {'id': net_ids}
-            nets = neutron.list_networks(**search_opts).get('networks', [])
+            cached = self._details_cache.get('network', project_id, net_ids)
+            if len(cached) == len(set(net_ids)):
+                nets = [copy.deepcopy(cached[net_id])
+                        for net_id in set(net_ids)]
+            else:
+                search_opts = {'id': net_ids}
+                nets = neutron.list_networks(**search_opts).get('networks',
+                                                                [])
+                self._details_cache.add(
+                    'network', project_id,
+                    {net['id']: copy.deepcopy(net) for net in nets})
         else:
             # (1) Retrieve non-public network list owned by the tenant.
             search_opts = {'tenant_id': project_id, 'shared': False}
@@ -613,6 +671,7 @@ class API(base_api.NetworkAPI):
         created_port_ids = []
         ports_in_requested_order = []
         nets_in_requested_order = []
+        requests_and_networks = []
         for request in ordered_networks:
             # Network lookup for available network_id
             network = None
@@ -637,35 +696,52 @@ class API(base_api.NetworkAPI):
                     and network.get('port_security_enabled', True))):
 
                 raise exception.SecurityGroupCannotBeApplied()
-            zone = 'compute:%s' % instance.availability_zone
-            port_req_body = {'port': {'device_id': instance.uuid,
-                                      'device_owner': zone}}
+            requests_and_networks.append((request, network))
+
+        # The ports are created or updated concurrently. Once one of them
+        # fails, the requests not started yet are skipped, and the ports of
+        # the other ones are unbound or deleted.
+        allocated_port_ids = {}
+        failed = []
+
+        def _allocate_port(index, request, network):
+            if failed:
+                return
             try:
-                self._populate_neutron_extension_values(
-                    context, instance, request.pci_request_id, port_req_body,
-                    network=network, neutron=neutron,
-                    bind_host_id=bind_host_id)
-                if request.port_id:
-                    port = ports[request.port_id]
-                    port_client.update_port(port['id'], port_req_body)
-                    preexisting_port_ids.append(port['id'])
-                    ports_in_requested_order.append(port['id'])
-                else:
-                    created_port = self._create_port(
-                            port_client, instance, request.network_id,
-                            port_req_body, request.address,
-                            security_group_ids, available_macs, dhcp_opts)
-                    created_port_ids.append(created_port)
-                    ports_in_requested_order.append(created_port)
+                port_id = self._create_or_update_port(
+                    context, instance, request, network, ports, neutron,
+                    port_client, security_group_ids, available_macs,
+                    dhcp_opts, bind_host_id)
+                allocated_port_ids[index] = port_id
                 self._update_port_dns_name(context, instance, network,
-                                           ports_in_requested_order[-1],
-                                           neutron)
+                                           port_id, neutron)
             except Exception:
-                with excutils.save_and_reraise_exception():
-                    self._unbind_ports(context,
-                                       preexisting_port_ids,
-                                       neutron, port_client)
-                    self._delete_ports(neutron, instance, created_port_ids)
+                failed.append(index)
+                raise
+
+        pool = eventlet.GreenPool(CONF.neutron.port_request_concurrency)
+        threads = [pool.spawn(_allocate_port, index, request, network)
+                   for index, (request, network)
+                   in enumerate(requests_and_networks)]
+        pool.waitall()
+        for index, (request, network) in enumerate(requests_and_networks):
+            if index not in allocated_port_ids:
+                continue
+            port_id = allocated_port_ids[index]
+            if request.port_id:
+                preexisting_port_ids.append(port_id)
+            else:
+                created_port_ids.append(port_id)
+            ports_in_requested_order.append(port_id)
+        try:
+            for thread in threads:
+                thread.wait()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._unbind_ports(context,
+                                   preexisting_port_ids,
+                                   neutron, port_client)
+                self._delete_ports(neutron, instance, created_port_ids)
         nw_info = self.get_instance_nw_info(
             context, instance, networks=nets_in_requested_order,
             port_ids=ports_in_requested_order,
@@ -681,6 +757,31 @@ class API(base_api.NetworkAPI):
                                           if vif['id'] in created_port_ids +
                                           preexisting_port_ids])
 
+    def _create_or_update_port(self, context, instance, request, network,
+                               ports, neutron, port_client,
+                               security_group_ids, available_macs,
+                               dhcp_opts, bind_host_id):
+        """Update the requested port for the instance, or create one on the
+        requested network.
+
+        :returns: ID of the port.
+        """
+        zone = 'compute:%s' % instance.availability_zone
+        port_req_body = {'port': {'device_id': instance.uuid,
+                                  'device_owner': zone}}
+        self._populate_neutron_extension_values(
+            context, instance, request.pci_request_id, port_req_body,
+            network=network, neutron=neutron,
+            bind_host_id=bind_host_id)
+        if request.port_id:
+            port = ports[request.port_id]
+            port_client.update_port(port['id'], port_req_body)
+            return port['id']
+        return self._create_port(
+                port_client, instance, request.network_id,
+                port_req_body, request.address,
+                security_group_ids, available_macs, dhcp_opts)
+
     def _refresh_neutron_extensions_cache(self, context, neutron=None):
         """Refresh the neutron extensions cache when necessary."""
         if (not self.last_neutron_extension_sync or
@@ -1563,12 +1664,22 @@ class API(base_api.NetworkAPI):
         """Force add a network to the project."""
         raise NotImplementedError()
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, client, port, floating_ips=None):
+        """Return the fixed IPs of the port with their floating IPs.
+
+        :param floating_ips: Optional list of the floating IPs of the port,
+            fetched from neutron for each fixed IP if not given.
+        """
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
+            if floating_ips is None:
+                floats = self._get_floating_ips_by_fixed_and_port(
+                    client, fixed_ip['ip_address'], port['id'])
+            else:
+                floats = [ip for ip in floating_ips
+                          if ip['fixed_ip_address'] ==
+                          fixed_ip['ip_address']]
             for ip in floats:
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
@@ -1576,8 +1687,25 @@ class API(base_api.NetworkAPI):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs,
+                             subnets_by_id=None):
+        """Return the subnets of the port with their fixed IPs.
+
+        :param subnets_by_id: Optional dict of the subnets of the port, by
+            ID, as returned by _get_subnets_by_id(). They are fetched from
+            neutron if not given.
+        """
+        if subnets_by_id is None:
+            subnets = self._get_subnets_from_port(context, port)
+        else:
+            # The subnets are copied since each port sets their IPs
+            subnet_ids = []
+            for ip in port['fixed_ips']:
+                if (ip['subnet_id'] in subnets_by_id and
+                        ip['subnet_id'] not in subnet_ids):
+                    subnet_ids.append(ip['subnet_id'])
+            subnets = [copy.deepcopy(subnets_by_id[subnet_id])
+                       for subnet_id in subnet_ids]
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -1707,6 +1835,16 @@ class API(base_api.NetworkAPI):
             current_neutron_port_map[current_neutron_port['id']] = (
                 current_neutron_port)
 
+        # Fetch the floating IPs and the subnets of all the ports at once,
+        # rather than port by port
+        ports = [current_neutron_port_map[port_id] for port_id in port_ids
+                 if port_id in current_neutron_port_map]
+        floating_ips = self._get_floating_ips_by_ports(
+            client, [port['id'] for port in ports])
+        subnets_by_id = self._get_subnets_by_id(
+            context, [ip['subnet_id']
+                      for port in ports for ip in port['fixed_ips']])
+
         for port_id in port_ids:
             current_neutron_port = current_neutron_port_map.get(port_id)
             if current_neutron_port:
@@ -1715,11 +1853,12 @@ class API(base_api.NetworkAPI):
                     or current_neutron_port['status'] == 'ACTIVE'):
                     vif_active = True
 
-                network_IPs = self._nw_info_get_ips(client,
-                                                    current_neutron_port)
-                subnets = self._nw_info_get_subnets(context,
-                                                    current_neutron_port,
-                                                    network_IPs)
+                network_IPs = self._nw_info_get_ips(
+                    client, current_neutron_port,
+                    floating_ips.get(current_neutron_port['id'], []))
+                subnets = self._nw_info_get_subnets(
+                    context, current_neutron_port, network_IPs,
+                    subnets_by_id)
 
                 devname = "tap" + current_neutron_port['id']
                 devname = devname[:network_model.NIC_NAME_LEN]
@@ -1752,55 +1891,97 @@ class API(base_api.NetworkAPI):
 
         return nw_info
 
+    def _get_floating_ips_by_ports(self, client, port_ids):
+        """Return the floating IPs of the given ports, as a dict of lists
+        by port ID.
+        """
+        floating_ips = {}
+        if not port_ids:
+            return floating_ips
+        for fip in self._safe_get_floating_ips(client, port_id=port_ids):
+            floating_ips.setdefault(fip['port_id'], []).append(fip)
+        return floating_ips
+
     def _get_subnets_from_port(self, context, port):
         """Return the subnets for a given port."""
+        subnets_by_id = self._get_subnets_by_id(
+            context, [ip['subnet_id'] for ip in port['fixed_ips']])
+        return list(subnets_by_id.values())
+
+    def _get_subnets_by_id(self, context, subnet_ids):
+        """Return the given subnets as a dict of network_model.Subnet by ID.
 
-        fixed_ips = port['fixed_ips']
+        The subnets and their DHCP ports are listed with one request each,
+        the recently fetched ones are served from the details cache.
+        """
         # No fixed_ips for the port means there is no subnet associated
         # with the network the port is created on.
         # Since list_subnets(id=[]) returns all subnets visible for the
         # current tenant, returned subnets may contain subnets which is not
         # related to the port. To avoid this, the method returns here.
-        if not fixed_ips:
-            return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
-        subnets = []
-
-        for subnet in ipam_subnets:
-            subnet_dict = {'cidr': subnet['cidr'],
-                           'gateway': network_model.IP(
-                                address=subnet['gateway_ip'],
-                                type='gateway'),
-            }
-
-            # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
-                for ip_pair in p['fixed_ips']:
-                    if ip_pair['subnet_id'] == subnet['id']:
-                        subnet_dict['dhcp_server'] = ip_pair['ip_address']
-                        break
-
-            subnet_object = network_model.Subnet(**subnet_dict)
-            for dns in subnet.get('dns_nameservers', []):
-                subnet_object.add_dns(
-                    network_model.IP(address=dns, type='dns'))
-
-            for route in subnet.get('host_routes', []):
-                subnet_object.add_route(
-                    network_model.Route(cidr=route['destination'],
-                                        gateway=network_model.IP(
-                                            address=route['nexthop'],
-                                            type='gateway')))
-
-            subnets.append(subnet_object)
+        if not subnet_ids:
+            return {}
+        # Drop the duplicates, keeping the order
+        subnet_ids = sorted(set(subnet_ids), key=subnet_ids.index)
+        cached = self._details_cache.get('subnet', context.project_id,
+                                         subnet_ids)
+        missing_ids = [subnet_id for subnet_id in subnet_ids
+                       if subnet_id not in cached]
+        if missing_ids:
+            client = get_client(context)
+            search_opts = {'id': missing_ids}
+            data = client.list_subnets(**search_opts)
+            ipam_subnets = data.get('subnets', [])
+            dhcp_servers = {}
+            if ipam_subnets:
+                # attempt to populate DHCP server field
+                network_ids = sorted(set(subnet['network_id']
+                                         for subnet in ipam_subnets))
+                search_opts = {'network_id': network_ids,
+                               'device_owner': 'network:dhcp'}
+                data = client.list_ports(**search_opts)
+                for p in data.get('ports', []):
+                    for ip_pair in p['fixed_ips']:
+                        dhcp_servers[ip_pair['subnet_id']] = (
+                            ip_pair['ip_address'])
+            fetched = {}
+            for subnet in ipam_subnets:
+                fetched[subnet['id']] = (subnet,
+                                         dhcp_servers.get(subnet['id']))
+            self._details_cache.add('subnet', context.project_id, fetched)
+            cached.update(fetched)
+
+        subnets = {}
+        for subnet_id in subnet_ids:
+            if subnet_id in cached:
+                subnet, dhcp_server = cached[subnet_id]
+                subnets[subnet_id] = self._build_subnet(subnet, dhcp_server)
         return subnets
 
+    @staticmethod
+    def _build_subnet(subnet, dhcp_server):
+        """Return a network_model.Subnet for the given neutron subnet."""
+        subnet_dict = {'cidr': subnet['cidr'],
+                       'gateway': network_model.IP(
+                            address=subnet['gateway_ip'],
+                            type='gateway'),
+        }
+        if dhcp_server:
+            subnet_dict['dhcp_server'] = dhcp_server
+
+        subnet_object = network_model.Subnet(**subnet_dict)
+        for dns in subnet.get('dns_nameservers', []):
+            subnet_object.add_dns(
+                network_model.IP(address=dns, type='dns'))
+
+        for route in subnet.get('host_routes', []):
+            subnet_object.add_route(
+                network_model.Route(cidr=route['destination'],
+                                    gateway=network_model.IP(
+                                        address=route['nexthop'],
+                                        type='gateway')))
+        return subnet_object
+
     def get_dns_domains(self, context):
         """Return a list of available dns domains.
 
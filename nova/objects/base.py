@@ -14,6 +14,7 @@
 
 """Nova common internal object model"""
 
+import collections
 import contextlib
 import datetime
 import functools
@@ -24,6 +25,7 @@ import oslo_messaging as messaging
 from oslo_utils import versionutils
 from oslo_versionedobjects import base as ovoo_base
 from oslo_versionedobjects import exception as ovoo_exc
+from oslo_versionedobjects import fields as ovoo_fields
 import six
 
 from nova import exception
@@ -128,6 +130,29 @@ class NovaObject(ovoo_base.VersionedObject):
         else:
             self._changed_fields.clear()
 
+    @classmethod
+    def _obj_from_primitive(cls, context, objver, primitive):
+        # NOTE: This is the base implementation, except that the values
+        # of the primitive which the fields would coerce to themselves are
+        # stored as they are, see _get_primitive_plan().
+        self = cls()
+        self._context = context
+        self.VERSION = objver
+        objdata = cls._obj_primitive_field(primitive, 'data')
+        changes = cls._obj_primitive_field(primitive, 'changes', [])
+        for name, attrname, field, kind, coerced_types in (
+                _get_primitive_plan(cls).fields):
+            if name not in objdata:
+                continue
+            value = objdata[name]
+            if coerced_types and (type(value) in coerced_types or
+                                  (value is None and field.nullable)):
+                setattr(self, attrname, value)
+            else:
+                setattr(self, name, field.from_primitive(self, name, value))
+        self._changed_fields = set([x for x in changes if x in self.fields])
+        return self
+
     # NOTE(danms): This is nova-specific
     @contextlib.contextmanager
     def obj_alternate_context(self, context):
@@ -216,6 +241,165 @@ class ObjectListBase(ovoo_base.ObjectListBase):
             return primitive.get(key, default)
 
 
+# Kinds of fields in a primitive plan
+_FIELD_OTHER = 'other'
+_FIELD_PLAIN = 'plain'
+_FIELD_PLAIN_DICT = 'plain_dict'
+_FIELD_PLAIN_LIST = 'plain_list'
+_FIELD_OBJECT = 'object'
+_FIELD_OBJECT_LIST = 'object_list'
+
+# The types of the values which the coerce() of these field types returns
+# unchanged.
+_COERCED_TYPES = {
+    ovoo_fields.String: (six.text_type,),
+    ovoo_fields.Integer: six.integer_types,
+    ovoo_fields.Float: (float,),
+    ovoo_fields.Boolean: (bool,),
+}
+
+_PrimitivePlan = collections.namedtuple(
+    '_PrimitivePlan', ['name', 'namespace', 'keys', 'fields'])
+
+_base_obj_to_primitive = six.get_unbound_function(
+    ovoo_base.VersionedObject.obj_to_primitive)
+_base_obj_what_changed = six.get_unbound_function(
+    ovoo_base.VersionedObject.obj_what_changed)
+_list_obj_what_changed = six.get_unbound_function(
+    ovoo_base.ObjectListBase.obj_what_changed)
+
+_primitive_plans = {}
+
+
+def _inherits(cls, base, name):
+    """Return whether cls uses the implementation of name of base."""
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return klass is base
+    return False
+
+
+def _get_field_kind(field):
+    if not _inherits(type(field), ovoo_fields.Field, 'to_primitive'):
+        return _FIELD_OTHER
+    field_type = type(field._type)
+    if _inherits(field_type, ovoo_fields.FieldType, 'to_primitive'):
+        return _FIELD_PLAIN
+    if _inherits(field_type, ovoo_fields.Object, 'to_primitive'):
+        return _FIELD_OBJECT
+    if _inherits(field_type, ovoo_fields.Dict, 'to_primitive'):
+        if _get_field_kind(field._type._element_type) == _FIELD_PLAIN:
+            return _FIELD_PLAIN_DICT
+    elif _inherits(field_type, ovoo_fields.List, 'to_primitive'):
+        element_kind = _get_field_kind(field._type._element_type)
+        if element_kind == _FIELD_PLAIN:
+            return _FIELD_PLAIN_LIST
+        elif element_kind == _FIELD_OBJECT:
+            return _FIELD_OBJECT_LIST
+    return _FIELD_OTHER
+
+
+def _get_coerced_types(field):
+    if not (_inherits(type(field), ovoo_fields.Field, 'from_primitive') and
+            _inherits(type(field), ovoo_fields.Field, 'coerce')):
+        return None
+    return _COERCED_TYPES.get(type(field._type))
+
+
+def _get_primitive_plan(cls):
+    """Return the plan to turn objects of cls into primitives and back.
+
+    The plan is computed once per object class, and so per version of the
+    object, from its fields: how each field turns into a primitive and
+    which primitive types each field can store as they are.
+    """
+    try:
+        return _primitive_plans[cls]
+    except KeyError:
+        pass
+    fields = []
+    for name, field in cls.fields.items():
+        fields.append((name, get_attrname(name), field,
+                       _get_field_kind(field), _get_coerced_types(field)))
+    keys = tuple(cls._obj_primitive_key(key)
+                 for key in ('name', 'namespace', 'version', 'data',
+                             'changes'))
+    plan = _PrimitivePlan(name=cls.obj_name(),
+                          namespace=cls.OBJ_PROJECT_NAMESPACE, keys=keys,
+                          fields=fields)
+    _primitive_plans[cls] = plan
+    return plan
+
+
+def _obj_to_primitive(obj):
+    """Turn an object into its primitive, as obj.obj_to_primitive() does.
+
+    Nested objects are turned into primitives following the plans of their
+    own classes, and whether they have changes is found in the same pass
+    rather than by walking them again for each parent object. Objects which
+    override obj_to_primitive are left to it.
+
+    :returns: A tuple of the primitive and whether the object has changes.
+    """
+    if (getattr(obj.obj_to_primitive, '__func__', None) is not
+            _base_obj_to_primitive):
+        primitive = obj.obj_to_primitive()
+        return primitive, obj._obj_primitive_key('changes') in primitive
+
+    plan = _get_primitive_plan(obj.__class__)
+
+    data = {}
+    changed_fields = set()
+    changed_objects = False
+    for name, attrname, field, kind, coerced_types in plan.fields:
+        try:
+            value = getattr(obj, attrname)
+        except AttributeError:
+            continue
+        if kind == _FIELD_OTHER:
+            data[name] = field.to_primitive(obj, name, value)
+            if (isinstance(value, ovoo_base.VersionedObject) and
+                    value.obj_what_changed()):
+                changed_fields.add(name)
+        elif value is None or kind == _FIELD_PLAIN:
+            data[name] = value
+        elif kind == _FIELD_OBJECT:
+            data[name], changed = _obj_to_primitive(value)
+            if changed:
+                changed_fields.add(name)
+        elif kind == _FIELD_OBJECT_LIST:
+            items = []
+            for item in value:
+                item, changed = _obj_to_primitive(item)
+                items.append(item)
+                changed_objects = changed_objects or changed
+            data[name] = items
+        elif kind == _FIELD_PLAIN_DICT:
+            data[name] = dict(value)
+        else:
+            data[name] = list(value)
+
+    what_changed = getattr(obj.obj_what_changed, '__func__', None)
+    if what_changed is _base_obj_what_changed:
+        changes = set([x for x in obj._changed_fields if x in obj.fields])
+        changes |= changed_fields
+    elif what_changed is _list_obj_what_changed:
+        changes = set(obj._changed_fields)
+        if changed_objects:
+            changes.add('objects')
+    else:
+        changes = obj.obj_what_changed()
+
+    name_key, namespace_key, version_key, data_key, changes_key = plan.keys
+    primitive = {name_key: plan.name,
+                 namespace_key: plan.namespace,
+                 version_key: obj.VERSION,
+                 data_key: data}
+    if changes:
+        primitive[changes_key] = list(changes)
+    return primitive, bool(changes)
+
+
 class NovaObjectSerializer(messaging.NoOpSerializer):
     """A NovaObject-aware Serializer.
 
@@ -278,6 +462,8 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
         if isinstance(entity, (tuple, list, set, dict)):
             entity = self._process_iterable(context, self.serialize_entity,
                                             entity)
+        elif isinstance(entity, ovoo_base.VersionedObject):
+            entity = _obj_to_primitive(entity)[0]
         elif (hasattr(entity, 'obj_to_primitive') and
               callable(entity.obj_to_primitive)):
             entity = entity.obj_to_primitive()
@@ -1064,6 +1064,31 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
             limit=limit, marker=marker, expected_attrs=expected_attrs,
             use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs)
 
+    @classmethod
+    def iter_by_filters(cls, context, filters, limit=None, marker=None,
+                        expected_attrs=None, use_slave=False,
+                        sort_keys=None, sort_dirs=None, batch_size=100):
+        """Generate the instances get_by_filters() would return, reading
+        batch_size of them at a time.
+
+        Each batch is read from after the last instance of the previous one,
+        which only costs an index lookup of its sort keys, so the instances
+        can be processed as they come instead of all being loaded first.
+        """
+        while limit is None or limit > 0:
+            count = batch_size if limit is None else min(batch_size, limit)
+            batch = cls.get_by_filters(
+                context, filters, limit=count, marker=marker,
+                expected_attrs=expected_attrs, use_slave=use_slave,
+                sort_keys=sort_keys, sort_dirs=sort_dirs)
+            for instance in batch:
+                yield instance
+            if len(batch) < count:
+                return
+            marker = batch[-1].uuid
+            if limit is not None:
+                limit -= count
+
     @staticmethod
     @db.select_db_reader_mode
     def _db_instance_get_all_by_host(context, host, columns_to_join,
@@ -64,7 +64,8 @@ class NUMACell(base.NovaObject):
 
     @property
     def free_siblings(self):
-        return [sibling_set & self.free_cpus
+        free_cpus = self.free_cpus
+        return [sibling_set & free_cpus
                 for sibling_set in self.siblings]
 
     @property
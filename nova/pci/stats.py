@@ -14,8 +14,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import copy
-
 from oslo_log import log as logging
 import six
 
@@ -31,6 +29,24 @@ from nova.pci import whitelist
 LOG = logging.getLogger(__name__)
 
 
+def _compile_specs(request_specs):
+    """Compile the specs of a PCI request for matching against pools.
+
+    Each spec becomes a pair of tuples: the (position, value) of the
+    properties part of the pool index key, checked once per group of pools,
+    and the (property, value) of the others, checked for each pool.
+    """
+    compiled = []
+    for spec in request_specs:
+        index_items = tuple((i, spec[k])
+                            for i, k in enumerate(PciDeviceStats.index_keys)
+                            if k in spec)
+        other_items = tuple(sorted((k, v) for k, v in six.iteritems(spec)
+                                   if k not in PciDeviceStats.index_keys))
+        compiled.append((index_items, other_items))
+    return tuple(compiled)
+
+
 class PciDeviceStats(object):
 
     """PCI devices summary information.
@@ -57,6 +73,9 @@ class PciDeviceStats(object):
 
     pool_keys = ['product_id', 'vendor_id', 'numa_node', 'dev_type']
 
+    # The properties the pools are grouped by to match the requests
+    index_keys = ('vendor_id', 'product_id', 'numa_node', 'physical_network')
+
     def __init__(self, stats=None):
         super(PciDeviceStats, self).__init__()
         # NOTE(sbauza): Stats are a PCIDevicePoolList object
@@ -64,6 +83,30 @@ class PciDeviceStats(object):
                       for pci_pool in stats] if stats else []
         self.pools.sort(key=lambda item: len(item))
 
+    @property
+    def pools(self):
+        return self._pools
+
+    @pools.setter
+    def pools(self, pools):
+        self._pools = pools
+        self._invalidate_pool_index()
+
+    def _invalidate_pool_index(self):
+        """Forget the pool index, after pools were added or removed."""
+        self._pool_index = None
+        self._matching_pools = {}
+
+    def _get_pool_index(self):
+        """Return the pools, with their position, by index key."""
+        if self._pool_index is None:
+            index = {}
+            for position, pool in enumerate(self.pools):
+                key = tuple(pool.get(k) for k in self.index_keys)
+                index.setdefault(key, []).append((position, pool))
+            self._pool_index = index
+        return self._pool_index
+
     def _equal_properties(self, dev, entry, matching_keys):
         return all(dev.get(prop) == entry.get(prop)
                    for prop in matching_keys)
@@ -105,6 +148,7 @@ class PciDeviceStats(object):
                 dev_pool['devices'] = []
                 self.pools.append(dev_pool)
                 self.pools.sort(key=lambda item: len(item))
+                self._invalidate_pool_index()
                 pool = dev_pool
             pool['count'] += 1
             pool['devices'].append(dev)
@@ -132,6 +176,8 @@ class PciDeviceStats(object):
                 raise exception.PciDevicePoolEmpty(
                     compute_node_id=dev.compute_node_id, address=dev.address)
             pool['devices'].remove(dev)
+            if pool['count'] <= 1:
+                self._invalidate_pool_index()
             self._decrease_pool_count(self.pools, pool)
 
     def get_free_devs(self):
@@ -238,24 +284,82 @@ class PciDeviceStats(object):
         return [pool for pool in pools
                 if not pool.get('dev_type') == fields.PciDeviceType.SRIOV_PF]
 
-    def _apply_request(self, pools, request, numa_cells=None):
+    def _get_matching_pools(self, request, numa_cells=None):
+        """Return the pools, in order, the request can take devices from.
+
+        The pools matching a request are looked up in the pool index and
+        kept until pools are added or removed, as the scheduler checks the
+        same requests against a host over and over.
+        """
+        cell_ids = (frozenset([None] + [cell.id for cell in numa_cells])
+                    if numa_cells else None)
+        specs = _compile_specs(request.spec)
+        cache_key = (specs, cell_ids)
+        try:
+            return self._matching_pools[cache_key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Specs with unhashable values are matched every time
+            cache_key = None
+
+        numa_position = self.index_keys.index('numa_node')
+        exclude_pfs = all(spec.get('dev_type') != fields.PciDeviceType.SRIOV_PF
+                          for spec in request.spec)
+        matching = []
+        for key, pools in six.iteritems(self._get_pool_index()):
+            if cell_ids is not None and key[numa_position] not in cell_ids:
+                continue
+            group_specs = [other_items for index_items, other_items in specs
+                           if all(key[i] == v for i, v in index_items)]
+            if not group_specs:
+                continue
+            for position, pool in pools:
+                if exclude_pfs and (pool.get('dev_type') ==
+                                    fields.PciDeviceType.SRIOV_PF):
+                    continue
+                if any(all(pool.get(k) == v for k, v in items)
+                       for items in group_specs):
+                    matching.append((position, pool))
+        matching = [pool for position, pool in sorted(matching)]
+        if cache_key is not None:
+            self._matching_pools[cache_key] = matching
+        return matching
+
+    def _apply_request(self, request, numa_cells=None, consumed=None):
+        """Take the devices of request from the pools.
+
+        Without consumed the pools are updated. Otherwise the pools are
+        left alone and consumed, a dict of the devices taken from each
+        pool by id(pool), is updated instead.
+        """
         # NOTE(vladikr): This code maybe open to race conditions.
         # Two concurrent requests may succeed when called support_requests
         # because this method does not remove related devices from the pools
         count = request.count
-        matching_pools = self._filter_pools_for_spec(pools, request.spec)
-        if numa_cells:
-            matching_pools = self._filter_pools_for_numa_cells(matching_pools,
-                                                          numa_cells)
-        matching_pools = self._filter_non_requested_pfs(request,
-                                                        matching_pools)
-        if sum([pool['count'] for pool in matching_pools]) < count:
-            return False
-        else:
+        matching_pools = self._get_matching_pools(request, numa_cells)
+        if consumed is None:
+            if sum([pool['count'] for pool in matching_pools]) < count:
+                return False
+            npools = len(self.pools)
             for pool in matching_pools:
-                count = self._decrease_pool_count(pools, pool, count)
+                count = self._decrease_pool_count(self.pools, pool, count)
                 if not count:
                     break
+            if len(self.pools) != npools:
+                self._invalidate_pool_index()
+            return True
+
+        free = [(pool, pool['count'] - consumed.get(id(pool), 0))
+                for pool in matching_pools]
+        if sum(pool_free for pool, pool_free in free) < count:
+            return False
+        for pool, pool_free in free:
+            taken = min(pool_free, count)
+            consumed[id(pool)] = consumed.get(id(pool), 0) + taken
+            count -= taken
+            if not count:
+                break
         return True
 
     def support_requests(self, requests, numa_cells=None):
@@ -269,9 +373,12 @@ class PciDeviceStats(object):
         """
         # note (yjiang5): this function has high possibility to fail,
         # so no exception should be triggered for performance reason.
-        pools = copy.deepcopy(self.pools)
-        return all([self._apply_request(pools, r, numa_cells)
-                        for r in requests])
+        # The devices taken by the requests are only counted, so that the
+        # pools don't need to be copied and the first request that can't
+        # be met stops the check.
+        consumed = {}
+        return all(self._apply_request(r, numa_cells, consumed)
+                   for r in requests)
 
     def apply_requests(self, requests, numa_cells=None):
         """Apply PCI requests to the PCI stats.
@@ -281,7 +388,7 @@ class PciDeviceStats(object):
         If numa_cells is provided then only devices contained in
         those nodes are considered.
         """
-        if not all([self._apply_request(self.pools, r, numa_cells)
+        if not all([self._apply_request(r, numa_cells)
                                             for r in requests]):
             raise exception.PciDeviceRequestFailed(requests=requests)
 
@@ -96,6 +96,14 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.BoolOpt('quota_optimistic_reserve',
+                default=False,
+                help='Reserve quotas without locking the usages of the '
+                     'project. A reservation which finds that the usages it '
+                     'read were updated by a concurrent one before it could '
+                     'update them is retried, rather than every reservation '
+                     'of a project waiting on the row locks of the others. '
+                     'This helps projects making many concurrent requests.'),
     ]
 
 CONF = cfg.CONF
@@ -577,10 +585,14 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
-        return db.quota_reserve(context, resources, quotas, user_quotas,
-                                deltas, expire,
-                                CONF.until_refresh, CONF.max_age,
-                                project_id=project_id, user_id=user_id)
+        if CONF.quota_optimistic_reserve:
+            quota_reserve = db.quota_reserve_optimistic
+        else:
+            quota_reserve = db.quota_reserve
+        return quota_reserve(context, resources, quotas, user_quotas,
+                             deltas, expire,
+                             CONF.until_refresh, CONF.max_age,
+                             project_id=project_id, user_id=user_id)
 
     def commit(self, context, reservations, project_id=None, user_id=None):
         """Commit reservations.
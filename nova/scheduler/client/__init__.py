@@ -14,11 +14,15 @@
 #    under the License.
 
 import functools
+import time
 
 from oslo_utils import importutils
 
+import nova.conf
 from nova.scheduler import utils
 
+CONF = nova.conf.CONF
+
 
 class LazyLoader(object):
 
@@ -45,6 +49,10 @@ class SchedulerClient(object):
             'nova.scheduler.client.query.SchedulerQueryClient'))
         self.reportclient = LazyLoader(importutils.import_class(
             'nova.scheduler.client.report.SchedulerReportClient'))
+        # Generation of the last update sent per (host, node). It starts at
+        # the current time in milliseconds so the schedulers see a gap, and
+        # not stale updates, when the compute service restarts.
+        self._compute_node_generations = {}
 
     @utils.retry_select_destinations
     def select_destinations(self, context, spec_obj):
@@ -58,6 +66,13 @@ class SchedulerClient(object):
 
     def update_resource_stats(self, compute_node):
         self.reportclient.update_resource_stats(compute_node)
+        if CONF.scheduler_tracks_compute_node_changes:
+            node_key = (compute_node.host, compute_node.hypervisor_hostname)
+            generation = self._compute_node_generations.get(
+                node_key, int(time.time() * 1000)) + 1
+            self._compute_node_generations[node_key] = generation
+            self.queryclient.update_compute_node(
+                compute_node._context, compute_node, generation)
 
     def update_instance_info(self, context, host_name, instance_info):
         self.queryclient.update_instance_info(context, host_name,
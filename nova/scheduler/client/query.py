@@ -83,3 +83,15 @@ class SchedulerQueryClient(object):
         """
         self.scheduler_rpcapi.sync_instance_info(context, host_name,
                                                  instance_uuids)
+
+    def update_compute_node(self, context, compute_node, generation):
+        """Sends the current state of a compute node to the schedulers
+        keeping host states in memory.
+
+        :param context: local context
+        :param compute_node: the saved nova.objects.ComputeNode
+        :param generation: number of this update, increasing with every
+                           update sent for the node
+        """
+        self.scheduler_rpcapi.update_compute_node(context, compute_node,
+                                                  generation)
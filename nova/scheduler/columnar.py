@@ -0,0 +1,226 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar filtering and weighing of host states.
+
+The numeric attributes of the host states are copied into NumPy arrays once
+per filtering or weighing pass, so that the filters and weighers supporting
+it (see BaseHostFilter.filter_columns() and BaseHostWeigher.weigh_columns())
+handle all the hosts with a few array operations instead of a Python call
+per host. The other filters and weighers run on the host states as usual.
+"""
+
+import operator
+
+from oslo_log import log as logging
+from oslo_utils import importutils
+from six.moves import map
+
+from nova.i18n import _LI
+from nova import weights
+
+np = importutils.try_import('numpy')
+
+LOG = logging.getLogger(__name__)
+
+
+class HostColumns(object):
+    """The numeric HostState attributes of a list of hosts, as arrays.
+
+    The arrays are indexed like the hosts list. The given fields are read
+    from the hosts right away, the other ones the first time they are used.
+    The mask tells which hosts are left while filtering.
+    """
+
+    FIELDS = ('free_ram_mb', 'total_usable_ram_mb', 'ram_allocation_ratio',
+              'free_disk_mb', 'total_usable_disk_gb', 'disk_allocation_ratio',
+              'vcpus_total', 'vcpus_used', 'cpu_allocation_ratio',
+              'num_instances', 'num_io_ops')
+
+    def __init__(self, hosts, fields=FIELDS):
+        self.hosts = hosts
+        for field in fields:
+            getattr(self, field)
+        self.mask = np.ones(len(hosts), dtype=bool)
+
+    def __getattr__(self, name):
+        if name not in self.FIELDS:
+            raise AttributeError(name)
+        # NOTE: a None, e.g. the allocation ratios of a host state never
+        # updated from its compute node, raises a TypeError
+        column = np.fromiter(map(operator.attrgetter(name), self.hosts),
+                             dtype=float, count=len(self.hosts))
+        setattr(self, name, column)
+        return column
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def remaining(self):
+        """Return the hosts left in the mask."""
+        return [self.hosts[i] for i in np.flatnonzero(self.mask).tolist()]
+
+    def set_limit(self, name, values, where):
+        """Set limits[name] of the hosts left where the where array is true
+        to the matching item of values.
+        """
+        indexes = np.flatnonzero(where & self.mask)
+        for i, value in zip(indexes.tolist(), values[indexes].tolist()):
+            self.hosts[i].limits[name] = value
+
+
+def available():
+    return np is not None
+
+
+def _get_columns(hosts, fields=HostColumns.FIELDS):
+    try:
+        return HostColumns(hosts, fields)
+    except (TypeError, ValueError) as e:
+        LOG.debug("Not using the columnar engine: %s", e)
+
+
+class ColumnarFilterHandler(object):
+    """Runs host filters on HostColumns where the filters support it.
+
+    Behaves like filter_handler.get_filtered_objects(), which is used for
+    the host lists that can't be turned into columns.
+    """
+
+    def __init__(self, filter_handler):
+        self.filter_handler = filter_handler
+
+    def get_filtered_objects(self, filters, objs, spec_obj, index=0):
+        list_objs = list(objs)
+        columns = _get_columns(list_objs)
+        if columns is None:
+            return self.filter_handler.get_filtered_objects(
+                filters, list_objs, spec_obj, index)
+        LOG.debug("Starting with %d host(s)", len(list_objs))
+        # Same as in get_filtered_objects(), except that the hosts left
+        # after each filter are kept as masks and only listed if all the
+        # hosts get removed
+        part_filter_results = []
+        full_filter_results = []
+        log_msg = "%(cls_name)s: (start: %(start)s, end: %(end)s)"
+        end_count = len(list_objs)
+        for filter_ in filters:
+            if not filter_.run_filter_for_index(index):
+                continue
+            cls_name = filter_.__class__.__name__
+            start_count = end_count
+            if filter_.supports_columns:
+                columns.mask &= filter_.filter_columns(columns, spec_obj)
+            else:
+                objs = filter_.filter_all(columns.remaining(), spec_obj)
+                if objs is None:
+                    LOG.debug("Filter %s says to stop filtering", cls_name)
+                    return
+                passed = set(id(obj) for obj in objs)
+                columns.mask &= np.fromiter(
+                    (id(host) in passed for host in columns.hosts),
+                    dtype=bool, count=len(columns))
+            end_count = int(np.count_nonzero(columns.mask))
+            part_filter_results.append(log_msg % {"cls_name": cls_name,
+                    "start": start_count, "end": end_count})
+            if not end_count:
+                LOG.info(_LI("Filter %s returned 0 hosts"), cls_name)
+                full_filter_results.append((cls_name, None))
+                break
+            full_filter_results.append((cls_name, columns.mask.copy()))
+            LOG.debug("Filter %(cls_name)s returned "
+                      "%(obj_len)d host(s)",
+                      {'cls_name': cls_name, 'obj_len': end_count})
+        if not end_count:
+            full_filter_results = [
+                (cls_name, mask if mask is None else [
+                    (columns.hosts[i].host, columns.hosts[i].nodename)
+                    for i in np.flatnonzero(mask).tolist()])
+                for cls_name, mask in full_filter_results]
+            self.filter_handler._log_filtration_history(
+                spec_obj, part_filter_results, full_filter_results)
+        return columns.remaining()
+
+
+class ColumnarWeightHandler(object):
+    """Runs host weighers on HostColumns where the weighers support it.
+
+    Behaves like weight_handler.get_weighed_objects() and returns objects
+    of its object_class.
+    """
+
+    def __init__(self, weight_handler):
+        self.weight_handler = weight_handler
+
+    def get_weighed_objects(self, weighers, obj_list, weighing_properties):
+        """Return a sorted (descending), normalized list of WeighedObjects."""
+        obj_list = list(obj_list)
+        # The attributes weighed are read as the weighers use them; unlike
+        # the allocation ratios they are always set.
+        columns = HostColumns(obj_list, fields=())
+        object_class = self.weight_handler.object_class
+
+        if len(obj_list) <= 1:
+            return [object_class(obj, 0.0) for obj in obj_list]
+
+        # Only built for the weighers without weigh_columns()
+        weighed_objs = None
+        total = np.zeros(len(obj_list))
+        for weigher in weighers:
+            if weigher.supports_columns:
+                weight_array = weigher.weigh_columns(columns,
+                                                     weighing_properties)
+                # Record the min and max values as weigh_objects() does
+                first = weight_array[0].item()
+                weigher.minval = min(
+                    first if weigher.minval is None else weigher.minval,
+                    weight_array.min().item())
+                weigher.maxval = max(
+                    first if weigher.maxval is None else weigher.maxval,
+                    weight_array.max().item())
+            else:
+                if weighed_objs is None:
+                    weighed_objs = [object_class(obj, 0.0)
+                                    for obj in obj_list]
+                weight_array = np.array(
+                    weigher.weigh_objects(weighed_objs, weighing_properties),
+                    dtype=float)
+            total += weigher.weight_multiplier() * _normalize(
+                weight_array, weigher.minval, weigher.maxval)
+
+        # A stable sort of the negated weights orders the hosts like the
+        # stable, reversed sort of weight_handler.get_weighed_objects()
+        order = np.argsort(-total, kind='mergesort').tolist()
+        weights_list = total.tolist()
+        if weighed_objs is None:
+            return [object_class(obj_list[i], weights_list[i])
+                    for i in order]
+        for i in order:
+            weighed_objs[i].weight = weights_list[i]
+        return [weighed_objs[i] for i in order]
+
+
+def _normalize(weight_array, minval, maxval):
+    """nova.weights.normalize() for an array."""
+    if minval is None or maxval is None:
+        return np.fromiter(weights.normalize(weight_array.tolist(),
+                                             minval=minval, maxval=maxval),
+                           dtype=float, count=len(weight_array))
+    minval = float(minval)
+    maxval = float(maxval)
+    if minval == maxval:
+        return np.zeros(len(weight_array))
+    return (weight_array - minval) / (maxval - minval)
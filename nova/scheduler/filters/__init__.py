@@ -31,6 +31,19 @@ class BaseHostFilter(filters.BaseFilter):
         """
         raise NotImplementedError()
 
+    # Set to True in a subclass implementing filter_columns()
+    supports_columns = False
+
+    def filter_columns(self, columns, spec_obj):
+        """Return a boolean array telling which hosts of a
+        nova.scheduler.columnar.HostColumns pass the filter.
+
+        Used instead of host_passes() when scheduler_use_columnar_engine is
+        set. The result must be the same as calling host_passes() on each
+        host, including the limits set on the passing hosts.
+        """
+        raise NotImplementedError()
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
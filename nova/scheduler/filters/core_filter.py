@@ -72,9 +72,24 @@ class BaseCoreFilter(filters.BaseHostFilter):
 class CoreFilter(BaseCoreFilter):
     """CoreFilter filters based on CPU core utilization."""
 
+    supports_columns = True
+
     def _get_cpu_allocation_ratio(self, host_state, spec_obj):
         return host_state.cpu_allocation_ratio
 
+    def filter_columns(self, columns, spec_obj):
+        instance_vcpus = spec_obj.vcpus
+        # Hosts without vcpus_total pass, as in host_passes()
+        broken = columns.vcpus_total == 0
+        if (broken & columns.mask).any():
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+        vcpus_total = columns.vcpus_total * columns.cpu_allocation_ratio
+        limited = ~broken & (vcpus_total > 0)
+        columns.set_limit('vcpu', vcpus_total, limited)
+        overcommitted = limited & (instance_vcpus > columns.vcpus_total)
+        free_vcpus = vcpus_total - columns.vcpus_used
+        return broken | ~(overcommitted | (free_vcpus < instance_vcpus))
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -57,7 +57,19 @@ class NUMATopologyFilter(filters.BaseHostFilter):
 
         return True
 
+    def filter_all(self, filter_obj_list, spec_obj):
+        # Hosts often have the same free resources on some of their NUMA
+        # cells, e.g. empty hosts of the same model, so the results of
+        # fitting the requested cells are shared by all hosts of the request
+        cell_fit_cache = {}
+        for obj in filter_obj_list:
+            if self._host_passes(obj, spec_obj, cell_fit_cache):
+                yield obj
+
     def host_passes(self, host_state, spec_obj):
+        return self._host_passes(host_state, spec_obj)
+
+    def _host_passes(self, host_state, spec_obj, cell_fit_cache=None):
         ram_ratio = host_state.ram_allocation_ratio
         cpu_ratio = host_state.cpu_allocation_ratio
         extra_specs = spec_obj.flavor.extra_specs
@@ -82,7 +94,8 @@ class NUMATopologyFilter(filters.BaseHostFilter):
                         host_topology, requested_topology,
                         limits=limits,
                         pci_requests=pci_requests,
-                        pci_stats=host_state.pci_stats))
+                        pci_stats=host_state.pci_stats,
+                        cell_fit_cache=cell_fit_cache))
             if not instance_topology:
                 LOG.debug("%(host)s, %(node)s fails NUMA topology "
                           "requirements. The instance does not fit on this "
@@ -67,9 +67,22 @@ class BaseRamFilter(filters.BaseHostFilter):
 class RamFilter(BaseRamFilter):
     """Ram Filter with over subscription flag."""
 
+    supports_columns = True
+
     def _get_ram_allocation_ratio(self, host_state, spec_obj):
         return host_state.ram_allocation_ratio
 
+    def filter_columns(self, columns, spec_obj):
+        requested_ram = spec_obj.memory_mb
+        total_usable_ram_mb = columns.total_usable_ram_mb
+        memory_mb_limit = total_usable_ram_mb * columns.ram_allocation_ratio
+        used_ram_mb = total_usable_ram_mb - columns.free_ram_mb
+        usable_ram = memory_mb_limit - used_ram_mb
+        passes = ((total_usable_ram_mb >= requested_ram) &
+                  (usable_ram >= requested_ram))
+        columns.set_limit('memory_mb', memory_mb_limit, passes)
+        return passes
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
@@ -37,6 +37,7 @@ from nova import exception
 from nova.i18n import _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
+from nova.scheduler import columnar
 from nova.scheduler import filters
 from nova.scheduler import weights
 from nova import utils
@@ -338,6 +339,16 @@ class HostManager(object):
         weigher_classes = self.weight_handler.get_matching_classes(
                 CONF.scheduler_weight_classes)
         self.weighers = [cls() for cls in weigher_classes]
+        if CONF.scheduler_use_columnar_engine:
+            if columnar.available():
+                self.filter_handler = columnar.ColumnarFilterHandler(
+                    self.filter_handler)
+                self.weight_handler = columnar.ColumnarWeightHandler(
+                    self.weight_handler)
+            else:
+                LOG.warning(_LW("scheduler_use_columnar_engine is set but "
+                                "NumPy is not installed, filtering and "
+                                "weighing hosts one by one"))
         # Dict of aggregates keyed by their ID
         self.aggs_by_id = {}
         # Dict of set of aggregate IDs keyed by the name of the host belonging
@@ -349,6 +360,13 @@ class HostManager(object):
         self._instance_info = {}
         if self.tracks_instance_changes:
             self._init_instance_info()
+        # Used by get_incremental_host_states(): the last generation of the
+        # compute node updates applied per (host, node), the nodes to read
+        # again from the DB and when the states were last fully resynced
+        self._node_generations = {}
+        self._stale_nodes = set()
+        self._last_resync = None
+        self._last_service_refresh = None
 
     def _load_filters(self):
         return CONF.scheduler_default_filters
@@ -368,6 +386,7 @@ class HostManager(object):
                 self._update_aggregate(agg)
         else:
             self._update_aggregate(aggregates)
+        self._refresh_host_state_aggregates()
 
     def _update_aggregate(self, aggregate):
         self.aggs_by_id[aggregate.id] = aggregate
@@ -388,6 +407,14 @@ class HostManager(object):
         for host in aggregate.hosts:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self._refresh_host_state_aggregates()
+
+    def _refresh_host_state_aggregates(self):
+        # get_all_host_states() sets the aggregates on every request, but
+        # the host states of the incremental scheduler are kept between
+        # requests; aggregate changes are rare enough to update them all
+        for (host, node), host_state in self.host_state_map.items():
+            host_state.aggregates = self._get_aggregates_info(host)
 
     def _init_instance_info(self):
         """Creates the initial view of instances for all hosts.
@@ -590,6 +617,110 @@ class HostManager(object):
 
         return six.itervalues(self.host_state_map)
 
+    def resync_host_states(self, context):
+        """Rebuilds the host states kept by get_incremental_host_states()
+        from the database.
+        """
+        LOG.debug("Resyncing all host states")
+        self._stale_nodes.clear()
+        now = time.time()
+        self._last_resync = self._last_service_refresh = now
+        return list(self.get_all_host_states(context))
+
+    def get_incremental_host_states(self, context):
+        """Returns the HostStates kept in memory between requests.
+
+        Unlike get_all_host_states() this doesn't read every service,
+        compute node and instance list for each request. The states are
+        built by resync_host_states() and then kept current with the
+        compute node updates sent by the resource trackers (see
+        update_compute_node()) and the instance updates sent by the compute
+        services. Only the nodes that are new or whose updates were lost
+        are read again, as well as the service records every
+        scheduler_service_refresh_interval seconds.
+        """
+        if self._last_resync is None:
+            return self.resync_host_states(context)
+        self._refresh_services(context)
+        while self._stale_nodes:
+            self._refresh_node(context, *self._stale_nodes.pop())
+        return list(self.host_state_map.values())
+
+    def _refresh_services(self, context):
+        now = time.time()
+        if (now - self._last_service_refresh <
+                CONF.scheduler_service_refresh_interval):
+            return
+        self._last_service_refresh = now
+        service_refs = {service.host: service
+                        for service in objects.ServiceList.get_by_binary(
+                            context, 'nova-compute', include_disabled=True)}
+        for (host, node), host_state in self.host_state_map.items():
+            service = service_refs.get(host)
+            if service:
+                host_state.update(service=dict(service))
+
+    def _refresh_node(self, context, host, node):
+        state_key = (host, node)
+        try:
+            compute = objects.ComputeNode.get_by_host_and_nodename(
+                context, host, node)
+            service = objects.Service.get_by_compute_host(context, host)
+        except exception.NotFound:
+            LOG.info(_LI("Removing dead compute node %(host)s:%(node)s "
+                         "from scheduler"), {'host': host, 'node': node})
+            self.host_state_map.pop(state_key, None)
+            self._node_generations.pop(state_key, None)
+            return
+        host_state = self.host_state_map.get(state_key)
+        if not host_state:
+            host_state = self.host_state_cls(host, node, compute=compute)
+            self.host_state_map[state_key] = host_state
+        host_state.update(compute,
+                          dict(service),
+                          self._get_aggregates_info(host),
+                          self._get_instance_info(context, compute))
+
+    def update_compute_node(self, context, compute_node, generation):
+        """Applies the compute node state sent by a resource tracker to the
+        host state of the node.
+
+        The compute service numbers the updates of each node with an
+        increasing generation. An update with a generation older than the
+        last one applied arrived late and is dropped. A gap in the
+        generations means updates were lost, e.g. while the scheduler or the
+        compute service restarted; the node is then also read again from
+        the database before the next request. Nodes the scheduler doesn't
+        know yet are read from the database as well.
+        """
+        state_key = (compute_node.host, compute_node.hypervisor_hostname)
+        last_generation = self._node_generations.get(state_key)
+        if last_generation is not None and generation <= last_generation:
+            LOG.debug("Ignoring stale update %(generation)s of compute node "
+                      "%(host)s:%(node)s",
+                      {'generation': generation, 'host': state_key[0],
+                       'node': state_key[1]})
+            return
+        self._node_generations[state_key] = generation
+        host_state = self.host_state_map.get(state_key)
+        if host_state is None:
+            self._stale_nodes.add(state_key)
+            return
+        if last_generation is not None and \
+                generation != last_generation + 1:
+            LOG.debug("Missed updates of compute node %(host)s:%(node)s, "
+                      "reading it again",
+                      {'host': state_key[0], 'node': state_key[1]})
+            self._stale_nodes.add(state_key)
+        host_state.update(compute=compute_node)
+
+    def _mark_host_stale(self, host_name):
+        # The instances dict of the host was replaced, so the incremental
+        # host states of the host have to pick up the new one.
+        for state_key in self.host_state_map:
+            if state_key[0] == host_name:
+                self._stale_nodes.add(state_key)
+
     def _get_aggregates_info(self, host):
         return [self.aggs_by_id[agg_id] for agg_id in
                 self.host_aggregates_map[host]]
@@ -624,6 +755,7 @@ class HostManager(object):
         host_info = self._instance_info[host_name] = {}
         host_info["instances"] = inst_dict
         host_info["updated"] = False
+        self._mark_host_stale(host_name)
 
     @utils.synchronized(HOST_INSTANCE_SEMAPHORE)
     def update_instance_info(self, context, host_name, instance_info):
@@ -648,6 +780,7 @@ class HostManager(object):
                 host_info["instances"] = {instance.uuid: instance
                                           for instance in instances}
                 host_info["updated"] = True
+                self._mark_host_stale(host_name)
             else:
                 self._recreate_instance_info(context, host_name)
                 LOG.info(_LI("Received an update from an unknown host '%s'. "
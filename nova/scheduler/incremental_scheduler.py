@@ -0,0 +1,48 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova.scheduler import filter_scheduler
+
+
+class IncrementalScheduler(filter_scheduler.FilterScheduler):
+    """Scheduler keeping the host states in memory between requests.
+
+    Like the CachingScheduler this doesn't read the state of every compute
+    node from the database for each request, but instead of working from a
+    snapshot it applies the changes the compute services send: their
+    resource trackers push every saved compute node (enable
+    scheduler_tracks_compute_node_changes on the computes) and the instance
+    changes are tracked as with scheduler_tracks_instance_changes. The cost
+    of a request is then filtering and weighing only.
+
+    The updates of each compute node carry a generation counter; when
+    updates went missing the node is read again from the database. The
+    service records are re-read every scheduler_service_refresh_interval
+    seconds, and all host states are rebuilt from the database by the
+    periodic task, which bounds the drift caused by anything the updates
+    don't cover.
+
+    As with the CachingScheduler, each scheduler worker has its own copy of
+    the host states and only knows about its own claims until the compute
+    services report them.
+    """
+
+    def run_periodic_tasks(self, context):
+        """Called from a periodic tasks in the manager."""
+        self.host_manager.resync_host_states(context.elevated())
+
+    def _get_all_host_states(self, context):
+        """Called from the filter scheduler, in a template pattern."""
+        return self.host_manager.get_incremental_host_states(context)
@@ -44,7 +44,7 @@ QUOTAS = quota.QUOTAS
 class SchedulerManager(manager.Manager):
     """Chooses a host to run instances on."""
 
-    target = messaging.Target(version='4.3')
+    target = messaging.Target(version='4.4')
 
     _sentinel = object()
 
@@ -143,3 +143,10 @@ class SchedulerManager(manager.Manager):
         """
         self.driver.host_manager.sync_instance_info(context, host_name,
                                                     instance_uuids)
+
+    def update_compute_node(self, context, compute_node, generation):
+        """Receives the updated state of a compute node from its resource
+        tracker, and passes it on to the driver's HostManager.
+        """
+        self.driver.host_manager.update_compute_node(context, compute_node,
+                                                     generation)
@@ -87,6 +87,7 @@ class SchedulerAPI(object):
 
         * 4.3 - Modify select_destinations() signature by providing a
                 RequestSpec obj
+        * 4.4 - Added update_compute_node()
 
     '''
 
@@ -144,3 +145,12 @@ class SchedulerAPI(object):
         cctxt = self.client.prepare(version='4.2', fanout=True)
         return cctxt.cast(ctxt, 'sync_instance_info', host_name=host_name,
                           instance_uuids=instance_uuids)
+
+    def update_compute_node(self, ctxt, compute_node, generation):
+        version = '4.4'
+        if not self.client.can_send_version(version):
+            # NOTE: older schedulers read the compute nodes from the DB
+            return
+        cctxt = self.client.prepare(version=version, fanout=True)
+        return cctxt.cast(ctxt, 'update_compute_node',
+                          compute_node=compute_node, generation=generation)
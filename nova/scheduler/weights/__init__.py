@@ -33,7 +33,18 @@ class WeighedHost(weights.WeighedObject):
 
 class BaseHostWeigher(weights.BaseWeigher):
     """Base class for host weights."""
-    pass
+
+    # Set to True in a subclass implementing weigh_columns()
+    supports_columns = False
+
+    def weigh_columns(self, columns, weight_properties):
+        """Return an array with the weight of each host of a
+        nova.scheduler.columnar.HostColumns.
+
+        Used instead of weigh_objects() when scheduler_use_columnar_engine
+        is set.
+        """
+        raise NotImplementedError()
 
 
 class HostWeightHandler(weights.BaseWeightHandler):
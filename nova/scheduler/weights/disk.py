@@ -28,6 +28,7 @@ CONF = nova.conf.CONF
 
 class DiskWeigher(weights.BaseHostWeigher):
     minval = 0
+    supports_columns = True
 
     def weight_multiplier(self):
         """Override the weight multiplier."""
@@ -36,3 +37,6 @@ class DiskWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
         return host_state.free_disk_mb
+
+    def weigh_columns(self, columns, weight_properties):
+        return columns.free_disk_mb
@@ -29,6 +29,7 @@ CONF = nova.conf.CONF
 
 class IoOpsWeigher(weights.BaseHostWeigher):
     minval = 0
+    supports_columns = True
 
     def weight_multiplier(self):
         """Override the weight multiplier."""
@@ -39,3 +40,6 @@ class IoOpsWeigher(weights.BaseHostWeigher):
         to be the default.
         """
         return host_state.num_io_ops
+
+    def weigh_columns(self, columns, weight_properties):
+        return columns.num_io_ops
@@ -3539,6 +3539,14 @@ class ServersViewBuilderTest(test.TestCase):
         output = self.view_builder.basic(self.request, self.instance)
         self.assertThat(output, matchers.DictMatches(expected_server))
 
+    def test_build_list_from_iterator(self):
+        request = fakes.HTTPRequestV21.blank("/fake/servers?limit=1")
+        output = self.view_builder.index(request, iter([self.instance]))
+        self.assertEqual([self.uuid], [s['id'] for s in output['servers']])
+        self.assertEqual(1, len(output['servers_links']))
+        self.assertIn('marker=%s' % self.uuid,
+                      output['servers_links'][0]['href'])
+
     def test_build_server_with_project_id(self):
         expected_server = {
             "server": {
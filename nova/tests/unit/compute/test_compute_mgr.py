@@ -1382,6 +1382,92 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                         use_slave=True)
             mock_spawn.assert_called_once_with(mock.ANY, instance)
 
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk(self, mock_get):
+        in_sync = objects.Instance(uuid=uuids.in_sync, task_state=None,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.RUNNING)
+        changed = objects.Instance(uuid=uuids.changed, task_state=None,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.RUNNING)
+        missing = objects.Instance(uuid=uuids.missing, task_state=None,
+                                   vm_state=vm_states.STOPPED,
+                                   power_state=power_state.SHUTDOWN)
+        mock_get.return_value = [in_sync, changed, missing]
+        states = {uuids.in_sync: power_state.RUNNING,
+                  uuids.changed: power_state.SHUTDOWN}
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value=states),
+            mock.patch.object(self.compute.driver, 'get_num_instances'),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_states, mock_num, mock_spawn):
+            self.compute._sync_power_states(mock.sentinel.context)
+        self.assertFalse(mock_num.called)
+        mock_spawn.assert_has_calls([mock.call(mock.ANY, changed),
+                                     mock.call(mock.ANY, missing)])
+        self.assertEqual(2, mock_spawn.call_count)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk_queries_driver_again(self, mock_get):
+        # The instance was started after the bulk query, the sync must use
+        # the state read under the instance lock.
+        instance = objects.Instance(uuid=uuids.instance, task_state=None,
+                                    vm_state=vm_states.ACTIVE,
+                                    power_state=power_state.RUNNING)
+        mock_get.return_value = [instance]
+        states = {uuids.instance: power_state.SHUTDOWN}
+        info = hardware.InstanceInfo(state=power_state.RUNNING)
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value=states),
+            mock.patch.object(self.compute.driver, 'get_info',
+                              return_value=info),
+            mock.patch.object(self.compute, '_sync_instance_power_state'),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n',
+                              side_effect=lambda f, *args: f(*args))
+        ) as (mock_states, mock_info, mock_sync, mock_spawn):
+            self.compute._sync_power_states(mock.sentinel.context)
+        mock_info.assert_called_once_with(instance)
+        mock_sync.assert_called_once_with(mock.sentinel.context, instance,
+                                          power_state.RUNNING,
+                                          use_slave=True)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk_pending_task(self, mock_get):
+        instance = objects.Instance(uuid=uuids.instance,
+                                    task_state=task_states.POWERING_OFF,
+                                    vm_state=vm_states.ACTIVE,
+                                    power_state=power_state.RUNNING)
+        mock_get.return_value = [instance]
+        states = {uuids.instance: power_state.RUNNING}
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value=states),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_states, mock_spawn):
+            self.compute._sync_power_states(mock.sentinel.context)
+        mock_spawn.assert_called_once_with(mock.ANY, instance)
+
+    def test_power_state_in_sync(self):
+        in_sync = manager._power_state_in_sync
+        self.assertTrue(in_sync(vm_states.ACTIVE, power_state.RUNNING,
+                                power_state.RUNNING))
+        self.assertFalse(in_sync(vm_states.ACTIVE, power_state.RUNNING,
+                                 power_state.SHUTDOWN))
+        self.assertFalse(in_sync(vm_states.ACTIVE, power_state.SHUTDOWN,
+                                 power_state.SHUTDOWN))
+        self.assertTrue(in_sync(vm_states.STOPPED, power_state.SHUTDOWN,
+                                power_state.SHUTDOWN))
+        self.assertFalse(in_sync(vm_states.STOPPED, power_state.RUNNING,
+                                 power_state.RUNNING))
+        self.assertFalse(in_sync(vm_states.PAUSED, power_state.CRASHED,
+                                 power_state.CRASHED))
+        self.assertFalse(in_sync(vm_states.DELETED, power_state.RUNNING,
+                                 power_state.RUNNING))
+        self.assertTrue(in_sync(vm_states.ERROR, power_state.RUNNING,
+                                power_state.RUNNING))
+
     def _get_sync_instance(self, power_state, vm_state, task_state=None,
                            shutdown_terminate=False):
         instance = objects.Instance()
@@ -1491,6 +1577,17 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                           power_state.NOSTATE,
                                                           use_slave=True)
 
+    def test_prefetch_images(self):
+        with mock.patch.object(self.compute.driver,
+                               'prefetch_images') as mock_prefetch:
+            self.compute.prefetch_images(self.context, ['image1'])
+        mock_prefetch.assert_called_once_with(self.context, ['image1'])
+
+    def test_prefetch_images_not_implemented(self):
+        with mock.patch.object(self.compute.driver, 'prefetch_images',
+                               side_effect=NotImplementedError):
+            self.compute.prefetch_images(self.context, ['image1'])
+
     def test_run_pending_deletes(self):
         self.flags(instance_delete_interval=10)
 
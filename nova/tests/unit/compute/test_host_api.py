@@ -117,6 +117,15 @@ class ComputeHostAPITestCase(test.TestCase):
                           self.host_api.get_host_uptime, self.ctxt,
                           'fake_host')
 
+    def test_prefetch_images(self):
+        self._mock_assert_host_exists()
+        self._mock_rpc_call('prefetch_images',
+                            host='fake_host',
+                            image_ids=['image1', 'image2'])
+        self.mox.ReplayAll()
+        self.host_api.prefetch_images(self.ctxt, 'fake_host',
+                                      ['image1', 'image2'])
+
     def test_host_power_action(self):
         self._mock_assert_host_exists()
         self._mock_rpc_call('host_power_action',
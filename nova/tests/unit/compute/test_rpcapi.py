@@ -459,6 +459,10 @@ class ComputeRpcAPITestCase(test.NoDBTestCase):
     def test_get_host_uptime(self):
         self._test_compute_api('get_host_uptime', 'call', host='host')
 
+    def test_prefetch_images(self):
+        self._test_compute_api('prefetch_images', 'cast', host='host',
+                image_ids=['image1', 'image2'], version='4.12')
+
     def test_backup_instance(self):
         self._test_compute_api('backup_instance', 'cast',
                 instance=self.fake_instance_obj, image_id='id',
@@ -1146,6 +1146,71 @@ class TestUpdateComputeNode(BaseTestCase):
         urs_mock = self.sched_client_mock.update_resource_stats
         urs_mock.assert_called_once_with(self.rt.compute_node)
 
+    def test_only_changed_fields_saved(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt._update(mock.sentinel.ctx)
+
+        saved_changes = []
+        urs_mock = self.sched_client_mock.update_resource_stats
+        urs_mock.side_effect = lambda cn: saved_changes.append(
+            set(cn.obj_what_changed()))
+        # Setting a field to the value it already has is not a change
+        self.rt.compute_node.memory_mb = self.rt.compute_node.memory_mb
+        self.rt.compute_node.vcpus_used += 1
+        self.rt._update(mock.sentinel.ctx)
+
+        self.assertEqual([set(['vcpus_used'])], saved_changes)
+
+    @mock.patch('eventlet.greenthread.spawn_after')
+    @mock.patch('time.time', return_value=100.0)
+    def test_updates_coalesced_within_window(self, time_mock, spawn_mock):
+        self.flags(resource_tracker_update_window=5.0)
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt._update(mock.sentinel.ctx)
+        urs_mock = self.sched_client_mock.update_resource_stats
+        self.assertEqual(1, urs_mock.call_count)
+        self.assertFalse(spawn_mock.called)
+
+        time_mock.return_value = 102.0
+        self.rt.compute_node.vcpus_used += 1
+        self.rt._update(mock.sentinel.ctx)
+        self.rt.compute_node.vcpus_used += 1
+        self.rt._update(mock.sentinel.ctx)
+
+        self.assertEqual(1, urs_mock.call_count)
+        spawn_mock.assert_called_once_with(
+            3.0, self.rt._save_pending_update, mock.sentinel.ctx)
+
+        self.rt._save_pending_update(mock.sentinel.ctx)
+        self.assertEqual(2, urs_mock.call_count)
+        self.assertIsNone(self.rt._pending_save)
+        self.assertEqual(102.0, self.rt._last_save_time)
+
+    @mock.patch('eventlet.greenthread.spawn_after')
+    @mock.patch('time.time', return_value=100.0)
+    def test_save_cancels_pending_update(self, time_mock, spawn_mock):
+        self.flags(resource_tracker_update_window=5.0)
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt._update(mock.sentinel.ctx)
+        self.rt.compute_node.vcpus_used += 1
+        self.rt._update(mock.sentinel.ctx)
+
+        time_mock.return_value = 106.0
+        self.rt.compute_node.vcpus_used += 1
+        self.rt._update(mock.sentinel.ctx)
+
+        spawn_mock.return_value.cancel.assert_called_once_with()
+        self.assertIsNone(self.rt._pending_save)
+        urs_mock = self.sched_client_mock.update_resource_stats
+        self.assertEqual(2, urs_mock.call_count)
+
+        # Nothing left to save when the pending update runs anyway
+        self.rt._save_pending_update(mock.sentinel.ctx)
+        self.assertEqual(2, urs_mock.call_count)
+
 
 class TestInstanceClaim(BaseTestCase):
 
@@ -40,11 +40,13 @@ import six
 from six.moves import range
 from sqlalchemy import Column
 from sqlalchemy.dialects import sqlite
+from sqlalchemy import event
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import inspect
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
+from sqlalchemy import orm
 from sqlalchemy.orm import query
 from sqlalchemy import sql
 from sqlalchemy import Table
@@ -54,6 +56,7 @@ from nova.compute import arch
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import context
+from nova import counters
 from nova import db
 from nova.db.sqlalchemy import api as sqlalchemy_api
 from nova.db.sqlalchemy import models
@@ -87,7 +90,7 @@ def _reservation_get(context, uuid):
     return result
 
 
-def _quota_reserve(context, project_id, user_id):
+def _quota_reserve(context, project_id, user_id, optimistic=False):
     """Create sample Quota, QuotaUsage and Reservation objects.
 
     There is no method db.quota_usage_create(), so we have to use
@@ -127,9 +130,13 @@ def _quota_reserve(context, project_id, user_id):
         setattr(sqlalchemy_api, sync_name, get_sync(resource, i))
         sqlalchemy_api.QUOTA_SYNC_FUNCTIONS[sync_name] = getattr(
             sqlalchemy_api, sync_name)
-    return db.quota_reserve(context, resources, quotas, user_quotas, deltas,
-                    timeutils.utcnow(), CONF.until_refresh,
-                    datetime.timedelta(days=1), project_id, user_id)
+    if optimistic:
+        reserve = db.quota_reserve_optimistic
+    else:
+        reserve = db.quota_reserve
+    return reserve(context, resources, quotas, user_quotas, deltas,
+                   timeutils.utcnow(), CONF.until_refresh,
+                   datetime.timedelta(days=1), project_id, user_id)
 
 
 class DbTestCase(test.TestCase):
@@ -1088,16 +1095,16 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
         mock_create_facade.assert_called_once_with()
         mock_facade.get_engine.assert_called_once_with()
 
-    @mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid')
+    @mock.patch.object(sqlalchemy_api, '_instance_get_marker')
     @mock.patch.object(sqlalchemy_api, '_instances_fill_metadata')
     @mock.patch('oslo_db.sqlalchemy.utils.paginate_query')
-    def test_instance_get_all_by_filters_paginated_allows_deleted_marker(
+    def test_instance_get_all_by_filters_paginated_uses_marker_keys(
             self, mock_paginate, mock_fill, mock_get):
         ctxt = mock.MagicMock()
-        ctxt.elevated.return_value = mock.sentinel.elevated
         sqlalchemy_api.instance_get_all_by_filters_sort(ctxt, {}, marker='foo')
-        mock_get.assert_called_once_with(mock.sentinel.elevated, 'foo')
-        ctxt.elevated.assert_called_once_with(read_deleted='yes')
+        mock_get.assert_called_once_with(ctxt, 'foo', ['created_at', 'id'])
+        self.assertEqual(mock_get.return_value,
+                         mock_paginate.call_args[1]['marker'])
 
 
 class SqlAlchemyDbApiTestCase(DbTestCase):
@@ -1684,6 +1691,30 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
                                             self.ctxt, 'project1', 'user1'))
 
+    def test_reservation_expire_retries_stale_usage(self):
+        flushes = []
+
+        def before_flush(session, flush_context, instances):
+            if not flushes:
+                # NOTE: Another reservation updates the usages once they
+                # have been read.
+                session.execute(models.QuotaUsage.__table__.update().values(
+                    generation=models.QuotaUsage.generation + 1))
+            flushes.append(session)
+
+        event.listen(orm.Session, 'before_flush', before_flush)
+        self.addCleanup(event.remove, orm.Session, 'before_flush',
+                        before_flush)
+        db.reservation_expire(self.ctxt)
+
+        self.assertGreater(len(flushes), 1)
+        expected = {'project_id': 'project1', 'user_id': 'user1',
+                'resource0': {'reserved': 0, 'in_use': 0},
+                'resource1': {'reserved': 0, 'in_use': 1},
+                'fixed_ips': {'reserved': 0, 'in_use': 2}}
+        self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
+                                            self.ctxt, 'project1', 'user1'))
+
 
 class SecurityGroupRuleTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
@@ -2014,6 +2045,21 @@ class SecurityGroupTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                    self.ctxt.user_id)
         self.assertEqual(2, usage.until_refresh)
 
+    def test_security_group_ensure_default_bumps_generation(self):
+        self.ctxt.project_id = 'fake'
+        self.ctxt.user_id = 'fake'
+        default_group = db.security_group_ensure_default(self.ctxt)
+        usage = db.quota_usage_get(self.ctxt, self.ctxt.project_id,
+                                   'security_groups', self.ctxt.user_id)
+        db.security_group_destroy(self.ctxt, default_group.id)
+
+        db.security_group_ensure_default(self.ctxt)
+
+        updated = db.quota_usage_get(self.ctxt, self.ctxt.project_id,
+                                     'security_groups', self.ctxt.user_id)
+        self.assertEqual(usage.in_use + 1, updated.in_use)
+        self.assertEqual(usage.generation + 1, updated.generation)
+
     @mock.patch.object(db.sqlalchemy.api, '_security_group_get_by_names')
     def test_security_group_ensure_default_called_concurrently(self, sg_mock):
         # make sure NotFound is always raised here to trick Nova to insert the
@@ -2225,8 +2271,9 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                        mock_undefer):
         db.instance_get_all_by_filters_sort(
             self.ctxt, {},
-            columns_to_join=['info_cache', 'extra.pci_requests'])
-        mock_joinedload.assert_called_once_with('info_cache')
+            columns_to_join=['info_cache', 'extra', 'extra.pci_requests'])
+        # info_cache is read with its own query
+        mock_joinedload.assert_called_once_with('extra')
         mock_undefer.assert_called_once_with('extra.pci_requests')
 
     @mock.patch('nova.db.sqlalchemy.api.undefer')
@@ -2269,6 +2316,64 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         instances = db.instance_get_all_by_filters(self.ctxt, {}, limit=0)
         self.assertEqual([], instances)
 
+    def test_instance_get_all_by_filters_joins_manually(self):
+        inst1 = self.create_instance_with_args()
+        inst2 = self.create_instance_with_args()
+        group = db.security_group_create(self.ctxt, {'name': 'group1'})
+        db.instance_add_security_group(self.ctxt, inst1['uuid'], group['id'])
+        with mock.patch.object(sqlalchemy_api, 'joinedload') as mock_join:
+            result = db.instance_get_all_by_filters_sort(
+                self.ctxt, {}, sort_keys=['id'], sort_dirs=['asc'])
+        self.assertFalse(mock_join.called)
+        self.assertEqual([inst1['uuid'], inst2['uuid']],
+                         [inst['uuid'] for inst in result])
+        self.assertEqual([inst1['uuid'], inst2['uuid']],
+                         [inst['info_cache']['instance_uuid']
+                          for inst in result])
+        self.assertEqual(['group1'],
+                         [g['name'] for g in result[0]['security_groups']])
+        self.assertEqual([], result[1]['security_groups'])
+
+    def test_instance_get_all_by_filters_without_manual_joins(self):
+        self.create_instance_with_args()
+        result = db.instance_get_all_by_filters_sort(self.ctxt, {},
+                                                     columns_to_join=[])
+        self.assertNotIn('info_cache', result[0])
+        self.assertNotIn('security_groups', result[0])
+
+    def test_instance_get_all_by_filters_skips_removed_security_group(self):
+        inst = self.create_instance_with_args()
+        group = db.security_group_create(self.ctxt, {'name': 'group1'})
+        db.instance_add_security_group(self.ctxt, inst['uuid'], group['id'])
+        db.instance_remove_security_group(self.ctxt, inst['uuid'],
+                                          group['id'])
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {}, columns_to_join=['security_groups'])
+        self.assertEqual([], result[0]['security_groups'])
+
+    def test_instance_get_all_by_filters_deleted_marker(self):
+        instances = [self.create_instance_with_args() for i in range(3)]
+        db.instance_destroy(self.ctxt, instances[1]['uuid'])
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {'deleted': False}, marker=instances[1]['uuid'],
+            sort_keys=['id'], sort_dirs=['asc'])
+        self.assertEqual([instances[2]['uuid']],
+                         [inst['uuid'] for inst in result])
+
+    def test_instance_get_marker_reads_sort_keys(self):
+        inst = self.create_instance_with_args(display_name='test1')
+        with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
+            marker = sqlalchemy_api._instance_get_marker(
+                self.ctxt, inst['uuid'], ['display_name', 'id'])
+        self.assertEqual(('test1', inst['id']), tuple(marker))
+
+    def test_instance_get_marker_invalid_sort_key(self):
+        inst = self.create_instance_with_args()
+        self.assertRaises(exception.InvalidSortKey,
+                          db.instance_get_all_by_filters_sort,
+                          self.ctxt, {}, marker=inst['uuid'],
+                          sort_keys=['foo'])
+
     def test_instance_metadata_get_multi(self):
         uuids = [self.create_instance_with_args()['uuid'] for i in range(3)]
         with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
@@ -7040,6 +7145,73 @@ class QuotaTestCase(test.TestCase, ModelsObjectComparatorMixin):
             resources_names.remove(reservation.resource)
         self.assertEqual(len(resources_names), 0)
 
+    def test_quota_reserve_optimistic(self):
+        reservations = _quota_reserve(self.ctxt, 'p1', 'u1', optimistic=True)
+        expected = {'project_id': 'p1',
+                    'user_id': 'u1',
+                    'resource0': {'in_use': 0, 'reserved': 0},
+                    'resource1': {'in_use': 1, 'reserved': 1},
+                    'fixed_ips': {'in_use': 2, 'reserved': 2}}
+        self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
+                         self.ctxt, 'p1', 'u1'))
+        self.assertEqual(3, len(reservations))
+        for r in reservations:
+            reservation = _reservation_get(self.ctxt, r)
+            usage = db.quota_usage_get(self.ctxt, 'p1', reservation.resource,
+                                       'u1')
+            self.assertEqual(usage.id, reservation.usage_id)
+
+    def _quota_reserve_optimistic_resource1(self, delta, limit=10):
+        resources = {'resource1': quota.ReservableResource(
+            'resource1', '_sync_resource1')}
+        quotas = {'resource1': limit}
+        return db.quota_reserve_optimistic(
+            self.ctxt, resources, quotas, quotas, {'resource1': delta},
+            timeutils.utcnow(), None, None, 'p1', 'u1')
+
+    def test_quota_reserve_optimistic_retries_conflict(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        counters.reset()
+        self.addCleanup(counters.reset)
+        orig_sum = sqlalchemy_api._sum_project_user_quota_usages
+        calls = []
+
+        def fake_sum(rows, user_id):
+            if not calls:
+                # NOTE: Another reservation updates the usages once they
+                # have been read.
+                inspect(rows[0]).session.execute(
+                    models.QuotaUsage.__table__.update().values(
+                        generation=models.QuotaUsage.generation + 1))
+            calls.append(user_id)
+            return orig_sum(rows, user_id)
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_sum_project_user_quota_usages',
+                               side_effect=fake_sum):
+            reservations = self._quota_reserve_optimistic_resource1(1)
+
+        self.assertEqual(['u1', 'u1'], calls)
+        self.assertEqual(1, len(reservations))
+        self.assertEqual(
+            1, counters.get_counters()['db.quota_usage_conflict']['count'])
+        usage = db.quota_usage_get(self.ctxt, 'p1', 'resource1', 'u1')
+        self.assertEqual(2, usage.reserved)
+
+    def test_quota_reserve_optimistic_over_quota(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        self.assertRaises(exception.OverQuota,
+                          self._quota_reserve_optimistic_resource1, 9)
+        usage = db.quota_usage_get(self.ctxt, 'p1', 'resource1', 'u1')
+        self.assertEqual(1, usage.reserved)
+
+    def test_quota_usage_update_bumps_generation(self):
+        _quota_reserve(self.ctxt, 'p1', 'u1')
+        usage = db.quota_usage_get(self.ctxt, 'p1', 'resource0', 'u1')
+        db.quota_usage_update(self.ctxt, 'p1', 'u1', 'resource0', in_use=42)
+        self.assertEqual(usage.generation + 1, db.quota_usage_get(
+            self.ctxt, 'p1', 'resource0', 'u1').generation)
+
     def test_quota_destroy_all_by_project(self):
         reservations = _quota_reserve(self.ctxt, 'project1', 'user1')
         db.quota_destroy_all_by_project(self.ctxt, 'project1')
@@ -8850,6 +9022,110 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'shadow_instance_id_mappings'
         )
 
+    def _create_instance_id_mappings(self):
+        """Add 6 rows to instance_id_mappings, and delete 4 of them.
+
+        :returns: the ids of the deleted rows
+        """
+        ids = []
+        for uuidstr in self.uuidstrs:
+            ins_stmt = self.instance_id_mappings.insert().values(uuid=uuidstr)
+            ids.append(self.conn.execute(ins_stmt).inserted_primary_key[0])
+        update_statement = self.instance_id_mappings.update().\
+                where(self.instance_id_mappings.c.uuid.in_(self.uuidstrs[:4]))\
+                .values(deleted=1)
+        self.conn.execute(update_statement)
+        return ids[:4]
+
+    def _get_shadow_instance_id_mapping_ids(self):
+        qsiim = sql.select([self.shadow_instance_id_mappings.c.id]).\
+                where(self.shadow_instance_id_mappings.c.uuid.in_(
+                                                            self.uuidstrs))
+        return sorted(row[0] for row in self.conn.execute(qsiim))
+
+    def test_archive_deleted_rows_for_table_by_chunks(self):
+        deleted_ids = self._create_instance_id_mappings()
+        checkpoints = {}
+        with mock.patch.object(self.engine, 'connect',
+                               return_value=self.conn):
+            with mock.patch.object(self.conn, 'begin',
+                                   wraps=self.conn.begin) as mock_begin:
+                num = sqlalchemy_api._archive_deleted_rows_for_table(
+                    'instance_id_mappings', max_rows=3, chunk_size=2,
+                    checkpoints=checkpoints)
+        self.assertEqual(3, num)
+        # One transaction per chunk
+        self.assertEqual(2, mock_begin.call_count)
+        self.assertEqual(deleted_ids[:3],
+                         self._get_shadow_instance_id_mapping_ids())
+        self.assertEqual({'instance_id_mappings': deleted_ids[2]},
+                         checkpoints)
+
+        # Once no rows are left after the checkpoint, it is removed
+        num = sqlalchemy_api._archive_deleted_rows_for_table(
+            'instance_id_mappings', max_rows=None, chunk_size=2,
+            checkpoints=checkpoints)
+        self.assertEqual(1, num)
+        self.assertEqual(deleted_ids,
+                         self._get_shadow_instance_id_mapping_ids())
+        self.assertEqual({}, checkpoints)
+
+    def test_archive_deleted_rows_resumes_from_checkpoint(self):
+        deleted_ids = self._create_instance_id_mappings()
+        checkpoints = {'instance_id_mappings': deleted_ids[1]}
+        results = db.archive_deleted_rows(chunk_size=1,
+                                          checkpoints=checkpoints)
+        self.assertEqual({'instance_id_mappings': 2}, results)
+        self.assertEqual(deleted_ids[2:],
+                         self._get_shadow_instance_id_mapping_ids())
+        self.assertEqual({}, checkpoints)
+
+        # The next run archives the rows before the checkpoint
+        results = db.archive_deleted_rows(chunk_size=1,
+                                          checkpoints=checkpoints)
+        self.assertEqual({'instance_id_mappings': 2}, results)
+        self.assertEqual(deleted_ids,
+                         self._get_shadow_instance_id_mapping_ids())
+
+    def test_archive_deleted_rows_durations(self):
+        self._create_instance_id_mappings()
+        durations = {}
+        db.archive_deleted_rows(max_rows=2, durations=durations)
+        self.assertIn('instance_id_mappings', durations)
+
+    def test_archive_deleted_rows_concurrently(self):
+        self._create_instance_id_mappings()
+        for uuidstr in self.uuidstrs:
+            ins_stmt = self.instances.insert().values(uuid=uuidstr,
+                                                      deleted=1)
+            self.conn.execute(ins_stmt)
+        results = db.archive_deleted_rows(max_rows=7, chunk_size=2,
+                                          workers=4)
+        self.assertEqual(7, sum(results.values()))
+        results = db.archive_deleted_rows(chunk_size=2, workers=4)
+        self.assertEqual(3, sum(results.values()))
+
+    def test_archive_table_groups(self):
+        meta = MetaData(self.engine)
+        meta.reflect()
+        groups = sqlalchemy_api._archive_table_groups(meta)
+        group_index = {}
+        for index, tablenames in enumerate(groups):
+            for tablename in tablenames:
+                group_index[tablename] = index
+        self.assertNotIn('migrate_version', group_index)
+        self.assertNotIn('shadow_instances', group_index)
+        self.assertLess(group_index['consoles'],
+                        group_index['console_pools'])
+        self.assertLess(group_index['instance_extra'],
+                        group_index['instances'])
+        # The tables of a group don't reference each other
+        for tablenames in groups:
+            for tablename in tablenames:
+                for fk in meta.tables[tablename].foreign_keys:
+                    if fk.column.table.name != tablename:
+                        self.assertNotIn(fk.column.table.name, tablenames)
+
 
 class InstanceGroupDBApiTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
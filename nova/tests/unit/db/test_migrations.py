@@ -885,6 +885,10 @@ class NovaMigrationsCheckers(test_migrations.ModelsMigrationsSync,
                                 'instances_deleted_created_at_idx',
                                 ['deleted', 'created_at'])
 
+    def _check_320(self, engine, data):
+        self.assertColumnExists(engine, 'quota_usages', 'generation')
+        self.assertColumnExists(engine, 'shadow_quota_usages', 'generation')
+
 
 class TestNovaMigrationsSQLite(NovaMigrationsCheckers,
                                test_base.DbTestCase,
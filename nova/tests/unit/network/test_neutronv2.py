@@ -18,6 +18,7 @@ import collections
 import copy
 import uuid
 
+import eventlet
 from keystoneauth1.fixture import V2Token
 from keystoneauth1 import loading as ks_loading
 import mock
@@ -645,23 +646,20 @@ class TestNeutronv2Base(test.TestCase):
         nets = number == 1 and self.nets1 or self.nets2
         self.moxed_client.list_networks(
             id=net_ids).AndReturn({'networks': nets})
-        for i in range(1, number + 1):
-            float_data = number == 1 and self.float_data1 or self.float_data2
-            for ip in port_data[i - 1]['fixed_ips']:
-                float_data = [x for x in float_data
-                              if x['fixed_ip_address'] == ip['ip_address']]
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=port_data[i - 1]['id']).AndReturn(
-                        {'floatingips': float_data})
-            subnet_data = i == 1 and self.subnet_data1 or self.subnet_data2
-            self.moxed_client.list_subnets(
-                id=mox.SameElementsAs(['my_subid%s' % i])).AndReturn(
-                    {'subnets': subnet_data})
-            self.moxed_client.list_ports(
-                network_id=subnet_data[0]['network_id'],
-                device_owner='network:dhcp').AndReturn(
-                    {'ports': []})
+        float_data = number == 1 and self.float_data1 or self.float_data2
+        self.moxed_client.list_floatingips(
+            port_id=[port['id'] for port in port_data]).AndReturn(
+                {'floatingips': float_data})
+        subnet_data = self.subnet_data1
+        if number == 2:
+            subnet_data = subnet_data + self.subnet_data2
+        self.moxed_client.list_subnets(
+            id=['my_subid%s' % i for i in range(1, number + 1)]).AndReturn(
+                {'subnets': subnet_data})
+        self.moxed_client.list_ports(
+            network_id=[subnet['network_id'] for subnet in subnet_data],
+            device_owner='network:dhcp').AndReturn(
+                {'ports': []})
         self.instance['info_cache'] = self._fake_instance_info_cache(
             net_info_cache, self.instance['uuid'])
         self.mox.StubOutWithMock(api.db, 'instance_info_cache_get')
@@ -852,29 +850,30 @@ class TestNeutronv2(TestNeutronv2Base):
                 for iface in ifaces]
             port_ids = [iface['id'] for iface in ifaces] + port_ids
 
-        index = 0
-
         current_neutron_port_map = {}
         for current_neutron_port in current_neutron_ports:
             current_neutron_port_map[current_neutron_port['id']] = (
                 current_neutron_port)
-        for port_id in port_ids:
-            current_neutron_port = current_neutron_port_map.get(port_id)
-            if current_neutron_port:
-                for ip in current_neutron_port['fixed_ips']:
-                    self.moxed_client.list_floatingips(
-                        fixed_ip_address=ip['ip_address'],
-                        port_id=current_neutron_port['id']).AndReturn(
-                            {'floatingips': [self.float_data2[index]]})
-                    self.moxed_client.list_subnets(
-                        id=mox.SameElementsAs([ip['subnet_id']])
-                        ).AndReturn(
-                            {'subnets': [self.subnet_data_n[index]]})
-                    self.moxed_client.list_ports(
-                        network_id=current_neutron_port['network_id'],
-                        device_owner='network:dhcp').AndReturn(
-                        {'ports': self.dhcp_port_data1})
-                    index += 1
+        current_ports = [current_neutron_port_map[port_id]
+                         for port_id in port_ids
+                         if port_id in current_neutron_port_map]
+        index = len(current_ports)
+        if current_ports:
+            current_port_ids = [port['id'] for port in current_ports]
+            subnet_ids = [ip['subnet_id'] for port in current_ports
+                          for ip in port['fixed_ips']]
+            subnet_data = [subnet for subnet in self.subnet_data_n
+                           if subnet['id'] in subnet_ids]
+            self.moxed_client.list_floatingips(
+                port_id=current_port_ids).AndReturn(
+                    {'floatingips': [fip for fip in self.float_data2
+                                     if fip['port_id'] in current_port_ids]})
+            self.moxed_client.list_subnets(
+                id=subnet_ids).AndReturn({'subnets': subnet_data})
+            self.moxed_client.list_ports(
+                network_id=[subnet['network_id'] for subnet in subnet_data],
+                device_owner='network:dhcp').AndReturn(
+                    {'ports': self.dhcp_port_data1})
         self.instance['info_cache'] = self._fake_instance_info_cache(
             network_cache['info_cache']['network_info'], self.instance['uuid'])
 
@@ -1493,13 +1492,10 @@ class TestNeutronv2(TestNeutronv2Base):
         self.moxed_client.list_networks(id=net_ids).AndReturn(
             {'networks': nets})
         float_data = number == 1 and self.float_data1 or self.float_data2
-        for data in port_data[1:]:
-            for ip in data['fixed_ips']:
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=data['id']).AndReturn(
-                        {'floatingips': float_data[1:]})
-        for port in port_data[1:]:
+        if port_data[1:]:
+            self.moxed_client.list_floatingips(
+                port_id=[data['id'] for data in port_data[1:]]).AndReturn(
+                    {'floatingips': float_data[1:]})
             self.moxed_client.list_subnets(id=['my_subid2']).AndReturn({})
 
         self.mox.StubOutWithMock(api.db, 'instance_info_cache_get')
@@ -2608,7 +2604,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:01',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2619,7 +2616,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': False,
              'status': 'DOWN',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:02',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2630,7 +2628,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'DOWN',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:03',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2641,7 +2640,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:04',
              'binding:vif_type': model.VIF_TYPE_HW_VEB,
              'binding:vnic_type': model.VNIC_TYPE_DIRECT,
@@ -2655,7 +2655,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:05',
              'binding:vif_type': model.VIF_TYPE_802_QBH,
              'binding:vnic_type': model.VNIC_TYPE_MACVTAP,
@@ -2670,7 +2671,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:06',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              # No binding:vnic_type
@@ -2698,17 +2700,19 @@ class TestNeutronv2(TestNeutronv2Base):
             tenant_id='fake', device_id='uuid').AndReturn(
                 {'ports': fake_ports})
 
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
-        self.mox.StubOutWithMock(api, '_get_subnets_from_port')
+        self.mox.StubOutWithMock(api, '_get_floating_ips_by_ports')
+        self.mox.StubOutWithMock(api, '_get_subnets_by_id')
         requested_ports = [fake_ports[2], fake_ports[0], fake_ports[1],
                            fake_ports[3], fake_ports[4], fake_ports[5]]
-        for requested_port in requested_ports:
-            api._get_floating_ips_by_fixed_and_port(
-                self.moxed_client, '1.1.1.1', requested_port['id']).AndReturn(
-                    [{'floating_ip_address': '10.0.0.1'}])
-        for requested_port in requested_ports:
-            api._get_subnets_from_port(self.context, requested_port
-                ).AndReturn(fake_subnets)
+        api._get_floating_ips_by_ports(
+            self.moxed_client,
+            [requested_port['id'] for requested_port in requested_ports]
+            ).AndReturn(
+                {requested_port['id']: [{'floating_ip_address': '10.0.0.1',
+                                         'fixed_ip_address': '1.1.1.1'}]
+                 for requested_port in requested_ports})
+        api._get_subnets_by_id(self.context, ['subnet-id'] * 6).AndReturn(
+            {'subnet-id': fake_subnets[0]})
 
         self.mox.StubOutWithMock(api, '_get_preexisting_port_ids')
         api._get_preexisting_port_ids(fake_inst).AndReturn(['port5'])
@@ -2745,6 +2749,9 @@ class TestNeutronv2(TestNeutronv2Base):
                              nw_info.get('details'))
             self.assertEqual(requested_ports[index].get('binding:profile'),
                              nw_info.get('profile'))
+            self.assertEqual('10.0.0.1', nw_info.floating_ips()[0]['address'])
+            self.assertEqual('1.0.0.0/8',
+                             nw_info['network']['subnets'][0]['cidr'])
             index += 1
 
         self.assertFalse(nw_infos[0]['active'])
@@ -2835,7 +2842,7 @@ class TestNeutronv2(TestNeutronv2Base):
             id=[port_data['fixed_ips'][0]['subnet_id']]
         ).AndReturn({'subnets': subnet_data1})
         self.moxed_client.list_ports(
-            network_id=subnet_data1[0]['network_id'],
+            network_id=[subnet_data1[0]['network_id']],
             device_owner='network:dhcp').AndReturn({'ports': []})
         self.mox.ReplayAll()
 
@@ -3818,6 +3825,188 @@ class TestNeutronv2WithMock(test.TestCase):
             port_client.update_port.assert_called_once_with(
                 uuids.port_id, port_req_body)
 
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_check_external_network_attach')
+    @mock.patch('nova.network.neutronv2.api.API.get_instance_nw_info')
+    @mock.patch('nova.network.neutronv2.api.API._delete_ports')
+    @mock.patch('nova.network.neutronv2.api.API._unbind_ports')
+    @mock.patch('nova.network.neutronv2.api.API._update_port_dns_name')
+    @mock.patch('nova.network.neutronv2.api.API._create_or_update_port')
+    @mock.patch('nova.network.neutronv2.api.API._has_port_binding_extension',
+                return_value=False)
+    @mock.patch('nova.network.neutronv2.api.API._get_available_networks')
+    @mock.patch('nova.network.neutronv2.api.get_client')
+    def test_allocate_for_instance_cleans_up_after_failure(
+            self, mock_ntrn, mock_avail_nets, mock_has_pbe, mock_allocate,
+            mock_dns, mock_unbind, mock_del_ports, mock_giwn, mock_cena):
+        mock_inst = mock.Mock(project_id='proj-1',
+                              availability_zone='zone-1',
+                              uuid='inst-1')
+        mock_avail_nets.return_value = [{'id': 'net-1'}, {'id': 'net-2'}]
+        nw_req = objects.NetworkRequestList(
+            objects=[objects.NetworkRequest(network_id='net-1'),
+                     objects.NetworkRequest(network_id='net-2'),
+                     objects.NetworkRequest(network_id='net-1')])
+        mock_allocate.side_effect = ['port-1', 'port-2', 'port-3']
+        # The DNS name of the second port can't be set, the third port is
+        # not created since it is requested after it
+        mock_dns.side_effect = [None, exception.InvalidInput(reason='dns')]
+
+        self.flags(port_request_concurrency=1, group='neutron')
+        self.assertRaises(exception.InvalidInput,
+                          self.api.allocate_for_instance,
+                          self.context, mock_inst, requested_networks=nw_req)
+
+        self.assertEqual(2, mock_allocate.call_count)
+        mock_unbind.assert_called_once_with(self.context, [], mock.ANY,
+                                            mock.ANY)
+        mock_del_ports.assert_called_once_with(mock.ANY, mock_inst,
+                                               ['port-1', 'port-2'])
+        self.assertFalse(mock_giwn.called)
+
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_check_external_network_attach')
+    @mock.patch('nova.network.neutronv2.api.API.get_instance_nw_info')
+    @mock.patch('nova.network.neutronv2.api.API._update_port_dns_name')
+    @mock.patch('nova.network.neutronv2.api.API._create_or_update_port')
+    @mock.patch('nova.network.neutronv2.api.API._has_port_binding_extension',
+                return_value=False)
+    @mock.patch('nova.network.neutronv2.api.API._get_available_networks')
+    @mock.patch('nova.network.neutronv2.api.get_client')
+    def test_allocate_for_instance_keeps_requested_order(
+            self, mock_ntrn, mock_avail_nets, mock_has_pbe, mock_allocate,
+            mock_dns, mock_giwn, mock_cena):
+        mock_inst = mock.Mock(project_id='proj-1',
+                              availability_zone='zone-1',
+                              uuid='inst-1')
+        nets = [{'id': 'net-%s' % i} for i in range(5)]
+        mock_avail_nets.return_value = nets
+
+        def create_or_update_port(context, instance, request, *args):
+            # Let the other ports be created meanwhile
+            eventlet.sleep(0)
+            return 'port-' + request.network_id
+
+        mock_allocate.side_effect = create_or_update_port
+        nw_req = objects.NetworkRequestList(
+            objects=[objects.NetworkRequest(network_id=net['id'])
+                     for net in nets])
+
+        self.api.allocate_for_instance(self.context, mock_inst,
+                                       requested_networks=nw_req)
+
+        mock_giwn.assert_called_once_with(
+            self.context, mock_inst, networks=nets,
+            port_ids=['port-net-%s' % i for i in range(5)],
+            admin_client=None, preexisting_port_ids=[], update_cells=True)
+
+    def test_get_floating_ips_by_ports(self):
+        client = mock.Mock()
+        fips = [{'port_id': 'port-1', 'floating_ip_address': '10.0.0.1'},
+                {'port_id': 'port-2', 'floating_ip_address': '10.0.0.2'},
+                {'port_id': 'port-1', 'floating_ip_address': '10.0.0.3'}]
+        client.list_floatingips.return_value = {'floatingips': fips}
+
+        self.assertEqual({'port-1': [fips[0], fips[2]], 'port-2': [fips[1]]},
+                         self.api._get_floating_ips_by_ports(
+                             client, ['port-1', 'port-2', 'port-3']))
+        client.list_floatingips.assert_called_once_with(
+            port_id=['port-1', 'port-2', 'port-3'])
+
+        client.reset_mock()
+        self.assertEqual({}, self.api._get_floating_ips_by_ports(client, []))
+        self.assertFalse(client.list_floatingips.called)
+
+    def test_nw_info_get_ips_with_floating_ips(self):
+        port = {'id': 'port-id',
+                'fixed_ips': [{'ip_address': '1.1.1.1'},
+                              {'ip_address': '2.2.2.2'}]}
+        floating_ips = [{'fixed_ip_address': '2.2.2.2',
+                         'floating_ip_address': '10.0.0.1'}]
+
+        result = self.api._nw_info_get_ips(mock.sentinel.client, port,
+                                           floating_ips)
+
+        self.assertEqual(['1.1.1.1', '2.2.2.2'],
+                         [ip['address'] for ip in result])
+        self.assertEqual([], result[0]['floating_ips'])
+        self.assertEqual('10.0.0.1', result[1]['floating_ips'][0]['address'])
+
+    def _get_subnets_client(self):
+        client = mock.Mock()
+        client.list_subnets.return_value = {'subnets': [
+            {'id': 'subnet-1', 'cidr': '10.0.1.0/24',
+             'network_id': 'net-1', 'gateway_ip': '10.0.1.1'},
+            {'id': 'subnet-2', 'cidr': '10.0.2.0/24',
+             'network_id': 'net-2', 'gateway_ip': '10.0.2.1'}]}
+        client.list_ports.return_value = {'ports': [
+            {'fixed_ips': [{'subnet_id': 'subnet-2',
+                            'ip_address': '10.0.2.9'}]}]}
+        return client
+
+    @mock.patch('nova.network.neutronv2.api.get_client')
+    def test_get_subnets_by_id(self, mock_ntrn):
+        client = mock_ntrn.return_value = self._get_subnets_client()
+
+        subnets = self.api._get_subnets_by_id(
+            self.context, ['subnet-1', 'subnet-2', 'subnet-1'])
+
+        self.assertEqual(['subnet-1', 'subnet-2'], sorted(subnets))
+        self.assertEqual('10.0.1.0/24', subnets['subnet-1']['cidr'])
+        self.assertIsNone(subnets['subnet-1'].get_meta('dhcp_server'))
+        self.assertEqual('10.0.2.9',
+                         subnets['subnet-2'].get_meta('dhcp_server'))
+        client.list_subnets.assert_called_once_with(
+            id=['subnet-1', 'subnet-2'])
+        client.list_ports.assert_called_once_with(
+            network_id=['net-1', 'net-2'], device_owner='network:dhcp')
+
+        # Nothing is cached by default
+        self.api._get_subnets_by_id(self.context, ['subnet-1'])
+        self.assertEqual(2, client.list_subnets.call_count)
+
+    @mock.patch('time.time', return_value=100.0)
+    @mock.patch('nova.network.neutronv2.api.get_client')
+    def test_get_subnets_by_id_cached(self, mock_ntrn, mock_time):
+        self.flags(details_cache_ttl=10, group='neutron')
+        client = mock_ntrn.return_value = self._get_subnets_client()
+
+        subnets = self.api._get_subnets_by_id(self.context,
+                                              ['subnet-1', 'subnet-2'])
+        self.assertEqual(['subnet-1', 'subnet-2'], sorted(subnets))
+        mock_time.return_value = 105.0
+        cached = self.api._get_subnets_by_id(self.context,
+                                             ['subnet-2', 'subnet-1'])
+        self.assertEqual(1, client.list_subnets.call_count)
+        self.assertEqual(subnets, cached)
+        # The subnets returned are copies
+        self.assertIsNot(subnets['subnet-1'], cached['subnet-1'])
+
+        # Other projects and expired subnets are fetched again
+        other_context = context.RequestContext('fake-user', 'other-project')
+        self.api._get_subnets_by_id(other_context, ['subnet-1'])
+        self.assertEqual(2, client.list_subnets.call_count)
+        mock_time.return_value = 111.0
+        self.api._get_subnets_by_id(self.context, ['subnet-1'])
+        self.assertEqual(3, client.list_subnets.call_count)
+
+    @mock.patch('nova.network.neutronv2.api.get_client')
+    def test_get_available_networks_cached(self, mock_ntrn):
+        self.flags(details_cache_ttl=10, group='neutron')
+        client = mock_ntrn.return_value
+        nets = [{'id': 'net-1'}, {'id': 'net-2'}]
+        client.list_networks.return_value = {'networks': nets}
+
+        self.assertEqual(nets, self.api._get_available_networks(
+            self.context, 'proj-1', net_ids=['net-1', 'net-2']))
+        self.assertEqual(nets[::-1], self.api._get_available_networks(
+            self.context, 'proj-1', net_ids=['net-2', 'net-1']))
+        self.assertEqual(1, client.list_networks.call_count)
+
+        self.api._get_available_networks(
+            self.context, 'proj-1', net_ids=['net-1', 'net-3'])
+        self.assertEqual(2, client.list_networks.call_count)
+
 
 class TestNeutronv2ModuleMethods(test.NoDBTestCase):
 
@@ -0,0 +1,144 @@
+#    Copyright (c) 2016 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Microbenchmarks of NovaObjectSerializer for the objects most sent over RPC.
+
+Each object is serialized and deserialized over and over, first the way
+the base versioned object implementation does it and then through the
+serializer's per-class plans, e.g.::
+
+    python -m nova.tests.unit.objects.serializer_benchmark --count 2000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+import mock
+from oslo_versionedobjects import base as ovoo_base
+
+from nova import context
+from nova import objects
+from nova.objects import base
+from nova.tests.unit import fake_block_device
+from nova.tests.unit import fake_instance
+from nova.tests.unit import fake_request_spec
+from nova.tests.unit.objects import test_compute_node
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Time NovaObjectSerializer on the common nova objects')
+ARG_PARSER.add_argument(
+    '--count', type=int, default=1000,
+    help="Number of times each object is serialized and deserialized")
+ARG_PARSER.add_argument(
+    '--list-length', type=int, default=50,
+    help="Number of objects in the InstanceList and ComputeNodeList")
+
+
+def make_instance(ctxt):
+    return fake_instance.fake_instance_obj(
+        ctxt, expected_attrs=['metadata', 'system_metadata'],
+        metadata={'role': 'webserver'},
+        system_metadata={'image_base_image_ref': 'fake-image'})
+
+
+def make_compute_node(ctxt):
+    compute = objects.ComputeNode._from_db_object(
+        ctxt, objects.ComputeNode(), test_compute_node.fake_compute_node)
+    compute.obj_reset_changes()
+    return compute
+
+
+def make_request_spec(ctxt):
+    return fake_request_spec.fake_spec_obj()
+
+
+def make_block_device_mapping(ctxt):
+    return fake_block_device.fake_bdm_object(
+        ctxt, {'device_name': '/dev/sda1',
+               'source_type': 'volume',
+               'destination_type': 'volume',
+               'volume_id': 'fake-volume-id-1',
+               'volume_size': 8,
+               'boot_index': 0})
+
+
+def make_instance_list(ctxt, length):
+    return objects.InstanceList(
+        objects=[make_instance(ctxt) for _i in range(length)])
+
+
+def make_compute_node_list(ctxt, length):
+    return objects.ComputeNodeList(
+        objects=[make_compute_node(ctxt) for _i in range(length)])
+
+
+def get_objects(ctxt, list_length=50):
+    """Return the benchmarked objects, by name."""
+    return [('Instance', make_instance(ctxt)),
+            ('ComputeNode', make_compute_node(ctxt)),
+            ('RequestSpec', make_request_spec(ctxt)),
+            ('BlockDeviceMapping', make_block_device_mapping(ctxt)),
+            ('InstanceList', make_instance_list(ctxt, list_length)),
+            ('ComputeNodeList', make_compute_node_list(ctxt, list_length))]
+
+
+def time_calls(func, count):
+    started = time.time()
+    for _i in range(count):
+        func()
+    return time.time() - started
+
+
+def time_base(ctxt, obj, count):
+    primitive = obj.obj_to_primitive()
+    base_from_primitive = classmethod(
+        ovoo_base.VersionedObject._obj_from_primitive.__func__)
+    with mock.patch.object(base.NovaObject, '_obj_from_primitive',
+                           base_from_primitive):
+        return (time_calls(obj.obj_to_primitive, count),
+                time_calls(lambda: base.NovaObject.obj_from_primitive(
+                    primitive, context=ctxt), count))
+
+
+def time_serializer(ctxt, obj, count):
+    ser = base.NovaObjectSerializer()
+    primitive = ser.serialize_entity(ctxt, obj)
+    return (time_calls(lambda: ser.serialize_entity(ctxt, obj), count),
+            time_calls(lambda: ser.deserialize_entity(ctxt, primitive),
+                       count))
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    objects.register_all()
+    ctxt = context.get_admin_context()
+
+    print('%-20s %12s %12s %12s %12s' % (
+        'object', 'base ser(s)', 'fast ser(s)', 'base des(s)',
+        'fast des(s)'))
+    for name, obj in get_objects(ctxt, args.list_length):
+        base_ser, base_des = time_base(ctxt, obj, args.count)
+        fast_ser, fast_des = time_serializer(ctxt, obj, args.count)
+        print('%-20s %12.3f %12.3f %12.3f %12.3f' % (
+            name, base_ser, fast_ser, base_des, fast_des))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
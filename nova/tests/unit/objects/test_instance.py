@@ -1445,6 +1445,38 @@ class _TestInstanceListObject(object):
             sort_keys=['key1', 'key2'], sort_dirs=['dir1', 'dir2'])
         self.assertEqual(0, mock_get_by_filters.call_count)
 
+    @mock.patch.object(db, 'instance_get_all_by_filters_sort')
+    def test_iter_by_filters(self, mock_get_by_filters_sort):
+        fakes = [self.fake_instance(i) for i in range(5)]
+        mock_get_by_filters_sort.side_effect = [fakes[:2], fakes[2:4],
+                                                fakes[4:]]
+        inst_list = list(objects.InstanceList.iter_by_filters(
+            self.context, {'foo': 'bar'}, expected_attrs=['metadata'],
+            sort_keys=['uuid'], sort_dirs=['asc'], batch_size=2))
+
+        self.assertEqual([inst['uuid'] for inst in fakes],
+                         [inst.uuid for inst in inst_list])
+        self.assertEqual(
+            [None, fakes[1]['uuid'], fakes[3]['uuid']],
+            [c[1]['marker'] for c in mock_get_by_filters_sort.call_args_list])
+        self.assertEqual(
+            [2, 2, 2],
+            [c[1]['limit'] for c in mock_get_by_filters_sort.call_args_list])
+
+    @mock.patch.object(db, 'instance_get_all_by_filters_sort')
+    def test_iter_by_filters_limit(self, mock_get_by_filters_sort):
+        fakes = [self.fake_instance(i) for i in range(5)]
+        mock_get_by_filters_sort.side_effect = [fakes[:2], fakes[2:3]]
+        inst_list = list(objects.InstanceList.iter_by_filters(
+            self.context, {}, limit=3, marker='uuid', sort_keys=['uuid'],
+            sort_dirs=['asc'], batch_size=2))
+
+        self.assertEqual(3, len(inst_list))
+        self.assertEqual(
+            [('uuid', 2), (fakes[1]['uuid'], 1)],
+            [(c[1]['marker'], c[1]['limit'])
+             for c in mock_get_by_filters_sort.call_args_list])
+
     def test_get_all_by_filters_works_for_cleaned(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2, updates={'deleted': 2,
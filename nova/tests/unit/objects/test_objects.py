@@ -39,6 +39,7 @@ from nova.objects import notification
 from nova import test
 from nova.tests import fixtures as nova_fixtures
 from nova.tests.unit import fake_notifier
+from nova.tests.unit.objects import serializer_benchmark
 from nova import utils
 
 
@@ -1034,6 +1035,92 @@ class TestObjectSerializer(_BaseTestCase):
         thing2 = ser.deserialize_entity(self.context, thing)
         self.assertIsInstance(thing2['foo'], base.NovaObject)
 
+    def _assertPrimitiveEqual(self, expected, primitive):
+        def _sort_changes(prim):
+            if isinstance(prim, dict):
+                prim = {k: _sort_changes(v) for k, v in prim.items()}
+                if 'nova_object.changes' in prim:
+                    prim['nova_object.changes'].sort()
+            elif isinstance(prim, list):
+                prim = [_sort_changes(v) for v in prim]
+            return prim
+        self.assertEqual(_sort_changes(expected), _sort_changes(primitive))
+
+    def _get_my_obj(self):
+        obj = MyObj(foo=1, bar='bar', mutable_default=['a'],
+                    rel_object=MyOwnedObject(baz=1),
+                    rel_objects=[MyOwnedObject(baz=2)])
+        obj.obj_reset_changes(recursive=True)
+        return obj
+
+    def test_serialize_entity_same_as_obj_to_primitive(self):
+        ser = base.NovaObjectSerializer()
+        obj = self._get_my_obj()
+        obj.bar = 'changed'
+        self._assertPrimitiveEqual(obj.obj_to_primitive(),
+                                   ser.serialize_entity(self.context, obj))
+
+    def test_serialize_entity_common_objects(self):
+        ser = base.NovaObjectSerializer()
+        for name, obj in serializer_benchmark.get_objects(self.context, 2):
+            self._assertPrimitiveEqual(obj.obj_to_primitive(),
+                                       ser.serialize_entity(self.context,
+                                                            obj))
+            obj2 = ser.deserialize_entity(
+                self.context, ser.serialize_entity(self.context, obj))
+            self.assertTrue(base.obj_equal_prims(obj, obj2), name)
+            self.assertEqual(obj.obj_what_changed(),
+                             obj2.obj_what_changed(), name)
+
+    def test_serialize_entity_nested_changes(self):
+        ser = base.NovaObjectSerializer()
+        obj = self._get_my_obj()
+        primitive = ser.serialize_entity(self.context, obj)
+        self.assertNotIn('nova_object.changes', primitive)
+
+        obj.rel_object.baz = 3
+        obj.rel_objects[0].baz = 4
+        primitive = ser.serialize_entity(self.context, obj)
+        self.assertEqual(['rel_object'], primitive['nova_object.changes'])
+        self.assertEqual(
+            ['baz'],
+            primitive['nova_object.data']['rel_objects'][0][
+                'nova_object.changes'])
+
+        objs = objects.InstanceList(objects=[])
+        objs.obj_reset_changes()
+        self.assertNotIn('nova_object.changes',
+                         ser.serialize_entity(self.context, objs))
+
+    def test_serialize_entity_obj_to_primitive_override(self):
+        ser = base.NovaObjectSerializer()
+        obj = self._get_my_obj()
+        with mock.patch.object(MyOwnedObject, 'obj_to_primitive',
+                               return_value='fake-primitive'):
+            primitive = ser.serialize_entity(self.context, obj)
+        self.assertEqual('fake-primitive',
+                         primitive['nova_object.data']['rel_object'])
+
+    def test_deserialize_entity_coerces(self):
+        ser = base.NovaObjectSerializer()
+        primitive = self._get_my_obj().obj_to_primitive()
+        primitive['nova_object.data']['foo'] = '2'
+        primitive['nova_object.data']['rel_object'] = None
+        primitive['nova_object.changes'] = ['foo']
+        obj = ser.deserialize_entity(self.context, primitive)
+        self.assertEqual(2, obj.foo)
+        self.assertIsInstance(obj.bar, six.text_type)
+        self.assertIsNone(obj.rel_object)
+        self.assertEqual(set(['foo']), obj.obj_what_changed())
+        self.assertEqual(self.context, obj._context)
+
+    def test_deserialize_entity_not_nullable(self):
+        ser = base.NovaObjectSerializer()
+        primitive = self._get_my_obj().obj_to_primitive()
+        primitive['nova_object.data']['bar'] = None
+        self.assertRaises(ValueError, ser.deserialize_entity, self.context,
+                          primitive)
+
 
 class TestArgsSerializer(test.NoDBTestCase):
     def setUp(self):
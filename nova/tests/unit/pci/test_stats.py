@@ -202,6 +202,30 @@ class PciDeviceStatsTestCase(test.NoDBTestCase):
         self.assertEqual(set(['v3']),
                          set([dev.vendor_id for dev in devs]))
 
+    def test_support_requests_same_pool(self):
+        # Both requests can only be met by the 'v1' pool of 2 devices
+        requests = [objects.InstancePCIRequest(count=1,
+                        spec=[{'vendor_id': 'v1'}]),
+                    objects.InstancePCIRequest(count=2,
+                        spec=[{'product_id': 'p1'}])]
+        self.assertFalse(self.pci_stats.support_requests(requests))
+        self.assertTrue(self.pci_stats.support_requests(requests[1:]))
+        self.assertEqual(set([1, 2]),
+                         set([d['count'] for d in self.pci_stats]))
+
+    def test_support_requests_matching_pools_cached(self):
+        self.assertTrue(self.pci_stats.support_requests(pci_requests))
+        with mock.patch.object(self.pci_stats, '_get_pool_index') as index:
+            self.assertTrue(self.pci_stats.support_requests(pci_requests))
+            self.assertFalse(index.called)
+
+    def test_apply_requests_updates_matching_pools(self):
+        self.pci_stats.apply_requests(pci_requests)
+        self.assertFalse(self.pci_stats.support_requests(pci_requests))
+        self.assertTrue(self.pci_stats.support_requests(pci_requests[:1]))
+        self.pci_stats.add_device(self.fake_dev_2)
+        self.assertTrue(self.pci_stats.support_requests(pci_requests))
+
 
 class PciDeviceStatsWithTagsTestCase(test.NoDBTestCase):
 
@@ -274,6 +298,17 @@ class PciDeviceStatsWithTagsTestCase(test.NoDBTestCase):
         self._create_pci_devices()
         self._assertPools()
 
+    def test_support_requests_physical_network(self):
+        self._create_pci_devices()
+        physnet1 = objects.InstancePCIRequest(count=4,
+            spec=[{'vendor_id': '1137', 'physical_network': 'physnet1'}])
+        physnet2 = objects.InstancePCIRequest(count=1,
+            spec=[{'vendor_id': '1137', 'physical_network': 'physnet2'}])
+        self.assertTrue(self.pci_stats.support_requests([physnet1]))
+        self.assertFalse(self.pci_stats.support_requests([physnet2]))
+        self.assertFalse(self.pci_stats.support_requests([physnet1,
+                                                          physnet1]))
+
     def test_consume_reqeusts(self):
         self._create_pci_devices()
         pci_requests = [objects.InstancePCIRequest(count=1,
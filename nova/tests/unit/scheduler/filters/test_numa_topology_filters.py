@@ -13,6 +13,8 @@
 import itertools
 import uuid
 
+import mock
+
 from nova import objects
 from nova.objects import fields
 from nova.scheduler.filters import numa_topology_filter
@@ -48,6 +50,27 @@ class TestNUMATopologyFilter(test.NoDBTestCase):
                                     'ram_allocation_ratio': 1.5})
         self.assertTrue(self.filt_cls.host_passes(host, spec_obj))
 
+    @mock.patch('nova.virt.hardware.numa_fit_instance_to_host')
+    def test_numa_topology_filter_all_shares_fit_cache(self, mock_fit):
+        instance_topology = objects.InstanceNUMATopology(
+            cells=[objects.InstanceNUMACell(id=0, cpuset=set([1]), memory=512)
+               ])
+        spec_obj = self._get_spec_obj(numa_topology=instance_topology)
+        hosts = [fakes.FakeHostState('host%s' % x, 'node%s' % x,
+                                     {'numa_topology': fakes.NUMA_TOPOLOGY,
+                                      'pci_stats': None,
+                                      'cpu_allocation_ratio': 16.0,
+                                      'ram_allocation_ratio': 1.5})
+                 for x in range(2)]
+
+        passed = list(self.filt_cls.filter_all(hosts, spec_obj))
+
+        self.assertEqual(hosts, passed)
+        caches = [kwargs['cell_fit_cache']
+                  for args, kwargs in mock_fit.call_args_list]
+        self.assertEqual(2, len(caches))
+        self.assertIs(caches[0], caches[1])
+
     def test_numa_topology_filter_numa_instance_no_numa_host_fail(self):
         instance_topology = objects.InstanceNUMATopology(
             cells=[objects.InstanceNUMACell(id=0, cpuset=set([1]), memory=512),
@@ -90,6 +90,15 @@ class SchedulerQueryClientTestCase(test.NoDBTestCase):
         mock_delete_agg.assert_called_once_with(
             self.context, aggregate)
 
+    @mock.patch.object(scheduler_rpcapi.SchedulerAPI, 'update_compute_node')
+    def test_update_compute_node(self, mock_update_cn):
+        self.client.update_compute_node(
+            context=self.context,
+            compute_node=mock.sentinel.cn,
+            generation=42)
+        mock_update_cn.assert_called_once_with(
+            self.context, mock.sentinel.cn, 42)
+
 
 class SchedulerClientTestCase(test.NoDBTestCase):
 
@@ -162,3 +171,31 @@ class SchedulerClientTestCase(test.NoDBTestCase):
 
         self.assertIsNotNone(self.client.reportclient.instance)
         mock_update_resource_stats.assert_called_once_with(mock.sentinel.cn)
+
+    @mock.patch.object(scheduler_query_client.SchedulerQueryClient,
+                       'update_compute_node')
+    @mock.patch.object(scheduler_report_client.SchedulerReportClient,
+                       'update_resource_stats')
+    def test_update_resource_stats_not_tracked(self, mock_update_stats,
+                                               mock_update_cn):
+        self.client.update_resource_stats(mock.sentinel.cn)
+
+        mock_update_stats.assert_called_once_with(mock.sentinel.cn)
+        self.assertFalse(mock_update_cn.called)
+
+    @mock.patch('time.time', return_value=1000)
+    @mock.patch.object(scheduler_query_client.SchedulerQueryClient,
+                       'update_compute_node')
+    @mock.patch.object(scheduler_report_client.SchedulerReportClient,
+                       'update_resource_stats')
+    def test_update_resource_stats_tracked(self, mock_update_stats,
+                                           mock_update_cn, mock_time):
+        self.flags(scheduler_tracks_compute_node_changes=True)
+        cn = objects.ComputeNode(context='ctxt', host='fakehost',
+                                 hypervisor_hostname='fakenode')
+
+        self.client.update_resource_stats(cn)
+        self.client.update_resource_stats(cn)
+
+        mock_update_cn.assert_has_calls([
+            mock.call('ctxt', cn, 1000001), mock.call('ctxt', cn, 1000002)])
@@ -0,0 +1,220 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the columnar filtering and weighing of host states.
+"""
+
+import copy
+import random
+
+import mock
+import testtools
+
+from nova import objects
+from nova.scheduler import columnar
+from nova.scheduler import filters
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_manager
+from nova.scheduler import weights
+from nova.scheduler.weights import disk
+from nova.scheduler.weights import io_ops
+from nova.scheduler.weights import ram
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+class EvenHostsFilter(filters.BaseHostFilter):
+    """A filter without filter_columns()."""
+
+    def host_passes(self, host_state, spec_obj):
+        return int(host_state.host[4:]) % 2 == 0
+
+
+class HostNumberWeigher(weights.BaseHostWeigher):
+    """A weigher without weigh_columns()."""
+
+    def _weigh_object(self, host_state, weight_properties):
+        return int(host_state.host[4:]) % 7
+
+
+def _make_hosts(count, seed):
+    rng = random.Random(seed)
+    hosts = []
+    for x in range(count):
+        total_usable_ram_mb = rng.choice([0, 1024, 4096, 65536])
+        hosts.append(fakes.FakeHostState('host%s' % x, 'node%s' % x, {
+            'total_usable_ram_mb': total_usable_ram_mb,
+            'free_ram_mb': total_usable_ram_mb - rng.randint(-2048, 8192),
+            'ram_allocation_ratio': rng.choice([1.0, 1.5]),
+            'total_usable_disk_gb': rng.choice([0, 100, 1000]),
+            'free_disk_mb': rng.randint(-1024, 1000 * 1024),
+            'disk_allocation_ratio': rng.choice([1.0, 2.0]),
+            'vcpus_total': rng.choice([0, 4, 16]),
+            'vcpus_used': rng.randint(0, 40),
+            'cpu_allocation_ratio': rng.choice([0.0, 1.0, 16.0]),
+            'num_instances': rng.randint(0, 60),
+            'num_io_ops': rng.randint(0, 10)}))
+    return hosts
+
+
+@testtools.skipIf(not columnar.available(), "NumPy is not installed")
+class ColumnarFilterHandlerTestCase(test.NoDBTestCase):
+    """Test case for ColumnarFilterHandler."""
+
+    def setUp(self):
+        super(ColumnarFilterHandlerTestCase, self).setUp()
+        self.filter_handler = filters.HostFilterHandler()
+        self.columnar_handler = columnar.ColumnarFilterHandler(
+            self.filter_handler)
+        self.filters = [ram_filter.RamFilter(), EvenHostsFilter(),
+                        core_filter.CoreFilter(), disk_filter.DiskFilter(),
+                        num_instances_filter.NumInstancesFilter(),
+                        io_ops_filter.IoOpsFilter()]
+        self.spec_obj = objects.RequestSpec(
+            flavor=objects.Flavor(memory_mb=1024, vcpus=2, root_gb=10,
+                                  ephemeral_gb=0, swap=512),
+            instance_uuid='fake-uuid')
+
+    def test_same_results_as_per_host_filtering(self):
+        for seed in range(20):
+            hosts = _make_hosts(200, seed)
+            columnar_hosts = copy.deepcopy(hosts)
+
+            expected = self.filter_handler.get_filtered_objects(
+                self.filters, hosts, self.spec_obj)
+            result = self.columnar_handler.get_filtered_objects(
+                self.filters, columnar_hosts, self.spec_obj)
+
+            self.assertEqual([h.host for h in expected],
+                             [h.host for h in result])
+            self.assertEqual([h.limits for h in hosts],
+                             [h.limits for h in columnar_hosts])
+
+    def test_all_hosts_removed(self):
+        hosts = _make_hosts(10, 0)
+        self.spec_obj.flavor.memory_mb = 1024 * 1024
+
+        with mock.patch.object(self.filter_handler,
+                               '_log_filtration_history') as mock_log:
+            result = self.columnar_handler.get_filtered_objects(
+                self.filters, hosts, self.spec_obj)
+
+        self.assertEqual([], result)
+        mock_log.assert_called_once_with(
+            self.spec_obj,
+            ['RamFilter: (start: 10, end: 0)'],
+            [('RamFilter', None)])
+
+    def test_filter_stops_filtering(self):
+        hosts = _make_hosts(10, 0)
+        with mock.patch.object(EvenHostsFilter, 'filter_all',
+                               return_value=None):
+            self.assertIsNone(self.columnar_handler.get_filtered_objects(
+                [EvenHostsFilter()], hosts, self.spec_obj))
+
+    def test_falls_back_without_allocation_ratios(self):
+        hosts = _make_hosts(10, 0)
+        hosts[3].ram_allocation_ratio = None
+        with mock.patch.object(self.filter_handler,
+                               'get_filtered_objects') as mock_filter:
+            result = self.columnar_handler.get_filtered_objects(
+                self.filters, hosts, self.spec_obj, index=1)
+
+        mock_filter.assert_called_once_with(self.filters, hosts,
+                                            self.spec_obj, 1)
+        self.assertEqual(mock_filter.return_value, result)
+
+    def test_aggregate_filters_use_hosts(self):
+        self.assertFalse(disk_filter.AggregateDiskFilter.supports_columns)
+        self.assertFalse(
+            num_instances_filter.AggregateNumInstancesFilter.supports_columns)
+        self.assertFalse(io_ops_filter.AggregateIoOpsFilter.supports_columns)
+
+
+@testtools.skipIf(not columnar.available(), "NumPy is not installed")
+class ColumnarWeightHandlerTestCase(test.NoDBTestCase):
+    """Test case for ColumnarWeightHandler."""
+
+    def setUp(self):
+        super(ColumnarWeightHandlerTestCase, self).setUp()
+        self.flags(ram_weight_multiplier=1.0, disk_weight_multiplier=2.0,
+                   io_ops_weight_multiplier=-1.0)
+        self.weight_handler = weights.HostWeightHandler()
+        self.columnar_handler = columnar.ColumnarWeightHandler(
+            self.weight_handler)
+
+    def _get_weighers(self):
+        return [ram.RAMWeigher(), disk.DiskWeigher(), io_ops.IoOpsWeigher(),
+                HostNumberWeigher()]
+
+    def test_same_results_as_per_host_weighing(self):
+        weighers = self._get_weighers()
+        columnar_weighers = self._get_weighers()
+        for seed in range(5):
+            hosts = _make_hosts(200, seed)
+
+            expected = self.weight_handler.get_weighed_objects(
+                weighers, hosts, {})
+            result = self.columnar_handler.get_weighed_objects(
+                columnar_weighers, hosts, {})
+
+            self.assertEqual([(w.obj.host, w.weight) for w in expected],
+                             [(w.obj.host, w.weight) for w in result])
+            self.assertEqual([(w.minval, w.maxval) for w in weighers],
+                             [(w.minval, w.maxval) for w in columnar_weighers])
+
+    def test_single_host(self):
+        hosts = _make_hosts(1, 0)
+        result = self.columnar_handler.get_weighed_objects(
+            self._get_weighers(), hosts, {})
+        self.assertEqual(1, len(result))
+        self.assertIsInstance(result[0], weights.WeighedHost)
+        self.assertEqual(0.0, result[0].weight)
+
+
+class HostManagerColumnarTestCase(test.NoDBTestCase):
+    """Test case for enabling the columnar engine of the HostManager."""
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    def _get_host_manager(self, mock_init_agg, mock_init_inst):
+        return host_manager.HostManager()
+
+    def test_disabled(self):
+        manager = self._get_host_manager()
+        self.assertIsInstance(manager.filter_handler,
+                              filters.HostFilterHandler)
+        self.assertIsInstance(manager.weight_handler,
+                              weights.HostWeightHandler)
+
+    @mock.patch.object(columnar, 'available', return_value=True)
+    def test_enabled(self, mock_available):
+        self.flags(scheduler_use_columnar_engine=True)
+        manager = self._get_host_manager()
+        self.assertIsInstance(manager.filter_handler,
+                              columnar.ColumnarFilterHandler)
+        self.assertIsInstance(manager.weight_handler,
+                              columnar.ColumnarWeightHandler)
+
+    @mock.patch.object(columnar, 'available', return_value=False)
+    def test_enabled_without_numpy(self, mock_available):
+        self.flags(scheduler_use_columnar_engine=True)
+        manager = self._get_host_manager()
+        self.assertIsInstance(manager.filter_handler,
+                              filters.HostFilterHandler)
@@ -834,6 +834,122 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         self.assertEqual(len(host_states_map), 0)
 
 
+class HostManagerIncrementalTestCase(test.NoDBTestCase):
+    """Test case for the incremental host states of HostManager."""
+
+    @mock.patch.object(host_manager.HostManager, '_init_instance_info')
+    @mock.patch.object(host_manager.HostManager, '_init_aggregates')
+    def setUp(self, mock_init_agg, mock_init_inst):
+        super(HostManagerIncrementalTestCase, self).setUp()
+        self.host_manager = host_manager.HostManager()
+        self.context = 'fake_context'
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary',
+                return_value=fakes.SERVICES)
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                return_value=fakes.COMPUTE_NODES)
+    @mock.patch('nova.objects.InstanceList.get_by_host',
+                return_value=objects.InstanceList())
+    def _resync(self, mock_get_by_host, mock_get_all, mock_get_by_binary):
+        return self.host_manager.get_incremental_host_states(self.context)
+
+    def test_get_incremental_host_states_resyncs_first(self):
+        host_states = self._resync()
+        self.assertEqual(4, len(host_states))
+        self.assertIsNotNone(self.host_manager._last_resync)
+
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    def test_get_incremental_host_states_no_db_reads(self, mock_get_all):
+        self._resync()
+        host_states = self.host_manager.get_incremental_host_states(
+            self.context)
+        self.assertEqual(4, len(host_states))
+        self.assertFalse(mock_get_all.called)
+
+    def test_update_compute_node_in_order(self):
+        self._resync()
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        compute = fakes.COMPUTE_NODES[0]
+        with mock.patch.object(host_state, 'update') as mock_update:
+            self.host_manager.update_compute_node(self.context, compute, 5)
+            self.host_manager.update_compute_node(self.context, compute, 6)
+        mock_update.assert_has_calls([mock.call(compute=compute)] * 2)
+        self.assertEqual(set(), self.host_manager._stale_nodes)
+
+    def test_update_compute_node_stale_generation(self):
+        self._resync()
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        compute = fakes.COMPUTE_NODES[0]
+        self.host_manager.update_compute_node(self.context, compute, 5)
+        with mock.patch.object(host_state, 'update') as mock_update:
+            self.host_manager.update_compute_node(self.context, compute, 4)
+        self.assertFalse(mock_update.called)
+
+    def test_update_compute_node_missed_generation(self):
+        self._resync()
+        compute = fakes.COMPUTE_NODES[0]
+        self.host_manager.update_compute_node(self.context, compute, 5)
+        self.host_manager.update_compute_node(self.context, compute, 7)
+        self.assertEqual({('host1', 'node1')},
+                         self.host_manager._stale_nodes)
+
+    @mock.patch('nova.objects.InstanceList.get_by_host',
+                return_value=objects.InstanceList())
+    @mock.patch('nova.objects.Service.get_by_compute_host',
+                return_value=fakes.SERVICES[0])
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    def test_update_compute_node_unknown_node(self, mock_get_cn,
+                                              mock_get_svc, mock_get_inst):
+        self._resync()
+        compute = objects.ComputeNode(host='host1',
+                                      hypervisor_hostname='node5')
+        self.host_manager.update_compute_node(self.context, compute, 1)
+        self.assertNotIn(('host1', 'node5'),
+                         self.host_manager.host_state_map)
+
+        mock_get_cn.return_value = fakes.COMPUTE_NODES[0]
+        host_states = self.host_manager.get_incremental_host_states(
+            self.context)
+
+        self.assertEqual(5, len(host_states))
+        mock_get_cn.assert_called_once_with(self.context, 'host1', 'node5')
+        self.assertIn(('host1', 'node5'), self.host_manager.host_state_map)
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename',
+                side_effect=exception.ComputeHostNotFound(host='host1'))
+    def test_get_incremental_host_states_removes_dead_node(self,
+                                                           mock_get_cn):
+        self._resync()
+        self.host_manager._stale_nodes.add(('host1', 'node1'))
+        host_states = self.host_manager.get_incremental_host_states(
+            self.context)
+        self.assertEqual(3, len(host_states))
+        self.assertNotIn(('host1', 'node1'),
+                         self.host_manager.host_state_map)
+
+    @mock.patch('nova.objects.ServiceList.get_by_binary',
+                return_value=fakes.SERVICES)
+    def test_get_incremental_host_states_refreshes_services(self,
+                                                            mock_get_svcs):
+        self.flags(scheduler_service_refresh_interval=10)
+        self._resync()
+        mock_get_svcs.reset_mock()
+        self.host_manager.get_incremental_host_states(self.context)
+        self.assertFalse(mock_get_svcs.called)
+
+        self.host_manager._last_service_refresh -= 10
+        self.host_manager.get_incremental_host_states(self.context)
+        mock_get_svcs.assert_called_once_with(self.context, 'nova-compute',
+                                              include_disabled=True)
+
+    def test_update_aggregates_refreshes_host_states(self):
+        self._resync()
+        agg = objects.Aggregate(id=1, hosts=['host1'])
+        self.host_manager.update_aggregates([agg])
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        self.assertEqual([agg], host_state.aggregates)
+
+
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
 
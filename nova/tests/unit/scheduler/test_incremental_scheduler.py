@@ -0,0 +1,127 @@
+# Copyright (c) 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+
+import mock
+from oslo_utils import timeutils
+from six.moves import range
+
+from nova import objects
+from nova.scheduler import incremental_scheduler
+from nova.tests.unit.scheduler import test_scheduler
+
+HOSTS = 100
+REQUESTS = 10
+
+
+class IncrementalSchedulerTestCase(test_scheduler.SchedulerTestCase):
+    """Test case for Incremental Scheduler."""
+
+    driver_cls = incremental_scheduler.IncrementalScheduler
+
+    def test_run_periodic_tasks_resyncs_hosts(self):
+        context = mock.Mock()
+        with mock.patch.object(self.driver.host_manager,
+                               "resync_host_states") as mock_resync:
+            self.driver.run_periodic_tasks(context)
+
+            mock_resync.assert_called_once_with(context.elevated.return_value)
+
+    def test_get_all_host_states_is_incremental(self):
+        with mock.patch.object(self.driver.host_manager,
+                               "get_incremental_host_states") as mock_get:
+            mock_get.return_value = ["asdf"]
+
+            result = self.driver._get_all_host_states(self.context)
+
+            mock_get.assert_called_once_with(self.context)
+            self.assertEqual(["asdf"], result)
+
+    def _get_fake_compute_nodes(self, hosts):
+        compute_nodes = []
+        services = []
+        for x in range(hosts):
+            compute_nodes.append(objects.ComputeNode(
+                id=x, local_gb=1024, memory_mb=1024, vcpus=4,
+                disk_available_least=None, free_ram_mb=512, vcpus_used=1,
+                free_disk_gb=512, local_gb_used=0, updated_at=None,
+                host='host%s' % x, hypervisor_hostname='node%s' % x,
+                host_ip='127.0.0.1', hypervisor_version=0,
+                numa_topology=None, hypervisor_type='foo',
+                supported_hv_specs=[], pci_device_pools=None,
+                cpu_info=None, stats=None, metrics=None,
+                cpu_allocation_ratio=16.0, ram_allocation_ratio=1.5,
+                disk_allocation_ratio=1.0))
+            services.append(objects.Service(host='host%s' % x,
+                                            disabled=False))
+        return compute_nodes, services
+
+    @mock.patch('nova.objects.InstanceList.get_by_host',
+                return_value=objects.InstanceList())
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    def test_performance_check_host_states(self, mock_get_all,
+                                           mock_get_by_binary,
+                                           mock_get_by_host):
+        compute_nodes, services = self._get_fake_compute_nodes(HOSTS)
+        mock_get_all.return_value = compute_nodes
+        mock_get_by_binary.return_value = services
+        host_manager = self.driver.host_manager
+        generations = itertools.count(1)
+
+        def time_requests(get_host_states):
+            a = timeutils.utcnow()
+            for x in range(REQUESTS):
+                # one resource tracker update between each request
+                compute_node = compute_nodes[x % HOSTS]
+                host_manager.update_compute_node(self.context, compute_node,
+                                                 next(generations))
+                get_host_states(self.context)
+            c = timeutils.utcnow() - a
+            return c.total_seconds() * 1000.0 / REQUESTS
+
+        full_ms = time_requests(host_manager.get_all_host_states)
+        host_manager.resync_host_states(self.context)
+        mock_get_all.reset_mock()
+        incremental_ms = time_requests(
+            host_manager.get_incremental_host_states)
+
+        self.assertFalse(mock_get_all.called)
+        self.assertEqual(HOSTS, len(host_manager.host_state_map))
+        if __name__ == '__main__':
+            print('%d hosts: get_all_host_states %.2f ms/request, '
+                  'get_incremental_host_states %.2f ms/request' % (
+                      HOSTS, full_ms, incremental_ms))
+        # The database is mocked out here, which is most of what the
+        # incremental host states save; this only catches regressions.
+        self.assertTrue(incremental_ms < 1000)
+
+
+if __name__ == '__main__':
+    # A handy tool to compare the cost of building the host states, e.g.
+    # python -m nova.tests.unit.scheduler.test_incremental_scheduler 5000
+    import sys
+
+    import testtools
+    if len(sys.argv) > 1:
+        HOSTS = int(sys.argv[1])
+        REQUESTS = HOSTS
+    suite = testtools.ConcurrentTestSuite()
+    test = "test_performance_check_host_states"
+    test_case = IncrementalSchedulerTestCase(test)
+    suite.addTest(test_case)
+    runner = testtools.TextTestResult.TextTestRunner()
+    runner.run(suite)
@@ -122,3 +122,17 @@ class SchedulerRpcAPITestCase(test.NoDBTestCase):
                 instance_uuids=['fake1', 'fake2'],
                 fanout=True,
                 version='4.2')
+
+    def test_update_compute_node(self):
+        self._test_scheduler_api('update_compute_node', rpc_method='cast',
+                compute_node='fake_compute_node',
+                generation=42,
+                fanout=True,
+                version='4.4')
+
+    def test_update_compute_node_with_old_manager(self):
+        self.flags(scheduler='4.3', group='upgrade_levels')
+        rpcapi = scheduler_rpcapi.SchedulerAPI()
+        with mock.patch.object(rpcapi.client, 'prepare') as mock_prepare:
+            rpcapi.update_compute_node('ctxt', 'fake_compute_node', 42)
+            self.assertFalse(mock_prepare.called)
@@ -177,6 +177,16 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                               mock.sentinel.host_name,
                                               mock.sentinel.instance_uuids)
 
+    def test_update_compute_node(self):
+        with mock.patch.object(self.manager.driver.host_manager,
+                               'update_compute_node') as mock_update:
+            self.manager.update_compute_node(mock.sentinel.context,
+                                             mock.sentinel.compute_node,
+                                             mock.sentinel.generation)
+            mock_update.assert_called_once_with(mock.sentinel.context,
+                                                mock.sentinel.compute_node,
+                                                mock.sentinel.generation)
+
 
 class SchedulerInitTestCase(test.NoDBTestCase):
     """Test case for base scheduler driver initiation."""
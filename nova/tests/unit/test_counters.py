@@ -0,0 +1,70 @@
+#    Copyright (c) 2016 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_service import periodic_task
+
+from nova import counters
+from nova import manager
+from nova import test
+
+
+class CountersTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(CountersTestCase, self).setUp()
+        counters.reset()
+        self.addCleanup(counters.reset)
+
+    def test_increment(self):
+        counters.increment('foo')
+        counters.increment('foo', 2)
+        self.assertEqual({'foo': {'count': 3, 'total': 0.0, 'max': 0.0,
+                                  'average': 0.0}},
+                         counters.get_counters())
+
+    @mock.patch('time.time', side_effect=[10.0, 11.0, 20.0, 23.0])
+    def test_timed(self, time_mock):
+        @counters.timed('bar')
+        def bar(arg):
+            if arg:
+                raise ValueError()
+            return 'result'
+
+        self.assertEqual('result', bar(False))
+        self.assertRaises(ValueError, bar, True)
+        self.assertEqual({'bar': {'count': 2, 'total': 4.0, 'max': 3.0,
+                                  'average': 2.0}},
+                         counters.get_counters())
+
+    def test_reset(self):
+        with counters.measure('foo'):
+            pass
+        counters.reset()
+        self.assertEqual({}, counters.get_counters())
+
+    def test_report_generator(self):
+        counters.increment('foo')
+        model = counters.CountersReportGenerator()()
+        self.assertEqual(1, model['foo']['count'])
+
+    def test_periodic_tasks_timed(self):
+        class FakeManager(manager.Manager):
+            @periodic_task.periodic_task(run_immediately=True)
+            def _fake_task(self, context):
+                pass
+
+        FakeManager().periodic_tasks(mock.sentinel.ctx)
+        self.assertEqual(
+            1, counters.get_counters()['periodic_task._fake_task']['count'])
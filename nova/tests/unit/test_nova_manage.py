@@ -13,11 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 from six.moves import StringIO
 import sys
 
 import fixtures
 import mock
+from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 
 from nova.cmd import manage
@@ -388,21 +390,28 @@ class DBCommandsTestCase(test.NoDBTestCase):
         large_number = '1' * 100
         self.assertEqual(1, self.commands.archive_deleted_rows(large_number))
 
-    @mock.patch.object(db, 'archive_deleted_rows',
-                       return_value=dict(instances=10, consoles=5))
+    @mock.patch.object(db, 'archive_deleted_rows')
     def _test_archive_deleted_rows(self, mock_db_archive, verbose=False):
+        def fake_archive(max_rows, chunk_size, workers, checkpoints,
+                         durations):
+            durations.update(instances=2.0, consoles=0.0)
+            return dict(instances=10, consoles=5)
+
+        mock_db_archive.side_effect = fake_archive
         self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
         self.commands.archive_deleted_rows(20, verbose=verbose)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(
+            20, chunk_size=None, workers=1, checkpoints={},
+            durations=mock.ANY)
         output = sys.stdout.getvalue()
         if verbose:
             expected = '''\
-+-----------+-------------------------+
-| Table     | Number of Rows Archived |
-+-----------+-------------------------+
-| consoles  | 5                       |
-| instances | 10                      |
-+-----------+-------------------------+
++-----------+-------------------------+----------+
+| Table     | Number of Rows Archived | Rows/sec |
++-----------+-------------------------+----------+
+| consoles  | 5                       |          |
+| instances | 10                      | 5        |
++-----------+-------------------------+----------+
 '''
             self.assertEqual(expected, output)
         else:
@@ -420,10 +429,55 @@ class DBCommandsTestCase(test.NoDBTestCase):
     def test_archive_deleted_rows_verbose_no_results(self, mock_db_archive):
         self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
         self.commands.archive_deleted_rows(20, verbose=True)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(
+            20, chunk_size=None, workers=1, checkpoints={},
+            durations={})
         output = sys.stdout.getvalue()
         self.assertIn('Nothing was archived.', output)
 
+    def test_archive_deleted_rows_invalid_chunk_size(self):
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            20, chunk_size='0'))
+
+    def test_archive_deleted_rows_invalid_workers(self):
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            20, workers='-1'))
+
+    @mock.patch.object(db, 'archive_deleted_rows')
+    def test_archive_deleted_rows_checkpoint_file(self, mock_db_archive):
+        def fake_archive(max_rows, chunk_size, workers, checkpoints,
+                         durations):
+            self.assertEqual({'instances': 10}, checkpoints)
+            checkpoints['instances'] = 20
+            checkpoints['consoles'] = 5
+            return {}
+
+        mock_db_archive.side_effect = fake_archive
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'checkpoints.json')
+        with open(path, 'w') as f:
+            f.write('{"instances": 10}')
+        self.commands.archive_deleted_rows(20, chunk_size='5', workers='4',
+                                           checkpoint_file=path)
+        mock_db_archive.assert_called_once_with(
+            20, chunk_size=5, workers=4, checkpoints=mock.ANY,
+            durations={})
+        with open(path) as f:
+            self.assertEqual({'instances': 20, 'consoles': 5},
+                             jsonutils.load(f))
+
+    @mock.patch.object(db, 'archive_deleted_rows',
+                       side_effect=KeyboardInterrupt)
+    def test_archive_deleted_rows_interrupted_checkpoint_file(
+            self, mock_db_archive):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'checkpoints.json')
+        self.assertRaises(KeyboardInterrupt,
+                          self.commands.archive_deleted_rows, 20,
+                          checkpoint_file=path)
+        with open(path) as f:
+            self.assertEqual({}, jsonutils.load(f))
+
     @mock.patch.object(migration, 'db_null_instance_uuid_scan',
                        return_value={'foo': 0})
     def test_null_instance_uuid_scan_no_records_found(self, mock_scan):
@@ -542,6 +596,25 @@ class ServiceCommandsTestCase(test.TestCase):
         self.assertEqual(2, self.commands.disable('nohost', 'noservice'))
 
 
+class HostCommandsTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(HostCommandsTestCase, self).setUp()
+        self.commands = manage.HostCommands()
+
+    @mock.patch('nova.compute.api.HostAPI.prefetch_images')
+    def test_prefetch_images(self, mock_prefetch):
+        self.assertIsNone(self.commands.prefetch_images(
+            'fake-host', ['image1', 'image2']))
+        mock_prefetch.assert_called_once_with(
+            mock.ANY, 'fake-host', ['image1', 'image2'])
+
+    @mock.patch('nova.compute.api.HostAPI.prefetch_images',
+                side_effect=exception.ComputeHostNotFound(host='fake-host'))
+    def test_prefetch_images_host_not_found(self, mock_prefetch):
+        self.assertEqual(2, self.commands.prefetch_images(
+            'fake-host', ['image1']))
+
+
 class CellCommandsTestCase(test.NoDBTestCase):
     def setUp(self):
         super(CellCommandsTestCase, self).setUp()
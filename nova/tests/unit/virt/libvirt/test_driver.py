@@ -5347,6 +5347,19 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         self.assertEqual(uuids[3], vm4.UUIDString())
         mock_list.assert_called_with(only_guests=True, only_running=False)
 
+    @mock.patch.object(host.Host, "list_domain_states")
+    def test_get_power_states(self, mock_states):
+        mock_states.return_value = {
+            uuids.running: fakelibvirt.VIR_DOMAIN_RUNNING,
+            uuids.shutoff: fakelibvirt.VIR_DOMAIN_SHUTOFF,
+            uuids.unknown: 42}
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({uuids.running: power_state.RUNNING,
+                          uuids.shutoff: power_state.SHUTDOWN,
+                          uuids.unknown: power_state.NOSTATE},
+                         drvr.get_power_states())
+        mock_states.assert_called_once_with()
+
     @mock.patch('nova.virt.libvirt.host.Host.get_online_cpus')
     def test_get_host_vcpus(self, get_online_cpus):
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
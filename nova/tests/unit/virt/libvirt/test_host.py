@@ -38,10 +38,12 @@ libvirt_guest.libvirt = fakelibvirt
 
 class FakeVirtDomain(object):
 
-    def __init__(self, id=-1, name=None):
+    def __init__(self, id=-1, name=None,
+                 state=fakelibvirt.VIR_DOMAIN_RUNNING):
         self._id = id
         self._name = name
         self._uuid = str(uuid.uuid4())
+        self._state = state
 
     def name(self):
         return self._name
@@ -52,6 +54,9 @@ class FakeVirtDomain(object):
     def UUIDString(self):
         return self._uuid
 
+    def info(self):
+        return [self._state, 2048, 2048, 1, 123456789]
+
 
 class HostTestCase(test.NoDBTestCase):
 
@@ -606,6 +611,63 @@ class HostTestCase(test.NoDBTestCase):
         self.assertEqual(doms[2].name(), vm2.name())
         mock_list.assert_called_with(True)
 
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats")
+    def test_list_domain_states_fast(self, mock_stats, mock_list):
+        vm0 = FakeVirtDomain(id=0, name="Domain-0")  # Xen dom-0
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002",
+                             state=fakelibvirt.VIR_DOMAIN_SHUTOFF)
+        mock_stats.return_value = [
+            (vm0, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING}),
+            (vm1, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING}),
+            (vm2, {'state.state': fakelibvirt.VIR_DOMAIN_SHUTOFF})]
+
+        states = self.host.list_domain_states()
+
+        mock_stats.assert_called_once_with(
+            fakelibvirt.VIR_DOMAIN_STATS_STATE)
+        self.assertFalse(mock_list.called)
+        self.assertEqual({vm1.UUIDString(): fakelibvirt.VIR_DOMAIN_RUNNING,
+                          vm2.UUIDString(): fakelibvirt.VIR_DOMAIN_SHUTOFF},
+                         states)
+
+        states = self.host.list_domain_states(only_guests=False)
+        self.assertEqual(3, len(states))
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_RUNNING,
+                         states[vm0.UUIDString()])
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats")
+    def test_list_domain_states_fallback(self, mock_stats, mock_list):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002",
+                             state=fakelibvirt.VIR_DOMAIN_SHUTOFF)
+        vm3 = FakeVirtDomain(name="instance00000003")
+        gone = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError,
+            "Domain not found",
+            error_code=fakelibvirt.VIR_ERR_NO_DOMAIN)
+        mock_stats.side_effect = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError,
+            "API is not supported",
+            error_code=fakelibvirt.VIR_ERR_NO_SUPPORT)
+        mock_list.return_value = [vm1, vm2, vm3]
+
+        with mock.patch.object(vm3, "info", side_effect=gone):
+            states = self.host.list_domain_states()
+
+        mock_list.assert_called_once_with(only_running=False,
+                                          only_guests=True)
+        self.assertEqual({vm1.UUIDString(): fakelibvirt.VIR_DOMAIN_RUNNING,
+                          vm2.UUIDString(): fakelibvirt.VIR_DOMAIN_SHUTOFF},
+                         states)
+
+        # The bulk API isn't tried again
+        self.host.list_domain_states()
+        mock_stats.assert_called_once_with(
+            fakelibvirt.VIR_DOMAIN_STATS_STATE)
+
     @mock.patch.object(host.Host, "list_instance_domains")
     def test_list_guests(self, mock_list_domains):
         dom0 = mock.Mock(spec=fakelibvirt.virDomain)
@@ -31,6 +31,7 @@ from six.moves import cStringIO
 
 from nova import conductor
 from nova import context
+from nova import exception
 from nova import objects
 from nova import test
 from nova.tests.unit import fake_instance
@@ -1008,3 +1009,234 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             # Checksum requests for a file with no checksum now have the
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
+
+    @mock.patch.object(imagecache, 'CHECKSUM_BLOCK_SIZE', 8)
+    def test_write_stored_checksum_blocks(self):
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'),
+                       group='libvirt')
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            imagecache.write_stored_checksum(fname)
+
+            self.assertEqual(hashlib.sha1(testdata).hexdigest(),
+                             imagecache.read_stored_checksum(
+                                 fname, timestamped=False))
+            blocks = imagecache.read_stored_info(fname, field='sha1-blocks')
+            self.assertEqual([hashlib.sha1(testdata[i:i + 8]).hexdigest()
+                              for i in range(0, len(testdata), 8)], blocks)
+
+    def _check_blocks_body(self, tmpdir, corrupt_at=None):
+        self.flags(instances_path=tmpdir)
+        self.flags(image_info_filename_pattern=('$instances_path/'
+                                                '%(image)s.info'),
+                   group='libvirt')
+        self.flags(checksum_interval_seconds=0,
+                   checksum_bytes_per_pass=16, group='libvirt')
+        fname, info_fname, testdata = self._make_checksum(tmpdir)
+        imagecache.write_stored_checksum(fname)
+        if corrupt_at is not None:
+            with open(fname, 'r+') as f:
+                f.seek(corrupt_at)
+                f.write('X')
+        return imagecache.ImageCacheManager(), fname, testdata
+
+    @mock.patch.object(imagecache, 'CHECKSUM_BLOCK_SIZE', 8)
+    def test_verify_checksum_by_blocks(self):
+        with utils.tempdir() as tmpdir:
+            image_cache_manager, fname, testdata = (
+                self._check_blocks_body(tmpdir))
+            num_blocks = (len(testdata) + 7) // 8
+
+            with mock.patch.object(imagecache, '_hash_file_blocks') as m:
+                for end in range(2, num_blocks, 2):
+                    self.assertTrue(image_cache_manager._verify_checksum(
+                        self.img, fname))
+                    self.assertEqual(end, imagecache.read_stored_info(
+                        fname, field='sha1-cursor'))
+                self.assertTrue(image_cache_manager._verify_checksum(
+                    self.img, fname))
+                self.assertEqual(0, imagecache.read_stored_info(
+                    fname, field='sha1-cursor'))
+            self.assertFalse(m.called)
+
+    @mock.patch.object(imagecache, 'CHECKSUM_BLOCK_SIZE', 8)
+    def test_verify_checksum_by_blocks_fails(self):
+        with intercept_log_messages() as stream:
+            with utils.tempdir() as tmpdir:
+                image_cache_manager, fname, testdata = (
+                    self._check_blocks_body(tmpdir, corrupt_at=20))
+                # The first pass verifies the first two blocks only
+                self.assertTrue(image_cache_manager._verify_checksum(
+                    self.img, fname))
+                self.assertFalse(image_cache_manager._verify_checksum(
+                    self.img, fname))
+                log = stream.getvalue()
+                self.assertNotEqual(log.find('image verification failed'), -1)
+
+    @mock.patch.object(imagecache, 'CHECKSUM_BLOCK_SIZE', 8)
+    def test_verify_checksum_by_blocks_without_blocks(self):
+        with utils.tempdir() as tmpdir:
+            self.flags(checksum_bytes_per_pass=16, group='libvirt')
+            image_cache_manager, fname = self._check_body(tmpdir,
+                                                          "csum valid")
+            self.assertTrue(image_cache_manager._verify_checksum(
+                self.img, fname))
+            # The whole file was verified and its block checksums stored
+            self.assertEqual(9, len(imagecache.read_stored_info(
+                fname, field='sha1-blocks')))
+
+
+class DeduplicateFetchTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DeduplicateFetchTestCase, self).setUp()
+        self.flags(image_cache_deduplicate=True, group='libvirt')
+        self.context = context.get_admin_context()
+
+    def test_disabled(self):
+        self.flags(image_cache_deduplicate=False, group='libvirt')
+        fetch_func = mock.Mock()
+        self.assertIs(fetch_func, imagecache.deduplicate_fetch(fetch_func))
+
+    def _fetch(self, fetch_func, target, image_id, checksum):
+        with mock.patch.object(imagecache.images, 'get_info',
+                               return_value={'checksum': checksum}):
+            imagecache.deduplicate_fetch(fetch_func)(
+                context=self.context, target=target, image_id=image_id,
+                user_id='user', project_id='project', max_size=10)
+
+    def _fake_fetch(self, context, target, image_id, user_id, project_id,
+                    max_size, digest):
+        with open(target, 'w') as f:
+            f.write(image_id)
+        digest.update(image_id)
+
+    def test_fetch_shares_identical_images(self):
+        fetch_func = mock.Mock(side_effect=self._fake_fetch)
+        with utils.tempdir() as tmpdir:
+            target1 = os.path.join(tmpdir, 'image1')
+            target2 = os.path.join(tmpdir, 'image2')
+            target3 = os.path.join(tmpdir, 'image3')
+
+            checksum1 = hashlib.md5('image1').hexdigest()
+            self._fetch(fetch_func, target1, 'image1', checksum1)
+            self._fetch(fetch_func, target2, 'image2', checksum1)
+            self._fetch(fetch_func, target3, 'image3',
+                        hashlib.md5('image3').hexdigest())
+
+            fetch_func.assert_has_calls([
+                mock.call(context=self.context, target=target1,
+                          image_id='image1', user_id='user',
+                          project_id='project', max_size=10,
+                          digest=mock.ANY),
+                mock.call(context=self.context, target=target3,
+                          image_id='image3', user_id='user',
+                          project_id='project', max_size=10,
+                          digest=mock.ANY)])
+            self.assertEqual(2, fetch_func.call_count)
+            with open(target2) as f:
+                self.assertEqual('image1', f.read())
+            content_file = os.path.join(
+                tmpdir, imagecache.CONTENT_SUBDIRECTORY_NAME, checksum1)
+            self.assertEqual(3, os.stat(content_file).st_nlink)
+
+    def test_fetch_does_not_share_wrong_checksum(self):
+        fetch_func = mock.Mock(side_effect=self._fake_fetch)
+        checksum = hashlib.md5('victim').hexdigest()
+        with utils.tempdir() as tmpdir:
+            target1 = os.path.join(tmpdir, 'evil')
+            target2 = os.path.join(tmpdir, 'victim')
+            self._fetch(fetch_func, target1, 'evil', checksum)
+            self.assertFalse(os.path.exists(os.path.join(
+                tmpdir, imagecache.CONTENT_SUBDIRECTORY_NAME, checksum)))
+
+            self._fetch(fetch_func, target2, 'victim', checksum)
+            self.assertEqual(2, fetch_func.call_count)
+            with open(target2) as f:
+                self.assertEqual('victim', f.read())
+
+    def test_fetch_shares_converted_images(self):
+        def fake_fetch(context, target, image_id, user_id, project_id,
+                       max_size, digest):
+            # The downloaded data is hashed, not the converted base file
+            with open(target, 'w') as f:
+                f.write('raw')
+            digest.update('image')
+
+        fetch_func = mock.Mock(side_effect=fake_fetch)
+        checksum = hashlib.md5('image').hexdigest()
+        with utils.tempdir() as tmpdir:
+            target1 = os.path.join(tmpdir, 'image1')
+            target2 = os.path.join(tmpdir, 'image2')
+            self._fetch(fetch_func, target1, 'image1', checksum)
+            self._fetch(fetch_func, target2, 'image2', checksum)
+
+            self.assertEqual(1, fetch_func.call_count)
+            with open(target2) as f:
+                self.assertEqual('raw', f.read())
+
+    def test_fetch_without_checksum(self):
+        fetch_func = mock.Mock()
+        with utils.tempdir() as tmpdir:
+            target = os.path.join(tmpdir, 'image')
+            self._fetch(fetch_func, target, 'image', None)
+            fetch_func.assert_called_once_with(
+                context=self.context, target=target, image_id='image',
+                user_id='user', project_id='project', max_size=10)
+            self.assertFalse(os.path.exists(
+                os.path.join(tmpdir, imagecache.CONTENT_SUBDIRECTORY_NAME)))
+
+
+class ImageCacheManagerPrefetchTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ImageCacheManagerPrefetchTestCase, self).setUp()
+        self.context = context.RequestContext('user', 'project')
+
+    @mock.patch.object(libvirt_utils, 'update_mtime')
+    @mock.patch.object(libvirt_utils, 'fetch_image')
+    def test_prefetch_images(self, mock_fetch, mock_mtime):
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            base_dir = os.path.join(tmpdir,
+                                    CONF.image_cache_subdirectory_name)
+            os.mkdir(base_dir)
+            cached = os.path.join(base_dir, hashlib.sha1('cached').hexdigest())
+            open(cached, 'w').close()
+            mock_fetch.side_effect = [exception.ImageNotFound(image_id='bad'),
+                                      None]
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.prefetch_images(self.context,
+                                                ['bad', 'cached', 'new'])
+
+            mock_mtime.assert_called_once_with(cached)
+            mock_fetch.assert_has_calls([
+                mock.call(context=self.context,
+                          target=os.path.join(
+                              base_dir, hashlib.sha1(image_id).hexdigest()),
+                          image_id=image_id, user_id='user',
+                          project_id='project')
+                for image_id in ('bad', 'new')])
+
+
+class ImageCacheManagerContentTestCase(test.NoDBTestCase):
+
+    def test_remove_unused_content_files(self):
+        with utils.tempdir() as tmpdir:
+            content_dir = os.path.join(tmpdir,
+                                       imagecache.CONTENT_SUBDIRECTORY_NAME)
+            os.mkdir(content_dir)
+            used = os.path.join(content_dir, 'used')
+            unused = os.path.join(content_dir, 'unused')
+            open(used, 'w').close()
+            open(unused, 'w').close()
+            os.link(used, os.path.join(tmpdir, 'base'))
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._remove_unused_content_files(tmpdir)
+
+            self.assertTrue(os.path.exists(used))
+            self.assertFalse(os.path.exists(unused))
@@ -555,7 +555,7 @@ disk size: 4.4M
                                   user_id, project_id)
         mock_images.assert_called_once_with(
             context, image_id, target, user_id, project_id,
-            max_size=0)
+            max_size=0, digest=None)
 
     @mock.patch('nova.virt.images.fetch')
     def test_fetch_initrd_image(self, mock_images):
@@ -17,6 +17,7 @@ import uuid
 
 import mock
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 import six
 
 from nova import context
@@ -1567,6 +1568,163 @@ class VirtNUMAHostTopologyTestCase(test.NoDBTestCase):
                                                         pci_stats=pci_stats)
             self.assertIsNone(fitted_instance1)
 
+    def test_get_fitting_does_not_modify_instance(self):
+        fitted_instance = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, self.limits)
+        self.assertEqual(1, fitted_instance.cells[0].id)
+        self.assertEqual(0, self.instance3.cells[0].id)
+        self.assertIsNot(self.instance3.cells[0], fitted_instance.cells[0])
+
+    def test_get_fitting_shared_cache(self):
+        cell_fit_cache = {}
+        with mock.patch.object(hw, '_numa_fit_instance_cell',
+                               wraps=hw._numa_fit_instance_cell) as mock_fit:
+            fitted_instance1 = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, self.limits,
+                cell_fit_cache=cell_fit_cache)
+            fitted_instance2 = hw.numa_fit_instance_to_host(
+                self.host.obj_clone(), self.instance3, self.limits,
+                cell_fit_cache=cell_fit_cache)
+        self.assertEqual(1, mock_fit.call_count)
+        self.assertEqual(1, fitted_instance2.cells[0].id)
+        self.assertIsNot(fitted_instance1.cells[0], fitted_instance2.cells[0])
+
+    def test_get_fitting_cache_keyed_by_instance_cells(self):
+        cell_fit_cache = {}
+        instance = objects.InstanceNUMATopology(
+            cells=[objects.InstanceNUMACell(
+                id=0, cpuset=set([3, 4]), memory=1024)])
+        fitted_instance3 = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, self.limits,
+                cell_fit_cache=cell_fit_cache)
+        fitted_instance = hw.numa_fit_instance_to_host(
+                self.host, instance, self.limits,
+                cell_fit_cache=cell_fit_cache)
+        self.assertEqual(self.instance3.cells[0].cpuset,
+                         fitted_instance3.cells[0].cpuset)
+        self.assertEqual(set([3, 4]), fitted_instance.cells[0].cpuset)
+
+    def test_get_fitting_cache_keyed_by_limits(self):
+        cell_fit_cache = {}
+        fitted_instance = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, self.limits,
+                cell_fit_cache=cell_fit_cache)
+        self.assertIsNotNone(fitted_instance)
+        limits = objects.NUMATopologyLimits(
+            cpu_allocation_ratio=1, ram_allocation_ratio=1)
+        fitted_instance = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, limits,
+                cell_fit_cache=cell_fit_cache)
+        self.assertIsNone(fitted_instance)
+
+    def test_get_fitting_cache_partly_set_cells(self):
+        host = objects.NUMATopology(
+            cells=[objects.NUMACell(id=0, cpuset=set([1, 2]), memory=2048),
+                   objects.NUMACell(id=1, cpuset=set([3, 4]), memory=2048)])
+        instance = objects.InstanceNUMATopology(
+            cells=[objects.InstanceNUMACell(cpuset=set([1, 2]), memory=1024)])
+        fitted_instance = hw.numa_fit_instance_to_host(
+                host, instance, cell_fit_cache={})
+        self.assertEqual(0, fitted_instance.cells[0].id)
+
+    @mock.patch.object(hw, '_numa_fit_instance_cell')
+    def test_get_fitting_skips_too_small_cells(self, mock_fit):
+        instance = objects.InstanceNUMATopology(
+                cells=[
+                    objects.InstanceNUMACell(
+                        id=0, cpuset=set([1, 2, 3]), memory=1024)])
+        self.assertIsNone(hw.numa_fit_instance_to_host(self.host, instance))
+        self.assertFalse(mock_fit.called)
+
+
+class NUMAFitMultiSocketTestCase(test.NoDBTestCase):
+    """Fitting instances with pinned CPUs on hosts with many sockets."""
+
+    def _get_host(self, sockets, cores=12, threads=2, pinned_cores=0):
+        cells = []
+        for socket in range(sockets):
+            first = socket * cores * threads
+            siblings = [set(range(first + core * threads,
+                                  first + (core + 1) * threads))
+                        for core in range(cores)]
+            pinned = set()
+            for sibling in siblings[:pinned_cores]:
+                pinned |= sibling
+            cells.append(objects.NUMACell(
+                id=socket, cpuset=set(range(first, first + cores * threads)),
+                memory=65536, memory_usage=0, cpu_usage=0, mempages=[],
+                siblings=siblings, pinned_cpus=pinned))
+        return objects.NUMATopology(cells=cells)
+
+    def _get_instance(self, cells, vcpus_per_cell, memory_per_cell=4096):
+        return objects.InstanceNUMATopology(cells=[
+            objects.InstanceNUMACell(
+                id=cell,
+                cpuset=set(range(cell * vcpus_per_cell,
+                                 (cell + 1) * vcpus_per_cell)),
+                memory=memory_per_cell,
+                cpu_policy=fields.CPUAllocationPolicy.DEDICATED)
+            for cell in range(cells)])
+
+    def test_fit_on_last_sockets(self):
+        host = self._get_host(8)
+        for cell in host.cells[:6]:
+            cell.pin_cpus(set(list(cell.cpuset)[:20]))
+        instance = self._get_instance(2, 8)
+
+        fitted = hw.numa_fit_instance_to_host(host, instance)
+
+        self.assertEqual([6, 7], [cell.id for cell in fitted.cells])
+        for cell in fitted.cells:
+            self.assertEqual(8, len(cell.cpu_pinning))
+
+    def test_no_fit_is_found_quickly(self):
+        host = self._get_host(8)
+        instance = self._get_instance(8, 4)
+        # the last instance cell fits on no socket
+        instance.cells[-1].memory = 65537
+
+        with mock.patch.object(hw, '_numa_fit_instance_cell',
+                               wraps=hw._numa_fit_instance_cell) as mock_fit:
+            self.assertIsNone(hw.numa_fit_instance_to_host(host, instance))
+        self.assertFalse(mock_fit.called)
+
+    def test_no_fit_explores_each_cell_pair_once(self):
+        host = self._get_host(8, pinned_cores=10)
+        instance = self._get_instance(8, 4)
+        host.cells[-1].pin_cpus(set(list(host.cells[-1].free_cpus)[:2]))
+
+        with mock.patch.object(hw, '_numa_fit_instance_cell',
+                               wraps=hw._numa_fit_instance_cell) as mock_fit:
+            self.assertIsNone(hw.numa_fit_instance_to_host(host, instance))
+        self.assertTrue(mock_fit.call_count <= 8 * 8)
+
+    def test_performance_check_multi_socket(self):
+        hosts = [self._get_host(sockets, pinned_cores=pinned_cores)
+                 for sockets in (2, 4, 8)
+                 for pinned_cores in (0, 6, 10)]
+        instances = [self._get_instance(cells, vcpus)
+                     for cells in (1, 2, 4) for vcpus in (2, 4, 8)]
+
+        fits = []
+        a = timeutils.utcnow()
+        for host in hosts:
+            for instance in instances:
+                fits.append(hw.numa_fit_instance_to_host(
+                    host, instance, cell_fit_cache={}))
+        c = timeutils.utcnow() - a
+
+        per_fit_ms = c.total_seconds() * 1000.0 / (len(hosts) *
+                                                    len(instances))
+        # This is here so you can do simply performance testing easily.
+        self.assertTrue(per_fit_ms < 1000)
+
+        expected = [hw.numa_fit_instance_to_host(host, instance)
+                    for host in hosts for instance in instances]
+        self.assertEqual([fit and fit.obj_to_primitive()
+                          for fit in expected],
+                         [fit and fit.obj_to_primitive() for fit in fits])
+
 
 class NumberOfSerialPortsTest(test.NoDBTestCase):
     def test_flavor(self):
@@ -2600,3 +2758,14 @@ class CPURealtimeTestCase(test.NoDBTestCase):
         self.assertRaises(
             exception.RealtimeMaskNotFoundOrInvalid,
             hw.vcpus_realtime_topology, set([0, 1, 2]), flavor, image)
+
+
+if __name__ == '__main__':
+    # A handy tool to time the NUMA fitting of pinned instances
+    import testtools
+    suite = testtools.ConcurrentTestSuite()
+    test = "test_performance_check_multi_socket"
+    test_case = NUMAFitMultiSocketTestCase(test)
+    suite.addTest(test_case)
+    runner = testtools.TextTestResult.TextTestRunner()
+    runner.run(suite)
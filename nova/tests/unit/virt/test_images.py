@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import os
 
 import mock
@@ -66,3 +67,25 @@ class QemuTestCase(test.NoDBTestCase):
                                'Image href123 is unacceptable.*',
                                images.fetch_to_raw,
                                None, 'href123', '/no/path', None, None)
+
+    @mock.patch.object(images.IMAGE_API, 'download')
+    def test_fetch_digest(self, mock_download):
+        def fake_download(context, image_href, data=None, dest_path=None):
+            data.write('image')
+            data.write('data')
+
+        mock_download.side_effect = fake_download
+        digest = hashlib.md5()
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image')
+            images.fetch(None, 'href123', path, None, None, digest=digest)
+            with open(path) as f:
+                self.assertEqual('imagedata', f.read())
+        self.assertEqual(hashlib.md5('imagedata').hexdigest(),
+                         digest.hexdigest())
+
+    @mock.patch.object(images.IMAGE_API, 'download')
+    def test_fetch_without_digest(self, mock_download):
+        images.fetch(None, 'href123', '/no/path', None, None)
+        mock_download.assert_called_once_with(None, 'href123',
+                                              dest_path='/no/path')
@@ -180,6 +180,19 @@ class ComputeDriver(object):
         """
         return len(self.list_instances())
 
+    def get_power_states(self):
+        """Return the power state of all the instances, in one call.
+
+        Returns a dict of instance uuid to nova.compute.power_state value,
+        for the instances the hypervisor knows about. Instances missing from
+        the hypervisor are left out.
+
+        Used by the compute manager to sync the power states of all the
+        instances of the host without asking for them one by one; drivers
+        not implementing it are queried with get_info() per instance.
+        """
+        raise NotImplementedError()
+
     def instance_exists(self, instance):
         """Checks existence of an instance on the host.
 
@@ -1316,6 +1329,18 @@ class ComputeDriver(object):
         """
         pass
 
+    def prefetch_images(self, context, image_ids):
+        """Download images to the driver's local image cache.
+
+        Lets operators fill the cache of the hosts ahead of booting many
+        instances from new images. Returns once all the images are cached;
+        the images which can't be downloaded are logged and skipped.
+
+        :param context: security context, used to download the images
+        :param image_ids: list of image ids
+        """
+        raise NotImplementedError()
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate.
 
@@ -1192,9 +1192,69 @@ def numa_get_constraints(flavor, image_meta):
     return _add_cpu_pinning_constraint(flavor, image_meta, numa_topology)
 
 
+def _numa_cell_attr(cell, name, default):
+    """Return the field name of cell, or default if it isn't set."""
+    if cell.obj_attr_is_set(name):
+        return getattr(cell, name)
+    return default
+
+
+def _numa_host_cell_key(host_cell, limit_cell):
+    """Key of the fitting results of the instance cells on a host cell.
+
+    Host cells with the same key accept the same instance cells, in the same
+    way, so their results can be shared between hosts. The fields the
+    fitting only reads when limits, pinning or page sizes need them may be
+    unset.
+    """
+    return (host_cell.id, host_cell.memory,
+            _numa_cell_attr(host_cell, 'memory_usage', 0),
+            _numa_cell_attr(host_cell, 'cpu_usage', 0),
+            frozenset(host_cell.cpuset),
+            frozenset(_numa_cell_attr(host_cell, 'pinned_cpus', ())),
+            tuple(frozenset(sibling)
+                  for sibling in _numa_cell_attr(host_cell, 'siblings', ())),
+            tuple((page.size_kb, page.total,
+                   _numa_cell_attr(page, 'used', 0))
+                  for page in _numa_cell_attr(host_cell, 'mempages', ())),
+            limit_cell and (limit_cell.cpu_allocation_ratio,
+                            limit_cell.ram_allocation_ratio))
+
+
+def _numa_instance_cell_key(instance_cell):
+    """Key of the fitting results of an instance cell on a host cell.
+
+    Instance cells with the same key are fitted the same way, so their
+    results can be shared between instance topologies. The id, set to the
+    one of the host cell by the fitting, may be unset.
+    """
+    topology = instance_cell.cpu_topology
+    return (_numa_cell_attr(instance_cell, 'id', None),
+            frozenset(instance_cell.cpuset),
+            instance_cell.memory, instance_cell.pagesize,
+            instance_cell.cpu_policy, instance_cell.cpu_thread_policy,
+            topology and (topology.sockets, topology.cores,
+                          topology.threads))
+
+
+def _numa_cell_candidates(host_cells, instance_cell):
+    """Return the bitmask of the host cells large enough for instance_cell.
+
+    This is the check against overcommitting an instance against itself done
+    first by _numa_fit_instance_cell(), which only needs integers.
+    """
+    candidates = 0
+    instance_cpus = len(instance_cell.cpuset)
+    for index, host_cell in enumerate(host_cells):
+        if (instance_cell.memory <= host_cell.memory and
+                instance_cpus <= len(host_cell.cpuset)):
+            candidates |= 1 << index
+    return candidates
+
+
 def numa_fit_instance_to_host(
         host_topology, instance_topology, limits=None,
-        pci_requests=None, pci_stats=None):
+        pci_requests=None, pci_stats=None, cell_fit_cache=None):
     """Fit the instance topology onto the host topology given the limits
 
     :param host_topology: objects.NUMATopology object to fit an instance on
@@ -1202,12 +1262,21 @@ def numa_fit_instance_to_host(
     :param limits: objects.NUMATopologyLimits that defines limits
     :param pci_requests: instance pci_requests
     :param pci_stats: pci_stats for the host
+    :param cell_fit_cache: optional dict keeping the results of fitting
+                           instance cells on host cells, to share between
+                           calls, e.g. for the hosts of one request
 
     Given a host and instance topology and optionally limits - this method
     will attempt to fit instance cells onto all permutations of host cells
     by calling the _numa_fit_instance_cell method, and return a new
     InstanceNUMATopology with it's cell ids set to host cell id's of
     the first successful permutation, or None.
+
+    The permutations are walked depth first, in the order of
+    itertools.permutations(), skipping all the permutations starting with a
+    host cell an instance cell doesn't fit on, and each instance cell is
+    fitted at most once on each host cell, on a copy. instance_topology
+    isn't modified.
     """
     if not (host_topology and instance_topology):
         LOG.debug("Require both a host and instance NUMA topology to "
@@ -1220,32 +1289,78 @@ def numa_fit_instance_to_host(
                   {'required': len(instance_topology),
                    'actual': len(host_topology)})
         return
-    else:
-        # TODO(ndipanov): We may want to sort permutations differently
-        # depending on whether we want packing/spreading over NUMA nodes
-        for host_cell_perm in itertools.permutations(
-                host_topology.cells, len(instance_topology)):
-            cells = []
-            for host_cell, instance_cell in zip(
-                    host_cell_perm, instance_topology.cells):
-                try:
-                    got_cell = _numa_fit_instance_cell(
-                        host_cell, instance_cell, limits)
-                except exception.MemoryPageSizeNotSupported:
-                    # This exception will been raised if instance cell's
-                    # custom pagesize is not supported with host cell in
-                    # _numa_cell_supports_pagesize_request function.
-                    break
-                if got_cell is None:
-                    break
-                cells.append(got_cell)
-            if len(cells) == len(host_cell_perm):
-                if not pci_requests:
-                    return objects.InstanceNUMATopology(cells=cells)
-                elif ((pci_stats is not None) and
-                    pci_stats.support_requests(pci_requests,
-                                                     cells)):
-                    return objects.InstanceNUMATopology(cells=cells)
+
+    host_cells = host_topology.cells
+    instance_cells = instance_topology.cells
+    # Bitmasks of the host cells each instance cell may fit on
+    candidates = [_numa_cell_candidates(host_cells, instance_cell)
+                  for instance_cell in instance_cells]
+    all_candidates = 0
+    for cell_candidates in candidates:
+        all_candidates |= cell_candidates
+    if not all(candidates) or (bin(all_candidates).count('1') <
+                               len(instance_cells)):
+        return
+
+    shared_cache = cell_fit_cache is not None
+    if not shared_cache:
+        cell_fit_cache = {}
+    host_cell_keys = {}
+    instance_cell_keys = [_numa_instance_cell_key(instance_cell)
+                          for instance_cell in instance_cells]
+
+    def _fit_cell(host_index, instance_index):
+        host_cell = host_cells[host_index]
+        if host_index not in host_cell_keys:
+            host_cell_keys[host_index] = _numa_host_cell_key(host_cell,
+                                                             limits)
+        key = (host_cell_keys[host_index], instance_cell_keys[instance_index])
+        if key not in cell_fit_cache:
+            instance_cell = instance_cells[instance_index].obj_clone()
+            try:
+                cell_fit_cache[key] = _numa_fit_instance_cell(
+                    host_cell, instance_cell, limits)
+            except exception.MemoryPageSizeNotSupported:
+                # This exception will been raised if instance cell's
+                # custom pagesize is not supported with host cell in
+                # _numa_cell_supports_pagesize_request function.
+                cell_fit_cache[key] = None
+        return cell_fit_cache[key]
+
+    # (instance cell index, bitmask of the host cells used) from which the
+    # instance cells left can't all be fitted
+    dead_ends = set()
+
+    def _fit_cells(instance_index, used):
+        if instance_index == len(instance_cells):
+            yield []
+            return
+        if (instance_index, used) in dead_ends:
+            return
+        found = False
+        free = candidates[instance_index] & ~used
+        for host_index in range(len(host_cells)):
+            if not free & (1 << host_index):
+                continue
+            got_cell = _fit_cell(host_index, instance_index)
+            if got_cell is None:
+                continue
+            for cells in _fit_cells(instance_index + 1,
+                                    used | (1 << host_index)):
+                found = True
+                yield [got_cell] + cells
+        if not found:
+            dead_ends.add((instance_index, used))
+
+    # TODO(ndipanov): We may want to sort permutations differently
+    # depending on whether we want packing/spreading over NUMA nodes
+    for cells in _fit_cells(0, 0):
+        if not pci_requests or ((pci_stats is not None) and
+                pci_stats.support_requests(pci_requests, cells)):
+            if shared_cache:
+                # The cells in the cache may be returned for other hosts too
+                cells = [cell.obj_clone() for cell in cells]
+            return objects.InstanceNUMATopology(cells=cells)
 
 
 def _numa_pagesize_usage_from_cell(hostcell, instancecell, sign):
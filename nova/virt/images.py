@@ -105,19 +105,43 @@ def _convert_image(source, dest, in_format, out_format, run_as_root):
         raise exception.ImageUnacceptable(image_id=source, reason=msg)
 
 
-def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
+class _DigestFile(object):
+    """File updating a hashlib object with the data written to it."""
+
+    def __init__(self, f, digest):
+        self._file = f
+        self._digest = digest
+
+    def write(self, data):
+        self._digest.update(data)
+        self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def fetch(context, image_href, path, _user_id, _project_id, max_size=0,
+          digest=None):
     with fileutils.remove_path_on_error(path):
-        IMAGE_API.download(context, image_href, dest_path=path)
+        if digest is None:
+            IMAGE_API.download(context, image_href, dest_path=path)
+            return
+        # NOTE: the image data is hashed as it is streamed from the image
+        # service, the allowed_direct_url_schemes transfers aren't used.
+        with open(path, 'wb') as f:
+            IMAGE_API.download(context, image_href,
+                               data=_DigestFile(f, digest))
 
 
 def get_info(context, image_href):
     return IMAGE_API.get(context, image_href)
 
 
-def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
+def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0,
+                 digest=None):
     path_tmp = "%s.part" % path
     fetch(context, image_href, path_tmp, user_id, project_id,
-          max_size=max_size)
+          max_size=max_size, digest=digest)
 
     with fileutils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
@@ -873,6 +873,11 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return uuids
 
+    def get_power_states(self):
+        return {uuid: libvirt_guest.LIBVIRT_POWER_STATE.get(
+                    state, power_state.NOSTATE)
+                for uuid, state in self._host.list_domain_states().items()}
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
@@ -3177,15 +3182,17 @@ class LibvirtDriver(driver.ComputeDriver):
             backend = image('disk')
             if instance.task_state == task_states.RESIZE_FINISH:
                 backend.create_snap(libvirt_utils.RESIZE_SNAPSHOT_NAME)
+            fetch_image = imagecache.deduplicate_fetch(
+                libvirt_utils.fetch_image)
             if backend.SUPPORTS_CLONE:
                 def clone_fallback_to_fetch(*args, **kwargs):
                     try:
                         backend.clone(context, disk_images['image_id'])
                     except exception.ImageUnacceptable:
-                        libvirt_utils.fetch_image(*args, **kwargs)
+                        fetch_image(*args, **kwargs)
                 fetch_func = clone_fallback_to_fetch
             else:
-                fetch_func = libvirt_utils.fetch_image
+                fetch_func = fetch_image
             self._try_fetch_image_cache(backend, fetch_func, context,
                                         root_fname, disk_images['image_id'],
                                         instance, size, fallback_from_host)
@@ -6829,8 +6836,9 @@ class LibvirtDriver(driver.ComputeDriver):
                                 size=swap_mb * units.Mi,
                                 swap_mb=swap_mb)
                 else:
-                    self._try_fetch_image_cache(image,
-                                                libvirt_utils.fetch_image,
+                    fetch_func = imagecache.deduplicate_fetch(
+                        libvirt_utils.fetch_image)
+                    self._try_fetch_image_cache(image, fetch_func,
                                                 context, cache_name,
                                                 instance.image_ref,
                                                 instance,
@@ -7114,6 +7122,9 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.update(context, all_instances)
 
+    def prefetch_images(self, context, image_ids):
+        self.image_cache_manager.prefetch_images(context, image_ids)
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize,
                                   shared_storage=False):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
@@ -54,6 +54,7 @@ from nova.i18n import _LW
 from nova import rpc
 from nova import utils
 from nova.virt import event as virtevent
+from nova.virt.libvirt import compat
 from nova.virt.libvirt import config as vconfig
 from nova.virt.libvirt import guest as libvirt_guest
 
@@ -206,6 +207,7 @@ class Host(object):
         self._conn_event_handler = conn_event_handler
         self._lifecycle_event_handler = lifecycle_event_handler
         self._skip_list_all_domains = False
+        self._skip_get_all_domain_stats = False
         self._caps = None
         self._hostname = None
 
@@ -745,6 +747,43 @@ class Host(object):
 
         return doms
 
+    def list_domain_states(self, only_guests=True):
+        """Get the state of all the domains, running or not
+
+        :param only_guests: True to filter out any host domain (eg Dom-0)
+
+        The states are read with a single getAllDomainStats call where
+        libvirt supports it, instead of a virDomain.info call per domain.
+
+        :returns: dict of domain UUID to libvirt VIR_DOMAIN_* state
+        """
+
+        if not self._skip_get_all_domain_stats:
+            try:
+                stats = self.get_connection().getAllDomainStats(
+                    libvirt.VIR_DOMAIN_STATS_STATE)
+            except (libvirt.libvirtError, AttributeError) as ex:
+                LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                             "falling back to slow code path: %(ex)s"),
+                         {'ex': ex})
+                self._skip_get_all_domain_stats = True
+            else:
+                return {dom.UUIDString(): record['state.state']
+                        for dom, record in stats
+                        if not (only_guests and dom.ID() == 0)}
+
+        states = {}
+        for dom in self.list_instance_domains(only_running=False,
+                                              only_guests=only_guests):
+            try:
+                states[dom.UUIDString()] = compat.get_domain_info(
+                    libvirt, self, dom)[0]
+            except libvirt.libvirtError as ex:
+                # The domain went away since it was listed
+                if ex.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+                    raise
+        return states
+
     def get_online_cpus(self):
         """Get the set of CPUs that are online on the host
 
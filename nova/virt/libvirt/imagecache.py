@@ -20,23 +20,27 @@ http://wiki.openstack.org/nova-image-cache-management.
 
 """
 
+import errno
 import hashlib
 import os
 import re
 import time
 
+import eventlet
 from oslo_concurrency import lockutils
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import fileutils
+from oslo_utils import units
 
 from nova.i18n import _LE
 from nova.i18n import _LI
 from nova.i18n import _LW
 from nova import utils
 from nova.virt import imagecache
+from nova.virt import images
 from nova.virt.libvirt import utils as libvirt_utils
 
 LOG = logging.getLogger(__name__)
@@ -65,6 +69,28 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_bytes_per_pass',
+               default=0,
+               min=0,
+               help='Maximum number of bytes of a base image verified by '
+                    'each image cache manager pass. The next passes verify '
+                    'the following parts of the image until all of it was, '
+                    'which restarts checksum_interval_seconds. 0 verifies '
+                    'whole images in one pass'),
+    cfg.BoolOpt('image_cache_deduplicate',
+                default=False,
+                help='Share the base files of images with the same content, '
+                     'as told by their checksum in the image service, '
+                     'instead of downloading each of them. This costs an '
+                     'image service request for each image not in the '
+                     'cache. Downloaded images are only shared if their '
+                     'data has that checksum, and are streamed from the '
+                     'image service to hash them'),
+    cfg.IntOpt('image_prefetch_workers',
+               default=4,
+               min=1,
+               help='Number of images downloaded at once when images are '
+                    'prefetched to the cache'),
     ]
 
 CONF = cfg.CONF
@@ -72,6 +98,14 @@ CONF.register_opts(imagecache_opts, 'libvirt')
 CONF.import_opt('instances_path', 'nova.compute.manager')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
 
+# Base images are checksummed by blocks as well, for the verification
+# passes limited by checksum_bytes_per_pass
+CHECKSUM_BLOCK_SIZE = 64 * units.Mi
+
+# The subdirectory of _base with a hard link to the base file of each image
+# content checksum
+CONTENT_SUBDIRECTORY_NAME = 'content'
+
 
 def get_cache_fname(images, key):
     """Return a filename based on the SHA1 hash of a given image ID.
@@ -212,12 +246,42 @@ def write_stored_info(target, field=None, value=None):
     write_file(info_file, field, value)
 
 
-def _hash_file(filename):
-    """Generate a hash for the contents of a file."""
+def _hash_file_blocks(filename):
+    """Generate a hash for the contents of a file and for each of its
+    CHECKSUM_BLOCK_SIZE blocks, in a single read of the file.
+    """
     checksum = hashlib.sha1()
+    block_checksums = []
     with open(filename) as f:
-        for chunk in iter(lambda: f.read(32768), b''):
-            checksum.update(chunk)
+        while True:
+            block_checksum = hashlib.sha1()
+            remaining = CHECKSUM_BLOCK_SIZE
+            while remaining:
+                chunk = f.read(min(32768, remaining))
+                if not chunk:
+                    break
+                checksum.update(chunk)
+                block_checksum.update(chunk)
+                remaining -= len(chunk)
+            if remaining == CHECKSUM_BLOCK_SIZE:
+                break
+            block_checksums.append(block_checksum.hexdigest())
+            if remaining:
+                break
+    return checksum.hexdigest(), block_checksums
+
+
+def _hash_file_block(f, index):
+    """Generate a hash for one CHECKSUM_BLOCK_SIZE block of an open file."""
+    checksum = hashlib.sha1()
+    f.seek(index * CHECKSUM_BLOCK_SIZE)
+    remaining = CHECKSUM_BLOCK_SIZE
+    while remaining:
+        chunk = f.read(min(32768, remaining))
+        if not chunk:
+            break
+        checksum.update(chunk)
+        remaining -= len(chunk)
     return checksum.hexdigest()
 
 
@@ -231,7 +295,71 @@ def read_stored_checksum(target, timestamped=True):
 
 def write_stored_checksum(target):
     """Write a checksum to disk for a file in _base."""
-    write_stored_info(target, field='sha1', value=_hash_file(target))
+    checksum, block_checksums = _hash_file_blocks(target)
+    write_stored_info(target, field='sha1-blocks', value=block_checksums)
+    write_stored_info(target, field='sha1', value=checksum)
+
+
+def _get_content_file(base_dir, checksum):
+    return os.path.join(base_dir, CONTENT_SUBDIRECTORY_NAME, checksum)
+
+
+def deduplicate_fetch(fetch_func):
+    """Make a function fetching images to _base share the base files of
+    identical images.
+
+    With image_cache_deduplicate, the base files are hard linked under the
+    content subdirectory of _base with the checksum of their image data in
+    the image service, and an image whose checksum is already there is
+    linked to instead of being fetched again. The checksum is set by whoever
+    uploaded the image, so the md5 of the data is computed while it is
+    downloaded, and only the base files of the images whose data has their
+    checksum are linked there. fetch_func takes the arguments of
+    libvirt_utils.fetch_image(), and is returned as is without
+    image_cache_deduplicate.
+    """
+    if not CONF.libvirt.image_cache_deduplicate:
+        return fetch_func
+
+    def fetch_image(context, target, image_id, user_id, project_id,
+                    max_size=0):
+        checksum = images.get_info(context, image_id).get('checksum')
+        if not checksum:
+            fetch_func(context=context, target=target, image_id=image_id,
+                       user_id=user_id, project_id=project_id,
+                       max_size=max_size)
+            return
+
+        content_file = _get_content_file(os.path.dirname(target), checksum)
+        try:
+            os.link(content_file, target)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            LOG.info(_LI('Image %(id)s has the content of %(file)s, '
+                         'not downloading it'),
+                     {'id': image_id, 'file': content_file})
+            return
+
+        digest = hashlib.md5()
+        fetch_func(context=context, target=target, image_id=image_id,
+                   user_id=user_id, project_id=project_id,
+                   max_size=max_size, digest=digest)
+        if digest.hexdigest() != checksum:
+            LOG.warning(_LW('The data of image %(id)s does not have the '
+                            'checksum %(checksum)s, not sharing it'),
+                        {'id': image_id, 'checksum': checksum})
+            return
+        fileutils.ensure_tree(os.path.dirname(content_file))
+        try:
+            os.link(target, content_file)
+        except OSError as e:
+            # An image with the same content was fetched meanwhile
+            if e.errno != errno.EEXIST:
+                raise
+
+    return fetch_image
 
 
 class ImageCacheManager(imagecache.ImageCacheManager):
@@ -399,7 +527,14 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
-                current_checksum = _hash_file(base_file)
+                if CONF.libvirt.checksum_bytes_per_pass:
+                    result = self._verify_checksum_blocks(img_id, base_file,
+                                                          stored_checksum)
+                    if result is not None:
+                        return result
+
+                current_checksum, block_checksums = _hash_file_blocks(
+                    base_file)
 
                 if current_checksum != stored_checksum:
                     LOG.error(_LE('image %(id)s at (%(base_file)s): image '
@@ -409,6 +544,10 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     return False
 
                 else:
+                    if CONF.libvirt.checksum_bytes_per_pass:
+                        # The next verifications can be done by blocks
+                        write_stored_info(base_file, field='sha1-blocks',
+                                          value=block_checksums)
                     return True
 
             else:
@@ -431,6 +570,56 @@ class ImageCacheManager(imagecache.ImageCacheManager):
 
         return inner_verify_checksum()
 
+    def _verify_checksum_blocks(self, img_id, base_file, stored_checksum):
+        """Compare the next checksum_bytes_per_pass bytes of a base file with
+        the block checksums stored on disk.
+
+        Each call continues where the previous one stopped; once the whole
+        file was verified the timestamp of the stored checksum is renewed.
+        Returns None if there are no block checksums stored.
+        """
+        block_checksums = read_stored_info(base_file, field='sha1-blocks')
+        if not isinstance(block_checksums, list):
+            return None
+
+        num_blocks = ((os.path.getsize(base_file) + CHECKSUM_BLOCK_SIZE - 1) //
+                      CHECKSUM_BLOCK_SIZE)
+        if num_blocks != len(block_checksums):
+            LOG.error(_LE('image %(id)s at (%(base_file)s): image '
+                          'verification failed'),
+                      {'id': img_id,
+                       'base_file': base_file})
+            return False
+
+        start = read_stored_info(base_file, field='sha1-cursor') or 0
+        if start >= num_blocks:
+            start = 0
+        end = min(num_blocks, start + max(
+            1, CONF.libvirt.checksum_bytes_per_pass // CHECKSUM_BLOCK_SIZE))
+
+        with open(base_file) as f:
+            for index in range(start, end):
+                if _hash_file_block(f, index) != block_checksums[index]:
+                    LOG.error(_LE('image %(id)s at (%(base_file)s): image '
+                                  'verification failed'),
+                              {'id': img_id,
+                               'base_file': base_file})
+                    return False
+
+                # Give other threads a chance to run
+                time.sleep(0)
+
+        LOG.debug('image %(id)s at (%(base_file)s): verified blocks '
+                  '%(start)d to %(end)d of %(num_blocks)d',
+                  {'id': img_id, 'base_file': base_file, 'start': start,
+                   'end': end, 'num_blocks': num_blocks})
+        if end < num_blocks:
+            write_stored_info(base_file, field='sha1-cursor', value=end)
+        else:
+            write_stored_info(base_file, field='sha1-cursor', value=0)
+            write_stored_info(base_file, field='sha1', value=stored_checksum)
+        return True
+
     @staticmethod
     def _get_age_of_file(base_file):
         if not os.path.exists(base_file):
@@ -673,3 +862,65 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         # perform the aging and image verification
         self._age_and_verify_cached_images(context, all_instances, base_dir)
         self._age_and_verify_swap_images(context, base_dir)
+        if self.remove_unused_base_images:
+            self._remove_unused_content_files(base_dir)
+
+    def _remove_unused_content_files(self, base_dir):
+        """Remove the content links of the base files removed."""
+        content_dir = os.path.join(base_dir, CONTENT_SUBDIRECTORY_NAME)
+        if not os.path.isdir(content_dir):
+            return
+
+        for ent in os.listdir(content_dir):
+            content_file = os.path.join(content_dir, ent)
+            try:
+                # NOTE: the base files are other links to the same file. A
+                # base file linked to it meanwhile keeps the data anyway.
+                if os.stat(content_file).st_nlink > 1:
+                    continue
+                LOG.info(_LI('Removing content file: %s'), content_file)
+                os.remove(content_file)
+            except OSError as e:
+                LOG.error(_LE('Failed to remove %(content_file)s, '
+                              'error was %(error)s'),
+                          {'content_file': content_file,
+                           'error': e})
+
+    def prefetch_images(self, context, image_ids):
+        """Download images to _base ahead of their use.
+
+        Up to image_prefetch_workers images are downloaded at once, under
+        the same locks as when instances fetch them, so that the instances
+        booting from an image being prefetched wait for that download
+        instead of starting another one. The images already cached are
+        touched instead; like the other unused images, prefetched images
+        are removed once older than remove_unused_original_minimum_age_seconds.
+        """
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        fileutils.ensure_tree(base_dir)
+        pool = eventlet.GreenPool(CONF.libvirt.image_prefetch_workers)
+        for image_id in image_ids:
+            pool.spawn_n(self._prefetch_image, context, base_dir, image_id)
+        pool.waitall()
+
+    def _prefetch_image(self, context, base_dir, image_id):
+        filename = get_cache_fname({'image_id': image_id}, 'image_id')
+        target = os.path.join(base_dir, filename)
+
+        @utils.synchronized(filename, external=True, lock_path=self.lock_path)
+        def _inner_prefetch_image():
+            if os.path.exists(target):
+                libvirt_utils.update_mtime(target)
+                return
+            LOG.info(_LI('Prefetching image %(id)s to %(target)s'),
+                     {'id': image_id, 'target': target})
+            fetch_func = deduplicate_fetch(libvirt_utils.fetch_image)
+            fetch_func(context=context, target=target, image_id=image_id,
+                       user_id=context.user_id,
+                       project_id=context.project_id)
+
+        try:
+            _inner_prefetch_image()
+        except Exception:
+            LOG.exception(_LE('Failed to prefetch image %s'), image_id)
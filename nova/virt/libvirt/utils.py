@@ -423,10 +423,13 @@ def get_fs_info(path):
             'used': used}
 
 
-def fetch_image(context, target, image_id, user_id, project_id, max_size=0):
-    """Grab image."""
+def fetch_image(context, target, image_id, user_id, project_id, max_size=0,
+                digest=None):
+    """Grab image, updating the hashlib object digest with its data if
+    given.
+    """
     images.fetch_to_raw(context, image_id, target, user_id, project_id,
-                        max_size=max_size)
+                        max_size=max_size, digest=digest)
 
 
 def fetch_raw_image(context, target, image_id, user_id, project_id,
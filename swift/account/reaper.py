@@ -15,7 +15,9 @@
 
 import os
 import random
+import signal
 import socket
+import sys
 from swift import gettext_ as _
 from logging import DEBUG
 from math import sqrt
@@ -23,7 +25,7 @@ from time import time
 from hashlib import md5
 import itertools
 
-from eventlet import GreenPool, sleep, Timeout
+from eventlet import GreenPool, sleep, Timeout, patcher
 import six
 
 import swift.common.db
@@ -34,7 +36,8 @@ from swift.common.exceptions import ClientException
 from swift.common.ring import Ring
 from swift.common.ring.utils import is_local_device
 from swift.common.utils import get_logger, whataremyips, ismount, \
-    config_true_value, Timestamp
+    config_true_value, Timestamp, dump_recon_cache, load_checkpoint, \
+    dump_checkpoint
 from swift.common.daemon import Daemon
 from swift.common.storage_policy import POLICIES, PolicyError
 
@@ -56,6 +59,11 @@ class AccountReaper(Daemon):
     :param reaper_conf: The [account-reaper] dictionary of the account server
                         configuration file
 
+    With ``processes`` set to more than one, each pass forks that many
+    workers and every account partition is reaped by exactly one of them.
+    While reaping an account a worker saves the container listing marker it
+    reached, so a restarted reaper continues the account where it stopped.
+
     See the etc/account-server.conf-sample for information on the possible
     configuration parameters.
     """
@@ -84,6 +92,13 @@ class AccountReaper(Daemon):
         reap_warn_after = float(conf.get('reap_warn_after') or 86400 * 30)
         self.reap_not_done_after = reap_warn_after + self.delay_reaping
         self.start_time = time()
+        self.processes = int(conf.get('processes', 0))
+        self.process = 0
+        self.recon_cache_path = conf.get('recon_cache_path',
+                                         '/var/cache/swift')
+        self.rcache = os.path.join(self.recon_cache_path, 'account.recon')
+        self.checkpoint = {}
+        self.reset_pass_stats()
 
     def get_account_ring(self):
         """The account :class:`swift.common.ring.Ring` for the cluster."""
@@ -130,6 +145,43 @@ class AccountReaper(Daemon):
         """
         self.logger.debug('Begin devices pass: %s', self.devices)
         begin = time()
+        if self.processes > 1:
+            pids = []
+            for process in range(self.processes):
+                pid = os.fork()
+                if pid:
+                    pids.append(pid)
+                else:
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    patcher.monkey_patch(all=False, socket=True, thread=True)
+                    self.reap_devices(process)
+                    sys.exit()
+            for pid in pids:
+                os.waitpid(pid, 0)
+        else:
+            self.reap_devices()
+        elapsed = time() - begin
+        self.logger.info(_('Devices pass completed: %.02fs'), elapsed)
+        dump_recon_cache({'account_reaper_pass': elapsed}, self.rcache,
+                         self.logger)
+
+    def _checkpoint_file(self, process):
+        return os.path.join(self.recon_cache_path,
+                            'account-reaper-%d.checkpoint' % process)
+
+    def reap_devices(self, process=0):
+        """
+        Reap every device on the server for one worker process and report
+        the throughput of the pass to recon.
+
+        :param process: the index of the worker process; only the account
+                        partitions belonging to it are reaped
+        """
+        begin = time()
+        self.process = process
+        self.reset_pass_stats()
+        self.checkpoint = load_checkpoint(self._checkpoint_file(process),
+                                          self.logger)
         try:
             for device in os.listdir(self.devices):
                 if self.mount_check and not ismount(
@@ -143,7 +195,15 @@ class AccountReaper(Daemon):
             self.logger.exception(_("Exception in top-level account reaper "
                                     "loop"))
         elapsed = time() - begin
-        self.logger.info(_('Devices pass completed: %.02fs'), elapsed)
+        objects = self.pass_stats['objects_deleted']
+        stats = dict(self.pass_stats)
+        stats.update({
+            'elapsed': elapsed,
+            'objects_per_second': objects / elapsed if elapsed else 0.0,
+            'time': time(),
+        })
+        dump_recon_cache({'account_reaper_stats': {str(process): stats}},
+                         self.rcache, self.logger)
 
     def reap_device(self, device):
         """
@@ -165,6 +225,9 @@ class AccountReaper(Daemon):
             partition_path = os.path.join(datadir, partition)
             if not partition.isdigit():
                 continue
+            if self.processes > 1 and \
+                    int(partition) % self.processes != self.process:
+                continue
             nodes = self.get_account_ring().get_part_nodes(int(partition))
             if not os.path.isdir(partition_path):
                 continue
@@ -206,6 +269,14 @@ class AccountReaper(Daemon):
         self.stats_containers_possibly_remaining = 0
         self.stats_objects_possibly_remaining = 0
 
+    def reset_pass_stats(self):
+        self.pass_stats = {'accounts': 0, 'containers_deleted': 0,
+                           'objects_deleted': 0}
+
+    def _save_checkpoint(self):
+        dump_checkpoint(self.checkpoint, self._checkpoint_file(self.process),
+                        self.logger)
+
     def reap_account(self, broker, partition, nodes, container_shard=None):
         """
         Called once per pass for each account this server is the primary for
@@ -257,7 +328,10 @@ class AccountReaper(Daemon):
         if container_shard is not None:
             container_limit *= len(nodes)
         try:
-            marker = ''
+            marker = self.checkpoint.get(account, '').encode('utf8')
+            if marker:
+                self.logger.info(_('Resuming account %s after container %s'),
+                                 account, marker)
             while True:
                 containers = \
                     list(broker.list_containers_iter(container_limit, marker,
@@ -280,6 +354,10 @@ class AccountReaper(Daemon):
                 marker = containers[-1][0]
                 if marker == '':
                     break
+                self.checkpoint[account] = marker
+                self._save_checkpoint()
+            if self.checkpoint.pop(account, None) is not None:
+                self._save_checkpoint()
             log = 'Completed pass on account %s' % account
         except (Exception, Timeout):
             self.logger.exception(
@@ -307,6 +385,9 @@ class AccountReaper(Daemon):
             log = log[:-2]
         log += _(', elapsed: %.02fs') % (time() - begin)
         self.logger.info(log)
+        self.pass_stats['accounts'] += 1
+        self.pass_stats['containers_deleted'] += self.stats_containers_deleted
+        self.pass_stats['objects_deleted'] += self.stats_objects_deleted
         self.logger.timing_since('timing', self.start_time)
         delete_timestamp = Timestamp(info['delete_timestamp'])
         if self.stats_containers_remaining and \
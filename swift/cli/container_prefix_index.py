@@ -0,0 +1,73 @@
+# Copyright (c) 2016 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Build (or drop) the object_prefix index of existing container databases.
+
+Containers created by a container server with ``create_prefix_index = true``
+get the index from the start and keep it up to date as objects are merged.
+Databases created before that can be indexed offline with::
+
+    python -m swift.cli.container_prefix_index /srv/node/sdb1/containers/...
+
+Once a database has the index, '/' delimited listings use it. Running the
+command again rebuilds the index from the object table; ``--drop`` removes
+it.
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+from swift.common.db import DatabaseConnectionError
+from swift.common.exceptions import LockTimeout
+from swift.container.backend import ContainerBroker
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Build the object_prefix index of container databases')
+ARG_PARSER.add_argument(
+    'db_files', nargs='+', metavar='db_file',
+    help="Path to a container database")
+ARG_PARSER.add_argument(
+    '--drop', action='store_true', default=False,
+    help="Remove the index instead of building it")
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    failed = 0
+    for db_file in args.db_files:
+        broker = ContainerBroker(db_file)
+        started = time.time()
+        try:
+            if args.drop:
+                broker.drop_prefix_index()
+                print('%s: dropped index' % db_file)
+                continue
+            prefixes = broker.build_prefix_index()
+        except (DatabaseConnectionError, LockTimeout) as err:
+            sys.stderr.write('%s: %s\n' % (db_file, err))
+            failed += 1
+            continue
+        print('%s: indexed %d prefixes in %.2fs' % (
+            db_file, prefixes, time.time() - started))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# Copyright (c) 2016 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Time container DB replication between two local brokers.
+
+A source container DB is filled with synthetic object rows and then
+replicated into an empty target DB the way the replicator's usync does it:
+get_items_since() batches merged with merge_items(). A second pass merges
+the same rows again, which is what a re-sync after a lost sync point costs.
+Each batch size is reported separately, so the chunked IN query path
+(batches of up to 999 rows) can be compared with the staged temp table path
+used for larger batches. It is meant for developers, e.g.::
+
+    python -m swift.cli.db_replication_benchmark --rows 10000000 \\
+        --batch-sizes 1000,10000,50000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+from swift.common.utils import Timestamp
+from swift.container.backend import ContainerBroker
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Time merge_items replication between two container DBs')
+ARG_PARSER.add_argument(
+    '--rows', type=int, default=1000000,
+    help="Number of object rows in the source container")
+ARG_PARSER.add_argument(
+    '--batch-sizes', default='1000,10000,50000',
+    help="Comma separated merge_items batch sizes to time")
+ARG_PARSER.add_argument(
+    '--tmpdir', default=None,
+    help="Directory to create the container DBs in")
+
+
+def make_broker(path, account='a', container='c'):
+    broker = ContainerBroker(path, account=account, container=container)
+    broker.initialize(Timestamp(time.time()).internal, 0)
+    return broker
+
+
+def fill_broker(broker, rows, batch_size=50000):
+    timestamp = Timestamp(time.time()).internal
+    for start in range(0, rows, batch_size):
+        broker.merge_items([{
+            'name': 'o-%010d' % i, 'created_at': timestamp, 'size': i,
+            'content_type': 'application/octet-stream',
+            'etag': 'd41d8cd98f00b204e9800998ecf8427e', 'deleted': 0,
+            'storage_policy_index': 0,
+        } for i in range(start, min(start + batch_size, rows))])
+
+
+def replicate(source, target, batch_size):
+    """
+    Merge every row of source into target and return the seconds taken.
+    """
+    remote_id = str(uuid4())
+    point = -1
+    started = time.time()
+    objects = source.get_items_since(point, batch_size)
+    while objects:
+        target.merge_items(objects, remote_id)
+        point = objects[-1]['ROWID']
+        objects = source.get_items_since(point, batch_size)
+    return time.time() - started
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    try:
+        batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    except ValueError:
+        sys.stderr.write("Invalid --batch-sizes %r\n" % args.batch_sizes)
+        return 1
+    workdir = tempfile.mkdtemp(dir=args.tmpdir)
+    try:
+        source = make_broker(os.path.join(workdir, 'source.db'))
+        started = time.time()
+        fill_broker(source, args.rows)
+        print('Filled source with %d rows in %.1fs' % (
+            args.rows, time.time() - started))
+        print('%10s %12s %10s %12s %10s' % (
+            'batch', 'initial(s)', 'rows/s', 'resync(s)', 'rows/s'))
+        for batch_size in batch_sizes:
+            target_path = os.path.join(workdir, 'target-%d.db' % batch_size)
+            target = make_broker(target_path)
+            initial = replicate(source, target, batch_size)
+            resync = replicate(source, target, batch_size)
+            print('%10d %12.1f %10d %12.1f %10d' % (
+                batch_size, initial, args.rows / max(initial, 1e-9),
+                resync, args.rows / max(resync, 1e-9)))
+            os.unlink(target_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
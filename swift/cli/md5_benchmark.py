@@ -0,0 +1,98 @@
+# Copyright (c) 2016 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the MD5 throughput of the ``md5_backend`` choices.
+
+A stream of the given size is fed, chunk by chunk, to an md5 object of each
+backend the way the proxy hashes object bodies; the throughput is printed
+along with whether the backends agree on the digest. The af_alg backend is
+only timed if the kernel provides AF_ALG MD5 sockets. It is meant for
+developers and operators choosing a backend, e.g.::
+
+    python -m swift.cli.md5_benchmark --size 4096 --chunk-sizes 65536,1048576
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+from swift.common.utils import get_md5_hasher, md5_socket_available, \
+    MD5_BACKENDS
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Time MD5 hashing of a stream with each md5 backend')
+ARG_PARSER.add_argument(
+    '--size', type=int, default=2048,
+    help="Size of the hashed stream in MiB")
+ARG_PARSER.add_argument(
+    '--chunk-sizes', default='65536,1048576',
+    help="Comma separated sizes of the chunks fed to the hasher")
+
+
+def hash_stream(hasher_class, chunk, total_size):
+    """
+    Hash total_size bytes made of repetitions of chunk and return the
+    hex digest and the seconds taken.
+    """
+    started = time.time()
+    hasher = hasher_class()
+    remaining = total_size
+    while remaining >= len(chunk):
+        hasher.update(chunk)
+        remaining -= len(chunk)
+    if remaining:
+        hasher.update(chunk[:remaining])
+    etag = hasher.hexdigest()
+    return etag, time.time() - started
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    try:
+        chunk_sizes = [int(size) for size in args.chunk_sizes.split(',')]
+    except ValueError:
+        sys.stderr.write("Invalid --chunk-sizes %r\n" % args.chunk_sizes)
+        return 1
+    backends = list(MD5_BACKENDS)
+    if not md5_socket_available():
+        sys.stderr.write("AF_ALG MD5 sockets are not available; only timing "
+                         "hashlib\n")
+        backends.remove('af_alg')
+    total_size = args.size * 1024 * 1024
+
+    print('%10s %8s %10s %10s %10s' % (
+        'chunk', 'backend', 'time(s)', 'MiB/s', 'identical'))
+    for chunk_size in chunk_sizes:
+        chunk = os.urandom(chunk_size)
+        results = []
+        for backend in backends:
+            etag, elapsed = hash_stream(get_md5_hasher(backend), chunk,
+                                        total_size)
+            results.append((backend, etag, elapsed))
+        identical = len(set(etag for _b, etag, _e in results)) == 1
+        for backend, etag, elapsed in results:
+            print('%10d %8s %10.2f %10.1f %10s' % (
+                chunk_size, backend, elapsed,
+                args.size / max(elapsed, 1e-9), identical))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
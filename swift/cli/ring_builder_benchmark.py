@@ -0,0 +1,147 @@
+# Copyright (c) 2016 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the ring builder's rebalance engines on synthetic clusters.
+
+For each cluster size a builder is created with devices spread over
+regions, zones and servers, then put through an initial rebalance and a
+second rebalance after a device removal, a weight change and a new server.
+Every step is run with each engine from the same seed; the time taken is
+printed along with whether the engines arrived at identical assignments.
+Like the ring builder analyzer this is meant for developers, e.g.::
+
+    python -m swift.cli.ring_builder_benchmark --sizes 16:96,18:480,20:3000
+"""
+
+from __future__ import print_function
+
+import argparse
+import copy
+import sys
+import time
+
+from swift.common.ring import builder
+from swift.common.ring import vectorized
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Time the ring builder rebalance engines')
+ARG_PARSER.add_argument(
+    '--sizes', default='12:24,14:96,16:480,18:1200',
+    help="Comma separated part_power:device_count pairs to benchmark")
+ARG_PARSER.add_argument(
+    '--replicas', type=float, default=3,
+    help="Replica count of the synthetic rings")
+ARG_PARSER.add_argument(
+    '--devs-per-server', type=int, default=12,
+    help="Devices on each synthetic server")
+ARG_PARSER.add_argument(
+    '--seed', type=int, default=20160101,
+    help="Seed used for every rebalance")
+
+
+def build_cluster(part_power, replicas, dev_count, devs_per_server):
+    """
+    Build a builder for a synthetic cluster of dev_count devices in two
+    regions of four zones each, with slightly uneven device weights.
+    """
+    rb = builder.RingBuilder(part_power, replicas, 1)
+    for dev_id in range(dev_count):
+        server = dev_id // devs_per_server
+        rb.add_dev({
+            'id': dev_id,
+            'region': server % 2,
+            'zone': (server // 2) % 4,
+            'ip': '10.%d.%d.%d' % (server % 2, (server // 2) % 4,
+                                   server // 8),
+            'port': 6000,
+            'device': 'sd%s' % chr(ord('a') + dev_id % devs_per_server),
+            'weight': 4000 + 500 * (dev_id % 3),
+        })
+    return rb
+
+
+def perturb_cluster(rb, devs_per_server):
+    """
+    Change a cluster the way an operator might between two rebalances.
+    """
+    rb.pretend_min_part_hours_passed()
+    rb.remove_dev(0)
+    rb.set_dev_weight(1, 8000)
+    next_id = len(rb.devs)
+    for offset in range(devs_per_server):
+        rb.add_dev({
+            'id': next_id + offset,
+            'region': 0,
+            'zone': 0,
+            'ip': '10.255.0.1',
+            'port': 6000,
+            'device': 'sd%s' % chr(ord('a') + offset),
+            'weight': 6000,
+        })
+
+
+def timed_rebalance(rb, seed, engine):
+    start = time.time()
+    rb.rebalance(seed=seed, engine=engine)
+    return time.time() - start
+
+
+def run_size(part_power, dev_count, args, engines):
+    rows = []
+    results = {}
+    initial = build_cluster(part_power, args.replicas, dev_count,
+                            args.devs_per_server)
+    for engine in engines:
+        rb = copy.deepcopy(initial)
+        first = timed_rebalance(rb, args.seed, engine)
+        perturb_cluster(rb, args.devs_per_server)
+        second = timed_rebalance(rb, args.seed, engine)
+        rows.append((engine, first, second))
+        results[engine] = ([list(p2d) for p2d in rb._replica2part2dev],
+                           rb.dispersion, rb.get_balance())
+    identical = all(r == results[engines[0]] for r in results.values())
+    return rows, identical
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    try:
+        sizes = [tuple(int(v) for v in size.split(':'))
+                 for size in args.sizes.split(',')]
+    except ValueError:
+        sys.stderr.write("Invalid --sizes %r\n" % args.sizes)
+        return 1
+    engines = ['python']
+    if vectorized.NUMPY_INSTALLED:
+        engines.append('numpy')
+    else:
+        sys.stderr.write("numpy is not installed; only timing the python "
+                         "engine\n")
+
+    print('%10s %8s %8s %12s %12s %10s' % (
+        'part_power', 'devices', 'engine', 'initial(s)', 'rebalance(s)',
+        'identical'))
+    for part_power, dev_count in sizes:
+        rows, identical = run_size(part_power, dev_count, args, engines)
+        for engine, first, second in rows:
+            print('%10d %8d %8s %12.2f %12.2f %10s' % (
+                part_power, dev_count, engine, first, second, identical))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# Copyright (c) 2016 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure Ring.get_nodes lookups per second with and without the node caches.
+
+A synthetic ring is built and saved to a temporary directory, then loaded
+twice: once with the default node caches and once with nodes_cache_size=0,
+which is how lookups worked before the caches. Both rings are asked for the
+nodes of the same stream of account/container paths, drawn from a set of
+--paths distinct names the way a proxy sees the same accounts and
+containers over and over. The proxy's hash path suffix from swift.conf is
+used, e.g.::
+
+    python -m swift.cli.ring_lookup_benchmark --lookups 1000000 \\
+        --paths 5000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from swift.common.ring import Ring, RingBuilder
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Time Ring.get_nodes with and without the node caches')
+ARG_PARSER.add_argument(
+    '--lookups', type=int, default=500000,
+    help="Number of get_nodes calls to time")
+ARG_PARSER.add_argument(
+    '--paths', type=int, default=5000,
+    help="Number of distinct account/container paths looked up")
+ARG_PARSER.add_argument(
+    '--part-power', type=int, default=16,
+    help="Partition power of the synthetic ring")
+ARG_PARSER.add_argument(
+    '--devices', type=int, default=96,
+    help="Number of devices of the synthetic ring")
+
+
+def build_ring(path, part_power, devices):
+    rb = RingBuilder(part_power, 3, 1)
+    for dev_id in range(devices):
+        rb.add_dev({
+            'id': dev_id, 'region': 0, 'zone': dev_id % 4,
+            'ip': '10.0.%d.%d' % (dev_id % 4, dev_id // 4), 'port': 6001,
+            'device': 'sd%s' % chr(ord('a') + dev_id % 12), 'weight': 100})
+    rb.rebalance(seed=1)
+    rb.get_ring().save(path)
+
+
+def time_lookups(ring, paths):
+    started = time.time()
+    for account, container in paths:
+        ring.get_nodes(account, container)
+    return time.time() - started
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    workdir = tempfile.mkdtemp()
+    try:
+        ring_path = os.path.join(workdir, 'container.ring.gz')
+        build_ring(ring_path, args.part_power, args.devices)
+        names = [('AUTH_%d' % (i % 100), 'container-%d' % i)
+                 for i in range(args.paths)]
+        rng = random.Random(1)
+        paths = [rng.choice(names) for _junk in range(args.lookups)]
+
+        print('%10s %10s %14s' % ('caches', 'time(s)', 'lookups/s'))
+        results = []
+        for label, cache_size in (('off', 0), ('on', 10000)):
+            ring = Ring(ring_path, nodes_cache_size=cache_size)
+            elapsed = time_lookups(ring, paths)
+            results.append(ring.get_nodes(*names[0]))
+            print('%10s %10.2f %14d' % (
+                label, elapsed, args.lookups / max(elapsed, 1e-9)))
+        if results[0] != results[1]:
+            sys.stderr.write('Cached lookups returned different nodes!\n')
+            return 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
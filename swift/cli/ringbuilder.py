@@ -16,6 +16,7 @@
 from __future__ import print_function
 import logging
 
+from array import array
 from errno import EEXIST
 from itertools import islice
 from operator import itemgetter
@@ -33,7 +34,7 @@ from six.moves import input
 
 from swift.common import exceptions
 from swift.common.ring import RingBuilder, Ring, RingData
-from swift.common.ring.builder import MAX_BALANCE
+from swift.common.ring.builder import MAX_BALANCE, REBALANCE_ENGINES
 from swift.common.ring.utils import validate_args, \
     validate_and_normalize_ip, build_dev_from_opts, \
     parse_builder_ring_filename_args, parse_search_value, \
@@ -787,6 +788,12 @@ swift-ring-builder <builder_file> search
 swift-ring-builder <builder_file> rebalance [options]
     Attempts to rebalance the ring by reassigning partitions that haven't been
     recently reassigned.
+
+    --format-version 2 writes the ring file in the uncompressed, memory
+    mappable format.
+
+    --engine numpy finds the partitions to gather and computes dispersion
+    with numpy arrays, which is much faster for large rings.
         """
         usage = Commands.rebalance.__doc__.strip()
         parser = optparse.OptionParser(usage)
@@ -796,6 +803,14 @@ swift-ring-builder <builder_file> rebalance [options]
         parser.add_option('-s', '--seed', help="seed to use for rebalance")
         parser.add_option('-d', '--debug', action='store_true',
                           help="print debug information")
+        parser.add_option('--format-version', type='choice',
+                          choices=['1', '2'], default='1',
+                          help="ring file format to write; 2 is "
+                          "uncompressed and memory mapped by the proxy")
+        parser.add_option('-e', '--engine', type='choice',
+                          choices=list(REBALANCE_ENGINES), default='python',
+                          help="placement engine; numpy needs numpy "
+                          "installed and produces the same assignments")
         options, args = parser.parse_args(argv)
 
         def get_seed(index):
@@ -826,7 +841,8 @@ swift-ring-builder <builder_file> rebalance [options]
         devs_changed = builder.devs_changed
         try:
             last_balance = builder.get_balance()
-            parts, balance, removed_devs = builder.rebalance(seed=get_seed(3))
+            parts, balance, removed_devs = builder.rebalance(
+                seed=get_seed(3), engine=options.engine)
         except exceptions.RingBuilderError as e:
             print('-' * 79)
             print("An error has occurred during ring validation. Common\n"
@@ -887,10 +903,12 @@ swift-ring-builder <builder_file> rebalance [options]
             print('-' * 79)
             status = EXIT_WARNING
         ts = time()
-        builder.get_ring().save(
+        ring_data = builder.get_ring(
+            format_version=int(options.format_version))
+        ring_data.save(
             pathjoin(backup_dir, '%d.' % ts + basename(ring_file)))
         builder.save(pathjoin(backup_dir, '%d.' % ts + basename(builder_file)))
-        builder.get_ring().save(ring_file)
+        ring_data.save(ring_file)
         builder.save(builder_file)
         exit(status)
 
@@ -1001,13 +1019,24 @@ swift-ring-builder <builder_file> validate
     @staticmethod
     def write_ring():
         """
-swift-ring-builder <builder_file> write_ring
+swift-ring-builder <builder_file> write_ring [--format-version <1|2>]
     Just rewrites the distributable ring file. This is done automatically after
     a successful rebalance, so really this is only useful after one or more
     'set_info' calls when no rebalance is needed but you want to send out the
     new device information.
+
+    --format-version 2 writes an uncompressed ring file whose partition
+    tables are memory mapped (and shared between workers) by the proxy.
         """
-        ring_data = builder.get_ring()
+        usage = Commands.write_ring.__doc__.strip()
+        parser = optparse.OptionParser(usage)
+        parser.add_option('--format-version', type='choice',
+                          choices=['1', '2'], default='1',
+                          help="ring file format to write; 2 is "
+                          "uncompressed and memory mapped by the proxy")
+        options, args = parser.parse_args(argv)
+        ring_data = builder.get_ring(
+            format_version=int(options.format_version))
         if not ring_data._replica2part2dev_id:
             if ring_data.devs:
                 print('Warning: Writing a ring with no partition '
@@ -1055,7 +1084,9 @@ swift-ring-builder <ring_file> write_builder [min_part_hours]
             'devs': ring.devs,
             'devs_changed': False,
             'version': 0,
-            '_replica2part2dev': ring._replica2part2dev_id,
+            # copy the partition tables; a v2 ring's are read-only maps
+            '_replica2part2dev': [array('H', part2dev_id) for part2dev_id
+                                  in ring._replica2part2dev_id],
             '_last_part_moves_epoch': None,
             '_last_part_moves': None,
             '_last_part_gather_start': 0,
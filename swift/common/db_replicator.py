@@ -163,6 +163,11 @@ class Replicator(Daemon):
         self.ring = ring.Ring(swift_dir, ring_name=self.server_type)
         self._local_device_ids = set()
         self.per_diff = int(conf.get('per_diff', 1000))
+        # when max_per_diff is larger than per_diff the size of each
+        # merge_items batch adapts between the two to how quickly the
+        # remote end merges them
+        self.max_per_diff = max(int(conf.get('max_per_diff') or 0),
+                                self.per_diff)
         self.max_diffs = int(conf.get('max_diffs') or 100)
         self.interval = int(conf.get('interval') or
                             conf.get('run_pause') or 30)
@@ -298,6 +303,23 @@ class Replicator(Daemon):
             response = http.replicate(replicate_method, local_id)
         return response and response.status >= 200 and response.status < 300
 
+    def _next_per_diff(self, per_diff, elapsed):
+        """
+        Pick the size of the next merge_items batch: double it while the
+        remote end merges batches in under a quarter of node_timeout, halve
+        it once a batch takes more than half of node_timeout, always staying
+        between per_diff and max_per_diff.
+
+        :param per_diff: size of the batch just sent
+        :param elapsed: seconds the remote end took to merge it
+        :returns: size of the next batch
+        """
+        if elapsed < self.node_timeout / 4:
+            per_diff *= 2
+        elif elapsed > self.node_timeout / 2:
+            per_diff //= 2
+        return max(self.per_diff, min(per_diff, self.max_per_diff))
+
     def _usync_db(self, point, broker, http, remote_id, local_id):
         """
         Sync a db by sending all records since the last sync.
@@ -315,10 +337,14 @@ class Replicator(Daemon):
         self.logger.debug('Syncing chunks with %s, starting at %s',
                           http.host, point)
         sync_table = broker.get_syncs()
-        objects = broker.get_items_since(point, self.per_diff)
+        per_diff = self.per_diff
+        objects = broker.get_items_since(point, per_diff)
         diffs = 0
+        rows_sent = 0
         while len(objects) and diffs < self.max_diffs:
             diffs += 1
+            rows_sent += len(objects)
+            start = time.time()
             with Timeout(self.node_timeout):
                 response = http.replicate('merge_items', objects, local_id)
             if not response or response.status >= 300 or response.status < 200:
@@ -328,15 +354,16 @@ class Replicator(Daemon):
                                       {'status': response.status,
                                        'host': http.host})
                 return False
+            per_diff = self._next_per_diff(per_diff, time.time() - start)
             # replication relies on db order to send the next merge batch in
             # order with no gaps
             point = objects[-1]['ROWID']
-            objects = broker.get_items_since(point, self.per_diff)
+            objects = broker.get_items_since(point, per_diff)
         if objects:
             self.logger.debug(
                 'Synchronization for %s has fallen more than '
                 '%s rows behind; moving on and will try again next pass.',
-                broker, self.max_diffs * self.per_diff)
+                broker, rows_sent)
             self.stats['diff_capped'] += 1
             self.logger.increment('diff_caps')
         else:
@@ -49,6 +49,7 @@ import json
 import logging
 import time
 from bisect import bisect
+from collections import defaultdict
 from swift import gettext_ as _
 from hashlib import md5
 
@@ -382,60 +383,54 @@ class MemcacheRing(object):
             except (Exception, Timeout) as e:
                 self._exception_occurred(server, e, sock=sock, fp=fp)
 
-    def set_multi(self, mapping, server_key, serialize=True, time=0,
-                  min_compress_len=0):
+    def _serialize(self, value, serialize):
+        flags = 0
+        if serialize and self._allow_pickle:
+            value = pickle.dumps(value, PICKLE_PROTOCOL)
+            flags |= PICKLE_FLAG
+        elif serialize:
+            value = json.dumps(value)
+            flags |= JSON_FLAG
+        return flags, value
+
+    def _group_by_server(self, hashed_keys):
         """
-        Sets multiple key/value pairs in memcache.
+        Groups hashed keys by the first server _get_conns would pick for
+        them.
 
-        :param mapping: dictionary of keys and values to be set in memcache
-        :param servery_key: key to use in determining which server in the ring
-                            is used
-        :param serialize: if True, value is serialized with JSON before sending
-                          to memcache, or with pickle if configured to use
-                          pickle instead of JSON (to avoid cache poisoning)
-        :param time: the time to live
-        :min_compress_len: minimum compress length, this parameter was added
-                           to keep the signature compatible with
-                           python-memcached interface. This implementation
-                           ignores it
+        :returns: a dict of server => list of hashed keys
+        """
+        servers = defaultdict(list)
+        for key in hashed_keys:
+            pos = (bisect(self._sorted, key) + 1) % len(self._sorted)
+            servers[self._ring[self._sorted[pos]]].append(key)
+        return servers
+
+    def _set_multi_hashed(self, msg, count, server_key):
+        """
+        Sends a pipelined batch of set commands to the server for
+        server_key, waiting for each command's reply.
         """
-        server_key = md5hash(server_key)
-        timeout = sanitize_timeout(time)
-        msg = ''
-        for key, value in mapping.items():
-            key = md5hash(key)
-            flags = 0
-            if serialize and self._allow_pickle:
-                value = pickle.dumps(value, PICKLE_PROTOCOL)
-                flags |= PICKLE_FLAG
-            elif serialize:
-                value = json.dumps(value)
-                flags |= JSON_FLAG
-            msg += ('set %s %d %d %s\r\n%s\r\n' %
-                    (key, flags, timeout, len(value), value))
         for (server, fp, sock) in self._get_conns(server_key):
             try:
                 with Timeout(self._io_timeout):
                     sock.sendall(msg)
                     # Wait for the set to complete
-                    for line in range(len(mapping)):
+                    for line in range(count):
                         fp.readline()
                     self._return_conn(server, fp, sock)
                     return
             except (Exception, Timeout) as e:
                 self._exception_occurred(server, e, sock=sock, fp=fp)
 
-    def get_multi(self, keys, server_key):
+    def _get_multi_hashed(self, keys, server_key):
         """
-        Gets multiple values from memcache for the given keys.
+        Gets the values of already hashed keys with one get command to the
+        server for server_key.
 
-        :param keys: keys for values to be retrieved from memcache
-        :param servery_key: key to use in determining which server in the ring
-                            is used
-        :returns: list of values
+        :returns: dict of hashed key => value for the keys found, or None if
+                  no server could be talked to
         """
-        server_key = md5hash(server_key)
-        keys = [md5hash(key) for key in keys]
         for (server, fp, sock) in self._get_conns(server_key):
             try:
                 with Timeout(self._io_timeout):
@@ -456,13 +451,97 @@ class MemcacheRing(object):
                             responses[line[1]] = value
                             fp.readline()
                         line = fp.readline().strip().split()
-                    values = []
-                    for key in keys:
-                        if key in responses:
-                            values.append(responses[key])
-                        else:
-                            values.append(None)
                     self._return_conn(server, fp, sock)
-                    return values
+                    return responses
             except (Exception, Timeout) as e:
                 self._exception_occurred(server, e, sock=sock, fp=fp)
+
+    def set_multi(self, mapping, server_key, serialize=True, time=0,
+                  min_compress_len=0):
+        """
+        Sets multiple key/value pairs in memcache.
+
+        :param mapping: dictionary of keys and values to be set in memcache
+        :param servery_key: key to use in determining which server in the ring
+                            is used
+        :param serialize: if True, value is serialized with JSON before sending
+                          to memcache, or with pickle if configured to use
+                          pickle instead of JSON (to avoid cache poisoning)
+        :param time: the time to live
+        :min_compress_len: minimum compress length, this parameter was added
+                           to keep the signature compatible with
+                           python-memcached interface. This implementation
+                           ignores it
+        """
+        server_key = md5hash(server_key)
+        timeout = sanitize_timeout(time)
+        msg = ''
+        for key, value in mapping.items():
+            key = md5hash(key)
+            flags, value = self._serialize(value, serialize)
+            msg += ('set %s %d %d %s\r\n%s\r\n' %
+                    (key, flags, timeout, len(value), value))
+        self._set_multi_hashed(msg, len(mapping), server_key)
+
+    def get_multi(self, keys, server_key):
+        """
+        Gets multiple values from memcache for the given keys.
+
+        :param keys: keys for values to be retrieved from memcache
+        :param servery_key: key to use in determining which server in the ring
+                            is used
+        :returns: list of values
+        """
+        server_key = md5hash(server_key)
+        keys = [md5hash(key) for key in keys]
+        responses = self._get_multi_hashed(keys, server_key)
+        if responses is None:
+            return None
+        return [responses.get(key) for key in keys]
+
+    def set_many(self, mapping, serialize=True, time=0):
+        """
+        Sets multiple key/value pairs in memcache, each on the server its own
+        key hashes to. The sets for each server are pipelined on a single
+        connection and all servers are written to concurrently.
+
+        :param mapping: dictionary of keys and values to be set in memcache
+        :param serialize: if True, value is serialized with JSON before sending
+                          to memcache, or with pickle if configured to use
+                          pickle instead of JSON (to avoid cache poisoning)
+        :param time: the time to live
+        """
+        timeout = sanitize_timeout(time)
+        hashed = dict((md5hash(key), value) for key, value in mapping.items())
+        servers = self._group_by_server(hashed)
+        pile = utils.GreenAsyncPile(len(servers) or 1)
+        for server_keys in servers.values():
+            msg = ''
+            for key in server_keys:
+                flags, value = self._serialize(hashed[key], serialize)
+                msg += ('set %s %d %d %s\r\n%s\r\n' %
+                        (key, flags, timeout, len(value), value))
+            pile.spawn(self._set_multi_hashed, msg, len(server_keys),
+                       server_keys[0])
+        for _junk in pile:
+            pass
+
+    def get_many(self, keys):
+        """
+        Gets multiple values from memcache, looking each key up on the server
+        its own key hashes to. There is one get command per server and all
+        servers are queried concurrently.
+
+        :param keys: keys for values to be retrieved from memcache
+        :returns: list of values, None for any key that was not found
+        """
+        hashed = [md5hash(key) for key in keys]
+        servers = self._group_by_server(hashed)
+        pile = utils.GreenAsyncPile(len(servers) or 1)
+        for server_keys in servers.values():
+            pile.spawn(self._get_multi_hashed, server_keys, server_keys[0])
+        responses = {}
+        for server_responses in pile:
+            if server_responses:
+                responses.update(server_responses)
+        return [responses.get(key) for key in hashed]
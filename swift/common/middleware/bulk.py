@@ -188,9 +188,24 @@ swift.source set to "BD" the log's content length of 0. If double
 proxy-logging is used the leftmost logger will not have a
 swift.source set and the content length will reflect the size of the
 payload sent to the proxy (the list of objects/containers to be deleted).
+
+-----------
+Concurrency
+-----------
+
+Bulk deletes issue up to ``delete_concurrency`` (default 2) DELETE
+subrequests at a time. Archive extraction PUTs files one at a time unless
+``extract_concurrency`` is set; files of up to ``extract_buffer_size`` bytes
+(default 1 MiB) are then read from the archive into memory and uploaded
+concurrently while the next files are read, larger files are uploaded
+directly from the archive. Both settings are per request and are capped at
+``MAX_CONCURRENCY`` so a single client cannot tie up all of a proxy's green
+threads. The response format is the same at any concurrency, though the
+order of the listed errors may vary.
 """
 
 import json
+from six import BytesIO
 from six.moves.urllib.parse import quote, unquote
 import tarfile
 from xml.sax import saxutils
@@ -201,11 +216,15 @@ from swift.common.swob import Request, HTTPBadGateway, \
     HTTPCreated, HTTPBadRequest, HTTPNotFound, HTTPUnauthorized, HTTPOk, \
     HTTPPreconditionFailed, HTTPRequestEntityTooLarge, HTTPNotAcceptable, \
     HTTPLengthRequired, HTTPException, HTTPServerError, wsgify
-from swift.common.utils import get_logger, register_swift_info
+from swift.common.utils import get_logger, register_swift_info, \
+    ContextPool, GreenAsyncPile
 from swift.common import constraints
 from swift.common.http import HTTP_UNAUTHORIZED, HTTP_NOT_FOUND, HTTP_CONFLICT
 
 
+MAX_CONCURRENCY = 100
+
+
 class CreateContainerError(Exception):
     def __init__(self, msg, status_int, status):
         self.status_int = status_int
@@ -275,7 +294,8 @@ class Bulk(object):
     def __init__(self, app, conf, max_containers_per_extraction=10000,
                  max_failed_extractions=1000, max_deletes_per_request=10000,
                  max_failed_deletes=1000, yield_frequency=10, retry_count=0,
-                 retry_interval=1.5, logger=None):
+                 retry_interval=1.5, logger=None, delete_concurrency=2,
+                 extract_concurrency=1, extract_buffer_size=1024 * 1024):
         self.app = app
         self.logger = logger or get_logger(conf, log_route='bulk')
         self.max_containers = max_containers_per_extraction
@@ -285,6 +305,11 @@ class Bulk(object):
         self.yield_frequency = yield_frequency
         self.retry_count = retry_count
         self.retry_interval = retry_interval
+        self.delete_concurrency = min(max(delete_concurrency, 1),
+                                      MAX_CONCURRENCY)
+        self.extract_concurrency = min(max(extract_concurrency, 1),
+                                       MAX_CONCURRENCY)
+        self.extract_buffer_size = extract_buffer_size
         self.max_path_length = constraints.MAX_OBJECT_NAME_LENGTH \
             + constraints.MAX_CONTAINER_NAME_LENGTH + 2
 
@@ -372,6 +397,7 @@ class Bulk(object):
         last_yield = time()
         separator = ''
         failed_files = []
+        pool = None
         resp_dict = {'Response Status': HTTPOk().status,
                      'Response Body': '',
                      'Number Deleted': 0,
@@ -397,11 +423,19 @@ class Bulk(object):
                 objs_to_delete = self.get_objs_to_delete(req)
             failed_file_response = {'type': HTTPBadRequest}
             req.environ['eventlet.minimum_write_chunk_size'] = 0
+            pool = ContextPool(self.delete_concurrency)
+            pile = GreenAsyncPile(pool)
+            # the deletes record their own results; the pile is drained to
+            # keep at most delete_concurrency of them in flight
+            pending = 0
             for obj_to_delete in objs_to_delete:
                 if last_yield + self.yield_frequency < time():
                     separator = '\r\n\r\n'
                     last_yield = time()
                     yield ' '
+                while pending >= self.delete_concurrency:
+                    next(pile)
+                    pending -= 1
                 obj_name = obj_to_delete['name']
                 if not obj_name:
                     continue
@@ -428,8 +462,16 @@ class Bulk(object):
                 new_env['HTTP_USER_AGENT'] = \
                     '%s %s' % (req.environ.get('HTTP_USER_AGENT'), user_agent)
                 new_env['swift.source'] = swift_source
-                self._process_delete(delete_path, obj_name, new_env, resp_dict,
-                                     failed_files, failed_file_response)
+                pile.spawn(self._pooled_delete, delete_path, obj_name,
+                           new_env, resp_dict, failed_files,
+                           failed_file_response)
+                pending += 1
+            while pending:
+                if last_yield + self.yield_frequency < time():
+                    separator = '\r\n\r\n'
+                    last_yield = time()
+                    yield ' '
+                pending -= len(pile.waitall(self.yield_frequency))
 
             if failed_files:
                 resp_dict['Response Status'] = \
@@ -445,6 +487,10 @@ class Bulk(object):
         except Exception:
             self.logger.exception('Error in bulk delete.')
             resp_dict['Response Status'] = HTTPServerError().status
+        finally:
+            if pool is not None:
+                for coro in list(pool.coroutines_running):
+                    coro.kill()
 
         yield separator + get_response_body(out_content_type,
                                             resp_dict, failed_files)
@@ -469,6 +515,7 @@ class Bulk(object):
         last_yield = time()
         separator = ''
         containers_accessed = set()
+        pool = None
         try:
             if not out_content_type:
                 raise HTTPNotAcceptable(request=req)
@@ -487,14 +534,21 @@ class Bulk(object):
             extract_base = extract_base.rstrip('/')
             tar = tarfile.open(mode='r|' + compress_type,
                                fileobj=req.body_file)
-            failed_response_type = HTTPBadRequest
+            failed_response = {'type': HTTPBadRequest}
             req.environ['eventlet.minimum_write_chunk_size'] = 0
             containers_created = 0
+            pool = ContextPool(self.extract_concurrency)
+            pile = GreenAsyncPile(pool)
+            pending = 0
             while True:
                 if last_yield + self.yield_frequency < time():
                     separator = '\r\n\r\n'
                     last_yield = time()
                     yield ' '
+                while pending >= self.extract_concurrency:
+                    pending -= 1
+                    self._process_extract(req, next(pile), resp_dict,
+                                          failed_files, failed_response)
                 tar_info = next(tar)
                 if tar_info is None or \
                         len(failed_files) >= self.max_failed_extractions:
@@ -547,6 +601,12 @@ class Bulk(object):
                             continue
 
                     tar_file = tar.extractfile(tar_info)
+                    concurrent = self.extract_concurrency > 1 and \
+                        tar_info.size <= self.extract_buffer_size
+                    if concurrent:
+                        # read it now so the next file can be read from the
+                        # archive while this one is uploaded
+                        tar_file = BytesIO(tar_file.read())
                     new_env = req.environ.copy()
                     new_env['REQUEST_METHOD'] = 'PUT'
                     new_env['wsgi.input'] = tar_file
@@ -566,26 +626,29 @@ class Bulk(object):
                             create_obj_req.headers[header_name] = \
                                 pax_value.encode("utf-8")
 
-                    resp = create_obj_req.get_response(self.app)
                     containers_accessed.add(container)
-                    if resp.is_success:
-                        resp_dict['Number Files Created'] += 1
+                    if concurrent:
+                        pile.spawn(self._extract_put, create_obj_req,
+                                   obj_path, container_failure)
+                        pending += 1
                     else:
-                        if container_failure:
-                            failed_files.append(container_failure)
-                        if resp.status_int == HTTP_UNAUTHORIZED:
-                            failed_files.append([
-                                quote(obj_path[:self.max_path_length]),
-                                HTTPUnauthorized().status])
-                            raise HTTPUnauthorized(request=req)
-                        if resp.status_int // 100 == 5:
-                            failed_response_type = HTTPBadGateway
-                        failed_files.append([
-                            quote(obj_path[:self.max_path_length]),
-                            resp.status])
+                        self._process_extract(
+                            req, self._extract_put(create_obj_req, obj_path,
+                                                   container_failure),
+                            resp_dict, failed_files, failed_response)
+
+            while pending:
+                if last_yield + self.yield_frequency < time():
+                    separator = '\r\n\r\n'
+                    last_yield = time()
+                    yield ' '
+                for result in pile.waitall(self.yield_frequency):
+                    pending -= 1
+                    self._process_extract(req, result, resp_dict,
+                                          failed_files, failed_response)
 
             if failed_files:
-                resp_dict['Response Status'] = failed_response_type().status
+                resp_dict['Response Status'] = failed_response['type']().status
             elif not resp_dict['Number Files Created']:
                 resp_dict['Response Status'] = HTTPBadRequest().status
                 resp_dict['Response Body'] = 'Invalid Tar File: No Valid Files'
@@ -599,10 +662,66 @@ class Bulk(object):
         except Exception:
             self.logger.exception('Error in extract archive.')
             resp_dict['Response Status'] = HTTPServerError().status
+        finally:
+            if pool is not None:
+                for coro in list(pool.coroutines_running):
+                    coro.kill()
 
         yield separator + get_response_body(
             out_content_type, resp_dict, failed_files)
 
+    def _extract_put(self, create_obj_req, obj_path, container_failure):
+        """
+        PUT one extracted file.
+
+        :returns: a tuple of (response, obj_path, container_failure) for
+                  :func:`_process_extract`
+        """
+        try:
+            resp = create_obj_req.get_response(self.app)
+        except Exception:
+            self.logger.exception('Error in extract archive.')
+            resp = HTTPServerError(request=create_obj_req)
+        return resp, obj_path, container_failure
+
+    def _process_extract(self, req, result, resp_dict, failed_files,
+                         failed_response):
+        """
+        Record the outcome of an extracted file's PUT.
+
+        :raises: HTTPUnauthorized if the PUT was not authorized
+        """
+        resp, obj_path, container_failure = result
+        if resp.is_success:
+            resp_dict['Number Files Created'] += 1
+            return
+        if container_failure:
+            failed_files.append(container_failure)
+        if resp.status_int == HTTP_UNAUTHORIZED:
+            failed_files.append([
+                quote(obj_path[:self.max_path_length]),
+                HTTPUnauthorized().status])
+            raise HTTPUnauthorized(request=req)
+        if resp.status_int // 100 == 5:
+            failed_response['type'] = HTTPBadGateway
+        failed_files.append([
+            quote(obj_path[:self.max_path_length]),
+            resp.status])
+
+    def _pooled_delete(self, delete_path, obj_name, env, resp_dict,
+                       failed_files, failed_file_response):
+        """
+        Run :func:`_process_delete` in a pool; errors are recorded as a
+        failure of that object, so that every job returns.
+        """
+        try:
+            self._process_delete(delete_path, obj_name, env, resp_dict,
+                                 failed_files, failed_file_response)
+        except Exception:
+            self.logger.exception('Error in bulk delete.')
+            failed_file_response['type'] = HTTPBadGateway
+            failed_files.append([quote(obj_name), HTTPServerError().status])
+
     def _process_delete(self, delete_path, obj_name, env, resp_dict,
                         failed_files, failed_file_response, retry=0):
         delete_obj_req = Request.blank(delete_path, env)
@@ -666,6 +785,9 @@ def filter_factory(global_conf, **local_conf):
     yield_frequency = int(conf.get('yield_frequency', 10))
     retry_count = int(conf.get('delete_container_retry_count', 0))
     retry_interval = 1.5
+    delete_concurrency = int(conf.get('delete_concurrency', 2))
+    extract_concurrency = int(conf.get('extract_concurrency', 1))
+    extract_buffer_size = int(conf.get('extract_buffer_size', 1024 * 1024))
 
     register_swift_info(
         'bulk_upload',
@@ -685,5 +807,8 @@ def filter_factory(global_conf, **local_conf):
             max_failed_deletes=max_failed_deletes,
             yield_frequency=yield_frequency,
             retry_count=retry_count,
-            retry_interval=retry_interval)
+            retry_interval=retry_interval,
+            delete_concurrency=delete_concurrency,
+            extract_concurrency=extract_concurrency,
+            extract_buffer_size=extract_buffer_size)
     return bulk_filter
@@ -129,7 +129,7 @@ from swift.common.swob import Request, Response, \
     HTTPRequestedRangeNotSatisfiable, HTTPBadRequest, HTTPConflict
 from swift.common.utils import get_logger, \
     RateLimitedIterator, read_conf_dir, quote, close_if_possible, \
-    closing_if_possible
+    closing_if_possible, get_md5_hasher
 from swift.common.request_helpers import SegmentedIterable
 from swift.common.wsgi import WSGIContext, make_subrequest
 
@@ -316,7 +316,8 @@ class GetContext(WSGIContext):
                 req, self.dlo.app, listing_iter, ua_suffix="DLO MultipartGET",
                 swift_source="DLO", name=req.path, logger=self.logger,
                 max_get_time=self.dlo.max_get_time,
-                response_body_length=actual_content_length)
+                response_body_length=actual_content_length,
+                md5_hasher=self.dlo.md5_hasher)
 
             try:
                 app_iter.validate_first_segment()
@@ -367,6 +368,8 @@ class DynamicLargeObject(object):
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(conf.get(
             'rate_limit_segments_per_sec', '1'))
+        self.md5_hasher = get_md5_hasher(conf.get('md5_backend', 'hashlib'),
+                                         self.logger)
 
     def _populate_config_from_old_location(self, conf):
         if ('rate_limit_after_segment' in conf or
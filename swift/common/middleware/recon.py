@@ -181,6 +181,20 @@ class ReconMiddleware(object):
                                            'expired_last_pass'],
                                           self.object_recon_cache)
 
+    def get_reconciler_info(self, recon_type):
+        """get container reconciler info"""
+        if recon_type == 'container':
+            return self._from_recon_cache(['container_reconciler_pass',
+                                           'container_reconciler_stats'],
+                                          self.container_recon_cache)
+
+    def get_reaper_info(self, recon_type):
+        """get account reaper info"""
+        if recon_type == 'account':
+            return self._from_recon_cache(['account_reaper_pass',
+                                           'account_reaper_stats'],
+                                          self.account_recon_cache)
+
     def get_auditor_info(self, recon_type):
         """get auditor info"""
         if recon_type == 'account':
@@ -366,6 +380,10 @@ class ReconMiddleware(object):
             content = self.get_auditor_info(rtype)
         elif rcheck == "expirer" and rtype == 'object':
             content = self.get_expirer_info(rtype)
+        elif rcheck == "reconciler" and rtype == 'container':
+            content = self.get_reconciler_info(rtype)
+        elif rcheck == "reaper" and rtype == 'account':
+            content = self.get_reaper_info(rtype)
         elif rcheck == "mounted":
             content = self.get_mounted()
         elif rcheck == "unmounted":
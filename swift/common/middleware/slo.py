@@ -137,6 +137,18 @@ proxy logs and the user will receive incomplete results. Note that this will be
 enforced regardless of whether the user perfomed per-segment validation during
 upload.
 
+Segments are fetched one after another by default. Setting
+``prefetch_segments`` in the filter section makes the middleware keep that
+many segment GETs in flight ahead of the segment being sent, buffering their
+bodies in memory up to ``prefetch_bytes`` (64 MiB by default) per download.
+The time to each segment's first byte and to its last byte is sent to statsd
+as ``segment.first_byte.timing`` and ``segment.get.timing``.
+
+The segment bodies are MD5 hashed to validate them against the manifest.
+With ``md5_backend = af_alg`` (usually set in the [DEFAULT] section so the
+proxy and DLO use it too) the hashing is done by the kernel through AF_ALG
+sockets; hashlib is used when those are not available.
+
 The headers from this GET or HEAD request will return the metadata attached
 to the manifest object itself with some exceptions::
 
@@ -218,7 +230,7 @@ from swift.common.swob import Request, HTTPBadRequest, HTTPServerError, \
 from swift.common.utils import get_logger, config_true_value, \
     get_valid_utf8_str, override_bytes_from_content_type, split_path, \
     register_swift_info, RateLimitedIterator, quote, close_if_possible, \
-    closing_if_possible
+    closing_if_possible, get_md5_hasher
 from swift.common.request_helpers import SegmentedIterable
 from swift.common.constraints import check_utf8, MAX_BUFFERED_SLO_SEGMENTS
 from swift.common.http import HTTP_NOT_FOUND, HTTP_UNAUTHORIZED, is_success
@@ -230,6 +242,7 @@ from swift.common.middleware.bulk import get_response_body, \
 DEFAULT_RATE_LIMIT_UNDER_SIZE = 1024 * 1024  # 1 MiB
 DEFAULT_MAX_MANIFEST_SEGMENTS = 1000
 DEFAULT_MAX_MANIFEST_SIZE = 1024 * 1024 * 2  # 2 MiB
+DEFAULT_PREFETCH_BYTES = 1024 * 1024 * 64  # 64 MiB
 
 
 REQUIRED_SLO_KEYS = set(['path', 'etag', 'size_bytes'])
@@ -735,7 +748,10 @@ class SloGetContext(WSGIContext):
             name=req.path, logger=self.slo.logger,
             ua_suffix="SLO MultipartGET",
             swift_source="SLO",
-            max_get_time=self.slo.max_get_time)
+            max_get_time=self.slo.max_get_time,
+            prefetch_segments=self.slo.prefetch_segments,
+            prefetch_bytes=self.slo.prefetch_bytes,
+            md5_hasher=self.slo.md5_hasher)
 
         try:
             segmented_iter.validate_first_segment()
@@ -784,6 +800,11 @@ class StaticLargeObject(object):
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(self.conf.get(
             'rate_limit_segments_per_sec', '1'))
+        self.prefetch_segments = int(self.conf.get('prefetch_segments', 0))
+        self.prefetch_bytes = int(self.conf.get(
+            'prefetch_bytes', DEFAULT_PREFETCH_BYTES))
+        self.md5_hasher = get_md5_hasher(
+            self.conf.get('md5_backend', 'hashlib'), self.logger)
         self.bulk_deleter = Bulk(app, {}, logger=self.logger)
 
     def handle_multipart_get_or_head(self, req, start_response):
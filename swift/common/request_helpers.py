@@ -20,11 +20,13 @@ Why not swift.common.utils, you ask? Because this way we can import things
 from swob in here without creating circular imports.
 """
 
+from collections import deque
 import hashlib
 import itertools
 import sys
 import time
 
+from eventlet import GreenPool
 import six
 from six.moves.urllib.parse import unquote
 
@@ -274,11 +276,21 @@ class SegmentedIterable(object):
     :param name: name of manifest (used in logging only)
     :param response_body_length: optional response body length for
                                  the response being sent to the client.
+    :param prefetch_segments: number of segment GETs to have in flight
+                              ahead of the one being sent to the client;
+                              0 fetches segments one after another.
+    :param prefetch_bytes: maximum number of bytes of prefetched segments
+                           buffered at any time.
+    :param md5_hasher: constructor of the md5 objects used to validate
+                       segment etags, see
+                       :func:`swift.common.utils.get_md5_hasher`.
     """
 
     def __init__(self, req, app, listing_iter, max_get_time,
                  logger, ua_suffix, swift_source,
-                 name='<not specified>', response_body_length=None):
+                 name='<not specified>', response_body_length=None,
+                 prefetch_segments=0, prefetch_bytes=0,
+                 md5_hasher=hashlib.md5):
         self.req = req
         self.app = app
         self.listing_iter = listing_iter
@@ -288,6 +300,9 @@ class SegmentedIterable(object):
         self.swift_source = swift_source
         self.name = name
         self.response_body_length = response_body_length
+        self.prefetch_segments = prefetch_segments
+        self.prefetch_bytes = prefetch_bytes
+        self.md5_hasher = md5_hasher
         self.peeked_chunk = None
         self.app_iter = self._internal_iter()
         self.validated_first_segment = False
@@ -378,12 +393,104 @@ class SegmentedIterable(object):
         if pending_req:
             yield pending_req, pending_etag, pending_size
 
+    def _expected_length(self, seg_req, seg_size):
+        """
+        Returns the number of body bytes a segment request should return, or
+        None if the segment size is not known.
+        """
+        if seg_size is None:
+            return None
+        if not seg_req.range:
+            return seg_size
+        return sum(end - start for start, end in
+                   seg_req.range.ranges_for_length(seg_size) or ())
+
+    def _get_segment(self, seg_req, buffer_body=False):
+        """
+        Issue a segment GET; with buffer_body the whole body of a successful
+        response is read into memory before returning.
+
+        :returns: a tuple of (response, start time, whether the body was
+                  buffered)
+        """
+        start_time = time.time()
+        seg_resp = seg_req.get_response(self.app)
+        self.logger.timing_since('segment.first_byte.timing', start_time)
+        if not (buffer_body and is_success(seg_resp.status_int)):
+            return seg_resp, start_time, False
+        try:
+            body = list(seg_resp.app_iter)
+        finally:
+            close_if_possible(seg_resp.app_iter)
+        seg_resp.app_iter = body
+        self.logger.timing_since('segment.get.timing', start_time)
+        return seg_resp, start_time, True
+
+    def _fetch_segments(self):
+        """
+        Yields (seg_req, seg_etag, seg_size, seg_resp, start_time, buffered)
+        for every coalesced segment request, in order.
+
+        With prefetch_segments set, the following segments are fetched
+        concurrently and buffered while the current one is sent, as long as
+        their expected sizes fit in prefetch_bytes. Segments of unknown size
+        or too large for the budget are only requested when they are next.
+        """
+        requests = self._coalesce_requests()
+        if self.prefetch_segments <= 0:
+            for seg_req, seg_etag, seg_size in requests:
+                yield (seg_req, seg_etag, seg_size) + \
+                    self._get_segment(seg_req)
+            return
+
+        pool = GreenPool(self.prefetch_segments + 1)
+        pending = deque()
+        reserved = 0
+        upcoming = None
+        listing_error = None
+        try:
+            while True:
+                while listing_error is None and \
+                        len(pending) <= self.prefetch_segments:
+                    if upcoming is None:
+                        try:
+                            upcoming = next(requests)
+                        except StopIteration:
+                            break
+                        except (ListingIterError, SegmentError):
+                            # send what we already have before failing, as
+                            # the sequential fetch does
+                            listing_error = sys.exc_info()
+                            break
+                    seg_req, _seg_etag, seg_size = upcoming
+                    length = self._expected_length(seg_req, seg_size)
+                    fits = length is not None and \
+                        reserved + length <= self.prefetch_bytes
+                    if pending and not fits:
+                        break
+                    if fits:
+                        reserved += length
+                    pending.append((upcoming, length if fits else 0,
+                                    pool.spawn(self._get_segment, seg_req,
+                                               fits)))
+                    upcoming = None
+                if not pending:
+                    break
+                seg_info, length, fetcher = pending.popleft()
+                yield seg_info + fetcher.wait()
+                reserved -= length
+        finally:
+            for _seg_info, _length, fetcher in pending:
+                fetcher.kill()
+        if listing_error:
+            six.reraise(*listing_error)
+
     def _internal_iter(self):
         bytes_left = self.response_body_length
 
         try:
-            for seg_req, seg_etag, seg_size in self._coalesce_requests():
-                seg_resp = seg_req.get_response(self.app)
+            for seg_req, seg_etag, seg_size, seg_resp, start_time, \
+                    buffered in self._fetch_segments():
                 if not is_success(seg_resp.status_int):
                     close_if_possible(seg_resp.app_iter)
                     raise SegmentError(
@@ -416,7 +523,7 @@ class SegmentedIterable(object):
                 seg_hash = None
                 if seg_resp.etag and not seg_req.headers.get('Range'):
                     # Only calculate the MD5 if it we can use it to validate
-                    seg_hash = hashlib.md5()
+                    seg_hash = self.md5_hasher()
 
                 document_iters = maybe_multipart_byteranges_to_document_iters(
                     seg_resp.app_iter,
@@ -441,6 +548,8 @@ class SegmentedIterable(object):
                             {'name': self.name, 'seg': seg_req.path,
                              'left': bytes_left})
                 close_if_possible(seg_resp.app_iter)
+                if not buffered:
+                    self.logger.timing_since('segment.get.timing', start_time)
 
                 if seg_hash and seg_hash.hexdigest() != seg_resp.etag:
                     raise SegmentError(
@@ -30,7 +30,7 @@ from six.moves import range
 from time import time
 
 from swift.common import exceptions
-from swift.common.ring import RingData
+from swift.common.ring import RingData, vectorized
 from swift.common.ring.utils import tiers_for_dev, build_tier_tree, \
     validate_and_normalize_address
 
@@ -40,6 +40,7 @@ from swift.common.ring.utils import tiers_for_dev, build_tier_tree, \
 NONE_DEV = 2 ** 16 - 1
 MAX_BALANCE = 999.99
 MAX_BALANCE_GATHER_COUNT = 3
+REBALANCE_ENGINES = ('python', 'numpy')
 
 
 class RingValidationWarning(Warning):
@@ -118,6 +119,8 @@ class RingBuilder(object):
         self.dispersion = 0.0
         self._remove_devs = []
         self._ring = None
+        # set for the duration of a rebalance using the numpy engine
+        self._vectorized = False
 
         self.logger = logging.getLogger("swift.ring.builder")
         if not self.logger.handlers:
@@ -278,12 +281,16 @@ class RingBuilder(object):
     def set_overload(self, overload):
         self.overload = overload
 
-    def get_ring(self):
+    def get_ring(self, format_version=None):
         """
         Get the ring, or more specifically, the swift.common.ring.RingData.
         This ring data is the minimum required for use of the ring. The ring
         builder itself keeps additional data such as when partitions were last
         moved.
+
+        :param format_version: if given, the on-disk format the returned
+                               RingData will be saved in by default; 2 is the
+                               uncompressed, memory mappable format.
         """
         # We cache the self._ring value so multiple requests for it don't build
         # it multiple times. Be sure to set self._ring = None whenever the ring
@@ -306,6 +313,11 @@ class RingBuilder(object):
                     RingData([array('H', p2d) for p2d in
                               self._replica2part2dev],
                              devs, 32 - self.part_power)
+        if format_version is not None and \
+                format_version != self._ring.format_version:
+            return RingData(self._ring._replica2part2dev_id, self._ring.devs,
+                            self._ring._part_shift,
+                            format_version=format_version)
         return self._ring
 
     def add_dev(self, dev):
@@ -395,7 +407,7 @@ class RingBuilder(object):
         self.devs_changed = True
         self.version += 1
 
-    def rebalance(self, seed=None):
+    def rebalance(self, seed=None, engine='python'):
         """
         Rebalance the ring.
 
@@ -410,9 +422,20 @@ class RingBuilder(object):
         below 1% or doesn't change by more than 1% (only happens with ring that
         can't be balanced no matter what).
 
+        :param seed: seed for the random number generator
+        :param engine: 'python', or 'numpy' to find the partitions to gather
+                       and build the dispersion graph with array operations;
+                       both engines produce the same assignments.
         :returns: (number_of_partitions_altered, resulting_balance,
                    number_of_removed_devices)
         """
+        if engine not in REBALANCE_ENGINES:
+            raise ValueError('Unknown rebalance engine %r' % (engine,))
+        if engine == 'numpy' and not vectorized.NUMPY_INSTALLED:
+            raise exceptions.RingBuilderError(
+                'The numpy rebalance engine requires numpy to be installed')
+        self._vectorized = engine == 'numpy'
+
         # count up the devs, and cache some stuff
         num_devices = 0
         for dev in self._iter_devs():
@@ -481,11 +504,16 @@ class RingBuilder(object):
 
         self.devs_changed = False
         self.version += 1
-        changed_parts = self._build_dispersion_graph(old_replica2part2dev)
+        if self._vectorized:
+            changed_parts = vectorized.build_dispersion_graph(
+                self, old_replica2part2dev)
+        else:
+            changed_parts = self._build_dispersion_graph(old_replica2part2dev)
 
         # clean up the cache
         for dev in self._iter_devs():
             dev.pop('tiers', None)
+        self._vectorized = False
 
         return changed_parts, self.get_balance(), removed_devs
 
@@ -961,7 +989,11 @@ class RingBuilder(object):
         """
         # Now we gather partitions that are "at risk" because they aren't
         # currently sufficient spread out across the cluster.
-        for part in range(self.parts):
+        if self._vectorized:
+            parts = vectorized.parts_for_dispersion(self, replica_plan)
+        else:
+            parts = range(self.parts)
+        for part in parts:
             if self._last_part_moves[part] < self.min_part_hours:
                 continue
             # First, add up the count of replicas at each tier for each
@@ -1020,8 +1052,7 @@ class RingBuilder(object):
         """
         # Last, we gather partitions from devices that are "overweight" because
         # they have more partitions than their parts_wanted.
-        for offset in range(self.parts):
-            part = (start + offset) % self.parts
+        for part in self._iter_parts_from(start):
             if self._last_part_moves[part] < self.min_part_hours:
                 continue
             # For each part we'll look at the devices holding those parts and
@@ -1102,8 +1133,7 @@ class RingBuilder(object):
         :param assign_parts: the map of partition => [replica] to update
         :param start: offset into self.parts to begin search
         """
-        for offset in range(self.parts):
-            part = (start + offset) % self.parts
+        for part in self._iter_parts_from(start):
             if self._last_part_moves[part] < self.min_part_hours:
                 continue
             overweight_dev_replica = []
@@ -1135,6 +1165,22 @@ class RingBuilder(object):
                 self._replica2part2dev[replica][part] = NONE_DEV
                 self._last_part_moves[part] = 0
 
+    def _iter_parts_from(self, start):
+        """
+        Yield the partitions a balance gather should look at, going around
+        the ring from start. The numpy engine skips partitions that can't
+        be gathered because none of their replicas are on an overweight
+        device.
+
+        :param start: offset into self.parts to begin search
+        """
+        if self._vectorized:
+            for part in vectorized.parts_on_overweight_devs(self, start):
+                yield part
+            return
+        for offset in range(self.parts):
+            yield (start + offset) % self.parts
+
     def _reassign_parts(self, reassign_parts, replica_plan):
         """
         For an existing ring data set, partitions are reassigned similarly to
@@ -14,8 +14,10 @@
 # limitations under the License.
 
 import array
+import mmap
 import six.moves.cPickle as pickle
 import json
+import sys
 from collections import defaultdict
 from gzip import GzipFile
 from os.path import getmtime
@@ -32,14 +34,72 @@ from six.moves import range
 from swift.common.utils import hash_path, validate_configuration
 from swift.common.ring.utils import tiers_for_dev
 
+GZIP_MAGIC = b'\x1f\x8b'
+# Offsets of the partition tables in a v2 ring file are aligned to this many
+# bytes so they can be used directly out of a read-only memory map.
+V2_ALIGNMENT = 8
+# magic (4 bytes) + format version (2 bytes) + json length (4 bytes)
+V2_HEADER_SIZE = 10
+
+
+def _align(offset, alignment=V2_ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class _MappedPart2DevId(object):
+    """
+    Read-only, array-like view of a single replica's partition to device id
+    table inside a memory mapped v2 ring file. Only used on interpreters
+    whose memoryview cannot be cast to unsigned shorts.
+    """
+
+    _item = struct.Struct('=H')
+
+    def __init__(self, buf, offset, length):
+        self._buf = buf
+        self._offset = offset
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, part):
+        if part < 0:
+            part += self._length
+        if not 0 <= part < self._length:
+            raise IndexError('partition index out of range')
+        return self._item.unpack_from(self._buf, self._offset + 2 * part)[0]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return array.array('H', self.tobytes()).tolist()
+
+    def tobytes(self):
+        return self._buf[self._offset:self._offset + 2 * self._length]
+
+    tostring = tobytes
+
+
+def _mapped_part2dev_id(buf, offset, length):
+    if hasattr(memoryview, 'cast'):
+        return memoryview(buf)[offset:offset + 2 * length].cast('H')
+    return _MappedPart2DevId(buf, offset, length)
+
 
 class RingData(object):
     """Partitioned consistent hashing ring data (used for serialization)."""
 
-    def __init__(self, replica2part2dev_id, devs, part_shift):
+    def __init__(self, replica2part2dev_id, devs, part_shift,
+                 format_version=1):
         self.devs = devs
         self._replica2part2dev_id = replica2part2dev_id
         self._part_shift = part_shift
+        self.format_version = format_version
+        # Set when loaded from a v2 file, whose header records the ids of
+        # devices with at least one partition assigned.
+        self._assigned_dev_ids = None
 
         for dev in self.devs:
             if dev is not None:
@@ -76,14 +136,84 @@ class RingData(object):
         return ring_dict
 
     @classmethod
-    def load(cls, filename, metadata_only=False):
+    def deserialize_v2(cls, ring_file, metadata_only=False, use_mmap=False):
+        """
+        Deserialize a v2 ring file into a dictionary with `devs`,
+        `part_shift`, and `replica2part2dev_id` keys.
+
+        A v2 ring file is not compressed; the partition tables follow the
+        JSON header at aligned offsets so that they can either be read into
+        arrays or used in place from a read-only memory map, in which case
+        every process mapping the same file shares its page cache pages.
+
+        :param file ring_file: An opened file object which has already
+                               consumed the 6 bytes of magic and version.
+        :param bool metadata_only: If True, only load `devs` and `part_shift`
+        :param bool use_mmap: If True, the `replica2part2dev_id` entries are
+                              read-only views of a memory map of the file
+                              rather than arrays.
+        :returns: A dict containing `devs`, `part_shift`, and
+                  `replica2part2dev_id`
+        """
+
+        json_len, = struct.unpack('!I', ring_file.read(4))
+        ring_dict = json.loads(ring_file.read(json_len))
+        ring_dict['replica2part2dev_id'] = []
+
+        if metadata_only:
+            return ring_dict
+
+        offset = _align(V2_HEADER_SIZE + json_len)
+        swap_bytes = ring_dict['byteorder'] != sys.byteorder
+        if use_mmap and not swap_bytes and ring_dict['replica_lengths']:
+            buf = mmap.mmap(ring_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = None
+        for part_count in ring_dict['replica_lengths']:
+            if buf is not None:
+                part2dev_id = _mapped_part2dev_id(buf, offset, part_count)
+            else:
+                ring_file.seek(offset)
+                part2dev_id = array.array(
+                    'H', ring_file.read(2 * part_count))
+                if swap_bytes:
+                    part2dev_id.byteswap()
+            ring_dict['replica2part2dev_id'].append(part2dev_id)
+            offset = _align(offset + 2 * part_count)
+        return ring_dict
+
+    @classmethod
+    def load(cls, filename, metadata_only=False, use_mmap=False):
         """
         Load ring data from a file.
 
         :param filename: Path to a file serialized by the save() method.
         :param bool metadata_only: If True, only load `devs` and `part_shift`.
+        :param bool use_mmap: If True and the file is in the uncompressed v2
+                              format, map the partition tables read-only
+                              instead of copying them into memory.
         :returns: A RingData instance containing the loaded data.
         """
+        with open(filename, 'rb') as ring_file:
+            if ring_file.read(len(GZIP_MAGIC)) != GZIP_MAGIC:
+                ring_file.seek(0)
+                magic = ring_file.read(4)
+                format_version, = struct.unpack('!H', ring_file.read(2))
+                if magic != b'R1NG' or format_version != 2:
+                    raise Exception('Unknown ring format version %d' %
+                                    format_version)
+                ring_dict = cls.deserialize_v2(
+                    ring_file, metadata_only=metadata_only,
+                    use_mmap=use_mmap)
+                ring_data = RingData(ring_dict['replica2part2dev_id'],
+                                     ring_dict['devs'],
+                                     ring_dict['part_shift'],
+                                     format_version=2)
+                if 'assigned_dev_ids' in ring_dict:
+                    ring_data._assigned_dev_ids = set(
+                        ring_dict['assigned_dev_ids'])
+                return ring_data
+
         gz_file = GzipFile(filename, 'rb')
         # Python 2.6 GzipFile doesn't support BufferedIO
         if hasattr(gz_file, '_checkReadable'):
@@ -123,21 +253,59 @@ class RingData(object):
         for part2dev_id in ring['replica2part2dev_id']:
             file_obj.write(part2dev_id.tostring())
 
-    def save(self, filename, mtime=1300507380.0):
+    def serialize_v2(self, file_obj):
+        # Write out the uncompressed v2 magic and version; the partition
+        # tables are written in native byte order at aligned offsets.
+        file_obj.write(struct.pack('!4sH', 'R1NG', 2))
+        ring = self.to_dict()
+        assigned_dev_ids = set()
+        for part2dev_id in ring['replica2part2dev_id']:
+            assigned_dev_ids.update(part2dev_id)
+        json_encoder = json.JSONEncoder(sort_keys=True)
+        json_text = json_encoder.encode(
+            {'devs': ring['devs'], 'part_shift': ring['part_shift'],
+             'replica_count': len(ring['replica2part2dev_id']),
+             'replica_lengths': [len(part2dev_id) for part2dev_id
+                                 in ring['replica2part2dev_id']],
+             'assigned_dev_ids': sorted(assigned_dev_ids),
+             'byteorder': sys.byteorder})
+        json_len = len(json_text)
+        file_obj.write(struct.pack('!I', json_len))
+        file_obj.write(json_text)
+        offset = V2_HEADER_SIZE + json_len
+        for part2dev_id in ring['replica2part2dev_id']:
+            file_obj.write('\x00' * (_align(offset) - offset))
+            offset = _align(offset)
+            file_obj.write(array.array('H', part2dev_id).tostring())
+            offset += 2 * len(part2dev_id)
+
+    def save(self, filename, mtime=1300507380.0, format_version=None):
         """
         Serialize this RingData instance to disk.
 
         :param filename: File into which this instance should be serialized.
         :param mtime: time used to override mtime for gzip, default or None
                       if the caller wants to include time
+        :param format_version: on-disk format to write; 1 is gzipped, 2 is
+                               uncompressed and suitable for memory mapping.
+                               Defaults to this instance's format_version.
         """
-        # Override the timestamp so that the same ring data creates
-        # the same bytes on disk. This makes a checksum comparison a
-        # good way to see if two rings are identical.
+        if format_version is None:
+            format_version = self.format_version
+        if format_version not in (1, 2):
+            raise ValueError('Unknown ring format version %s' %
+                             format_version)
         tempf = NamedTemporaryFile(dir=".", prefix=filename, delete=False)
-        gz_file = GzipFile(filename, mode='wb', fileobj=tempf, mtime=mtime)
-        self.serialize_v1(gz_file)
-        gz_file.close()
+        if format_version == 2:
+            self.serialize_v2(tempf)
+        else:
+            # Override the timestamp so that the same ring data creates
+            # the same bytes on disk. This makes a checksum comparison a
+            # good way to see if two rings are identical.
+            gz_file = GzipFile(filename, mode='wb', fileobj=tempf,
+                               mtime=mtime)
+            self.serialize_v1(gz_file)
+            gz_file.close()
         tempf.flush()
         os.fsync(tempf.fileno())
         tempf.close()
@@ -154,11 +322,22 @@ class Ring(object):
     """
     Partitioned consistent hashing ring.
 
+    The primary node dicts of a partition are built once and shared by all
+    callers, and the partitions of accounts and containers are remembered,
+    so repeated lookups neither hash the path again nor copy node dicts.
+    Both caches hold at most nodes_cache_size entries and are dropped when
+    the ring is reloaded.
+
     :param serialized_path: path to serialized RingData instance
     :param reload_time: time interval in seconds to check for a ring change
+    :param ring_name: ring name, used to build the path of the ring file
+    :param nodes_cache_size: maximum number of partitions and of
+                             account/container paths to cache; 0 disables
+                             the caches
     """
 
-    def __init__(self, serialized_path, reload_time=15, ring_name=None):
+    def __init__(self, serialized_path, reload_time=15, ring_name=None,
+                 nodes_cache_size=10000):
         # can't use the ring unless HASH_PATH_SUFFIX is set
         validate_configuration()
         if ring_name:
@@ -167,12 +346,13 @@ class Ring(object):
         else:
             self.serialized_path = os.path.join(serialized_path)
         self.reload_time = reload_time
+        self.nodes_cache_size = nodes_cache_size
         self._reload(force=True)
 
     def _reload(self, force=False):
         self._rtime = time() + self.reload_time
         if force or self.has_changed():
-            ring_data = RingData.load(self.serialized_path)
+            ring_data = RingData.load(self.serialized_path, use_mmap=True)
             self._mtime = getmtime(self.serialized_path)
             self._devs = ring_data.devs
             # NOTE(akscram): Replication parameters like replication_ip
@@ -192,6 +372,10 @@ class Ring(object):
             self._replica2part2dev_id = ring_data._replica2part2dev_id
             self._part_shift = ring_data._part_shift
             self._rebuild_tier_data()
+            # partition -> tuple of primary node dicts
+            self._part_nodes_cache = {}
+            # (account, container) -> partition
+            self._part_cache = {}
 
             # Do this now, when we know the data has changed, rather than
             # doing it on every call to get_more_nodes().
@@ -200,11 +384,15 @@ class Ring(object):
             # consider devices with at least one partition assigned. This
             # way, a region, zone, or server with no partitions assigned
             # does not count toward our totals, thereby keeping the early
-            # bailouts in get_more_nodes() working.
-            dev_ids_with_parts = set()
-            for part2dev_id in self._replica2part2dev_id:
-                for dev_id in part2dev_id:
-                    dev_ids_with_parts.add(dev_id)
+            # bailouts in get_more_nodes() working. Memory mapped v2 rings
+            # carry the set in their header so the partition tables don't
+            # have to be walked (and paged in) on every reload.
+            dev_ids_with_parts = ring_data._assigned_dev_ids
+            if dev_ids_with_parts is None:
+                dev_ids_with_parts = set()
+                for part2dev_id in self._replica2part2dev_id:
+                    for dev_id in part2dev_id:
+                        dev_ids_with_parts.add(dev_id)
 
             regions = set()
             zones = set()
@@ -263,6 +451,9 @@ class Ring(object):
         return getmtime(self.serialized_path) != self._mtime
 
     def _get_part_nodes(self, part):
+        cached = self._part_nodes_cache.get(part)
+        if cached is not None:
+            return list(cached)
         part_nodes = []
         seen_ids = set()
         for r2p2d in self._replica2part2dev_id:
@@ -271,7 +462,13 @@ class Ring(object):
                 if dev_id not in seen_ids:
                     part_nodes.append(self.devs[dev_id])
                     seen_ids.add(dev_id)
-        return [dict(node, index=i) for i, node in enumerate(part_nodes)]
+        part_nodes = tuple(dict(node, index=i)
+                           for i, node in enumerate(part_nodes))
+        if self.nodes_cache_size:
+            if len(self._part_nodes_cache) >= self.nodes_cache_size:
+                self._part_nodes_cache.popitem()
+            self._part_nodes_cache[part] = part_nodes
+        return list(part_nodes)
 
     def get_part(self, account, container=None, obj=None):
         """
@@ -282,10 +479,20 @@ class Ring(object):
         :param obj: object name
         :returns: the partition number
         """
+        if obj is None and self.nodes_cache_size:
+            if time() > self._rtime:
+                self._reload()
+            part = self._part_cache.get((account, container))
+            if part is not None:
+                return part
         key = hash_path(account, container, obj, raw_digest=True)
         if time() > self._rtime:
             self._reload()
         part = struct.unpack_from('>I', key)[0] >> self._part_shift
+        if obj is None and self.nodes_cache_size:
+            if len(self._part_cache) >= self.nodes_cache_size:
+                self._part_cache.popitem()
+            self._part_cache[(account, container)] = part
         return part
 
     def get_part_nodes(self, part):
@@ -297,7 +504,8 @@ class Ring(object):
         :param part: partition to get nodes for
         :returns: list of node dicts
 
-        See :func:`get_nodes` for a description of the node dicts.
+        See :func:`get_nodes` for a description of the node dicts. The
+        node dicts are shared between callers and must not be modified.
         """
 
         if time() > self._rtime:
@@ -332,6 +540,8 @@ class Ring(object):
         meta    general use 'extra' field; for example: the online date, the
                 hardware description
         ======  ===============================================================
+
+        The node dicts are shared between callers and must not be modified.
         """
         part = self.get_part(account, container, obj)
         return part, self._get_part_nodes(part)
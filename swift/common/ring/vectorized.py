@@ -0,0 +1,199 @@
+# Copyright (c) 2016 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+NumPy backed helpers for the ring builder's "numpy" rebalance engine.
+
+The rebalance algorithm itself is unchanged; these functions replace the
+per part-replica Python scans with array operations. The gather phases use
+them to find the (usually small) set of partitions that can possibly need
+work and then run the regular per-partition logic on those partitions only,
+in the same order, so both engines produce identical assignments.
+"""
+
+import math
+
+from swift.common.ring.utils import tiers_for_dev
+
+NUMPY_INSTALLED = True
+try:
+    import numpy
+except ImportError:
+    NUMPY_INSTALLED = False
+
+# mirrors swift.common.ring.builder.NONE_DEV
+NONE_DEV = 2 ** 16 - 1
+# tiers are (region,), (region, zone), (region, zone, ip) and
+# (region, zone, ip, id)
+TIER_DEPTHS = 4
+
+
+def _as_numpy(part2dev):
+    return numpy.frombuffer(part2dev, dtype=numpy.uint16)
+
+
+def _replica_matrix(replica2part2dev, parts):
+    """
+    Returns a replicas x parts matrix of device ids; the tail of partial
+    replicas is filled with NONE_DEV.
+    """
+    matrix = numpy.full((len(replica2part2dev), parts), NONE_DEV,
+                        dtype=numpy.uint16)
+    for replica, part2dev in enumerate(replica2part2dev):
+        row = _as_numpy(part2dev)[:parts]
+        matrix[replica, :len(row)] = row
+    return matrix
+
+
+def _build_tier_index(devs):
+    """
+    Map every device id to an index per tier depth.
+
+    :returns: a list, per tier depth, of (dev_id -> tier index array, list of
+              tiers); NONE_DEV and missing devices map to -1.
+    """
+    tier_index = []
+    for depth in range(TIER_DEPTHS):
+        dev2tier = numpy.full(NONE_DEV + 1, -1, dtype=numpy.int32)
+        tiers = []
+        tier2idx = {}
+        for dev in devs:
+            if dev is None:
+                continue
+            tier = (dev.get('tiers') or tiers_for_dev(dev))[depth]
+            if tier not in tier2idx:
+                tier2idx[tier] = len(tiers)
+                tiers.append(tier)
+            dev2tier[dev['id']] = tier2idx[tier]
+        tier_index.append((dev2tier, tiers))
+    return tier_index
+
+
+def _replicas_at_tier(tier_matrix):
+    """
+    For every entry of a replicas x parts matrix of tier indexes, count the
+    replicas of the same part in the same tier. Also flag the first replica
+    of each (part, tier) so each pair can be counted once.
+    """
+    valid = tier_matrix >= 0
+    counts = numpy.zeros(tier_matrix.shape, dtype=numpy.int32)
+    first = valid.copy()
+    for replica in range(tier_matrix.shape[0]):
+        same = (tier_matrix == tier_matrix[replica]) & valid
+        counts[replica] = same.sum(axis=0)
+        first[replica] &= ~same[:replica].any(axis=0)
+    counts[~valid] = 0
+    return counts, first
+
+
+def _tier_limits(tiers, limits_by_tier):
+    return numpy.array([limits_by_tier[tier] for tier in tiers] or [0],
+                       dtype=numpy.float64)
+
+
+def _movable_parts(builder):
+    last_part_moves = numpy.frombuffer(builder._last_part_moves,
+                                       dtype=numpy.uint8)
+    return last_part_moves >= builder.min_part_hours
+
+
+def parts_for_dispersion(builder, replica_plan):
+    """
+    Returns, in ascending order, the partitions that may be moved and have
+    some replica in a tier holding more than the replica plan's max.
+    """
+    matrix = _replica_matrix(builder._replica2part2dev, builder.parts)
+    undispersed = numpy.zeros(builder.parts, dtype=bool)
+    for dev2tier, tiers in _build_tier_index(builder.devs):
+        tier_matrix = dev2tier[matrix]
+        counts, _first = _replicas_at_tier(tier_matrix)
+        max_replicas = _tier_limits(
+            tiers, dict((t, replica_plan[t]['max']) for t in tiers))
+        over = counts > max_replicas[numpy.maximum(tier_matrix, 0)]
+        undispersed |= over.any(axis=0)
+    undispersed &= _movable_parts(builder)
+    return numpy.flatnonzero(undispersed).tolist()
+
+
+def parts_on_overweight_devs(builder, start):
+    """
+    Returns the partitions that may be moved and have a replica on a device
+    that currently wants fewer partitions, in the order the balance gather
+    visits them: from start around the ring.
+
+    Devices only ever lose their overweight status while gathering, so this
+    is a superset of the partitions the gather will act on.
+    """
+    overweight = numpy.zeros(NONE_DEV + 1, dtype=bool)
+    for dev in builder._iter_devs():
+        if dev['parts_wanted'] < 0:
+            overweight[dev['id']] = True
+    matrix = _replica_matrix(builder._replica2part2dev, builder.parts)
+    candidates = overweight[matrix].any(axis=0) & _movable_parts(builder)
+    parts = numpy.flatnonzero(candidates)
+    return numpy.concatenate(
+        (parts[parts >= start], parts[parts < start])).tolist()
+
+
+def build_dispersion_graph(builder, old_replica2part2dev=None):
+    """
+    Array based equivalent of RingBuilder._build_dispersion_graph; sets the
+    builder's _dispersion_graph and dispersion and returns the number of
+    changed part-replicas.
+    """
+    old_replica2part2dev = old_replica2part2dev or []
+    replica2part2dev = builder._replica2part2dev or []
+    # like zip(*replica2part2dev), only parts every replica has are walked
+    walked_parts = min(len(p2d) for p2d in replica2part2dev) \
+        if replica2part2dev else 0
+    matrix = _replica_matrix(replica2part2dev, walked_parts)
+
+    changed_parts = 0
+    for replica in range(len(replica2part2dev)):
+        if replica >= len(old_replica2part2dev):
+            changed_parts += walked_parts
+            continue
+        old = _as_numpy(old_replica2part2dev[replica])[:walked_parts]
+        changed_parts += int(numpy.count_nonzero(
+            matrix[replica, :len(old)] != old))
+        changed_parts += walked_parts - len(old)
+
+    int_replicas = int(math.ceil(builder.replicas))
+    max_allowed_replicas = builder._build_max_replicas_by_tier()
+    at_risk = numpy.zeros(walked_parts, dtype=bool)
+    dispersion_graph = {}
+    for dev2tier, tiers in _build_tier_index(builder.devs):
+        tier_matrix = dev2tier[matrix]
+        counts, first = _replicas_at_tier(tier_matrix)
+        max_replicas = _tier_limits(tiers, max_allowed_replicas)
+        at_risk |= (counts > max_replicas[numpy.maximum(
+            tier_matrix, 0)]).any(axis=0)
+        histogram = numpy.bincount(
+            (tier_matrix[first] * (int_replicas + 1) +
+             counts[first]).astype(numpy.int64),
+            minlength=len(tiers) * (int_replicas + 1),
+        ).reshape(len(tiers), int_replicas + 1)
+        for tier_idx, tier in enumerate(tiers):
+            replica_counts = histogram[tier_idx].tolist()
+            placed = sum(replica_counts)
+            if not placed:
+                continue
+            replica_counts[0] = builder.parts - placed
+            dispersion_graph[tier] = replica_counts
+
+    builder._dispersion_graph = dispersion_graph
+    builder.dispersion = \
+        100.0 * int(numpy.count_nonzero(at_risk)) / builder.parts
+    return changed_parts
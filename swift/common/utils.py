@@ -93,6 +93,7 @@ _posix_fadvise = None
 _libc_socket = None
 _libc_bind = None
 _libc_accept = None
+_libc_send = None
 
 # If set to non-zero, fallocate routines will fail based on free space
 # available being at or below this amount, in bytes.
@@ -111,6 +112,7 @@ SWIFT_CONF_FILE = '/etc/swift/swift.conf'
 #
 # The values were copied from the Linux 3.0 kernel headers.
 AF_ALG = getattr(socket, 'AF_ALG', 38)
+MSG_MORE = getattr(socket, 'MSG_MORE', 0x8000)
 F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
 
 # Used by the parse_socket_string() function to validate IPv6 addresses
@@ -2826,6 +2828,62 @@ def dump_recon_cache(cache_dict, cache_file, logger, lock_timeout=2):
         logger.exception(_('Exception dumping recon cache'))
 
 
+def load_checkpoint(checkpoint_file, logger):
+    """
+    Load the progress a daemon saved with :func:`dump_checkpoint`.
+
+    :param checkpoint_file: the checkpoint file
+    :param logger: the logger to use to log an encountered error
+    :returns: the saved dict, or an empty dict if there is none
+    """
+    try:
+        with open(checkpoint_file) as f:
+            return json.load(f)
+    except IOError as err:
+        if err.errno != errno.ENOENT:
+            logger.exception(_('Error reading checkpoint %s'),
+                             checkpoint_file)
+    except ValueError:
+        logger.warning(_('Ignoring invalid checkpoint %s'), checkpoint_file)
+    return {}
+
+
+def dump_checkpoint(checkpoint, checkpoint_file, logger):
+    """
+    Atomically replace a daemon's checkpoint file; an empty checkpoint
+    removes the file.
+
+    :param checkpoint: JSON serializable dict of the progress to save
+    :param checkpoint_file: the checkpoint file
+    :param logger: the logger to use to log an encountered error
+    """
+    try:
+        if not checkpoint:
+            try:
+                os.unlink(checkpoint_file)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+            return
+        mkdirs(os.path.dirname(checkpoint_file))
+        tf = None
+        try:
+            with NamedTemporaryFile(dir=os.path.dirname(checkpoint_file),
+                                    delete=False) as tf:
+                tf.write(json.dumps(checkpoint) + '\n')
+            renamer(tf.name, checkpoint_file, fsync=False)
+        finally:
+            if tf is not None:
+                try:
+                    os.unlink(tf.name)
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        raise
+    except (Exception, Timeout):
+        logger.exception(_('Exception dumping checkpoint %s'),
+                         checkpoint_file)
+
+
 def listdir(path):
     try:
         return os.listdir(path)
@@ -3087,6 +3145,12 @@ class LRUCache(object):
         self.head[self.NEXT] = self.tail
 
     def set_cache(self, value, *key):
+        # unlink any previous (e.g. timed out) entry for this key so that it
+        # isn't left in the list to evict the new one's mapping later
+        link = self.mapping.pop(key, None)
+        if link is not None:
+            link[self.PREV][self.NEXT] = link[self.NEXT]
+            link[self.NEXT][self.PREV] = link[self.PREV]
         while len(self.mapping) >= self.maxsize:
             old_next, old_key = self.head[self.NEXT][self.NEXT:self.NEXT + 2]
             self.head[self.NEXT], old_next[self.PREV] = old_next, self.head
@@ -3961,3 +4025,128 @@ def get_md5_socket():
         raise IOError(ctypes.get_errno(), "Failed to accept MD5 socket")
 
     return md5_sockfd
+
+
+class MD5Socket(object):
+    """
+    A drop-in replacement for hashlib.md5 objects that has the kernel hash
+    the data through an AF_ALG socket (see :func:`get_md5_socket`).
+
+    Data is sent with MSG_MORE straight from the string's buffer, so the
+    hash stays open between updates and nothing is copied in userspace.
+    Reading the digest finalizes an AF_ALG hash, so :meth:`digest` works on
+    a clone of the hash state (an accept() on the operation socket) and the
+    object can still be updated afterwards, just like a hashlib object.
+
+    Each instance holds a file descriptor; it is closed by :meth:`close` or
+    when the object is garbage collected.
+    """
+
+    name = 'md5'
+    digest_size = 16
+    block_size = 64
+
+    def __init__(self, data=None, _fd=None):
+        global _libc_send
+
+        self._fd = None
+        # nothing is hashed until the first non-empty update
+        self._more = _fd is not None
+        if _libc_send is None:
+            _libc_send = load_libc_function('send', fail_if_missing=True)
+        self._fd = get_md5_socket() if _fd is None else _fd
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        length = len(data)
+        address = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+        sent = 0
+        while sent < length:
+            result = _libc_send(ctypes.c_int(self._fd),
+                                ctypes.c_void_p(address + sent),
+                                ctypes.c_size_t(length - sent),
+                                ctypes.c_int(MSG_MORE))
+            if result < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                raise IOError(err, "Failed to write to MD5 socket")
+            sent += result
+            self._more = True
+
+    def copy(self):
+        if not self._more:
+            return MD5Socket()
+        clone_fd = _libc_accept(ctypes.c_int(self._fd), None, 0)
+        if clone_fd < 0:
+            raise IOError(ctypes.get_errno(), "Failed to clone MD5 socket")
+        return MD5Socket(_fd=clone_fd)
+
+    def digest(self):
+        if not self._more:
+            return md5().digest()
+        clone = self.copy()
+        try:
+            return os.read(clone._fd, self.digest_size)
+        finally:
+            clone.close()
+
+    def hexdigest(self):
+        return self.digest().encode('hex') if six.PY2 else \
+            self.digest().hex()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self.close()
+
+
+_md5_socket_available = None
+
+
+def md5_socket_available():
+    """
+    Returns True if the kernel can hash MD5 through AF_ALG sockets; the
+    answer is probed once per process.
+    """
+    global _md5_socket_available
+
+    if _md5_socket_available is None:
+        try:
+            hasher = MD5Socket('probe')
+            _md5_socket_available = \
+                hasher.hexdigest() == md5('probe').hexdigest()
+            hasher.close()
+        except (IOError, OSError, AttributeError):
+            _md5_socket_available = False
+    return _md5_socket_available
+
+
+MD5_BACKENDS = ('hashlib', 'af_alg')
+
+
+def get_md5_hasher(backend='hashlib', logger=None):
+    """
+    Returns the constructor of hashlib.md5 compatible objects for the given
+    backend.
+
+    :param backend: 'hashlib' or 'af_alg'; 'af_alg' falls back to hashlib
+                    when the kernel does not provide AF_ALG MD5 sockets
+    :param logger: logger to report the fallback with
+    :raises ValueError: for an unknown backend
+    """
+    if backend not in MD5_BACKENDS:
+        raise ValueError('Unknown md5 backend %r, must be one of %s' % (
+            backend, ', '.join(MD5_BACKENDS)))
+    if backend == 'af_alg':
+        if md5_socket_available():
+            return MD5Socket
+        (logger or logging).warning(
+            _('AF_ALG MD5 sockets are not available, using hashlib'))
+    return md5
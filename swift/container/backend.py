@@ -17,12 +17,12 @@ Pluggable Back-ends for Container Server
 """
 
 import os
+from collections import defaultdict
 from uuid import uuid4
 import time
 
 import six
 import six.moves.cPickle as pickle
-from six.moves import range
 import sqlite3
 
 from swift.common.utils import Timestamp, encode_timestamps, decode_timestamps, \
@@ -74,6 +74,25 @@ POLICY_STAT_TRIGGER_SCRIPT = '''
     END;
 '''
 
+# The object_prefix table counts the live objects under every '/' terminated
+# prefix of their names, so '/' delimited listings can find the directories
+# below a prefix without walking all of the objects in them. depth is the
+# number of '/' in the prefix and leaf_count the number of objects directly
+# below it; the '' row holds the objects without any '/'.
+OBJECT_PREFIX_TABLE_SCRIPT = '''
+    CREATE TABLE IF NOT EXISTS object_prefix (
+        name TEXT,
+        storage_policy_index INTEGER DEFAULT 0,
+        depth INTEGER,
+        object_count INTEGER DEFAULT 0,
+        leaf_count INTEGER DEFAULT 0,
+        PRIMARY KEY (name, storage_policy_index)
+    );
+
+    CREATE INDEX IF NOT EXISTS ix_object_prefix_depth_name
+    ON object_prefix (storage_policy_index, depth, name);
+'''
+
 CONTAINER_INFO_TABLE_SCRIPT = '''
     CREATE TABLE container_info (
         account TEXT,
@@ -138,6 +157,33 @@ CONTAINER_STAT_VIEW_SCRIPT = '''
 '''
 
 
+def object_prefixes(name):
+    """
+    Yields every prefix of an object name that ends with a '/', shortest
+    first; these are the directories the object is listed under.
+
+    :param name: the object name
+    """
+    end = name.find('/')
+    while end >= 0:
+        yield name[:end + 1]
+        end = name.find('/', end + 1)
+
+
+def object_prefix_counts(name):
+    """
+    Yields the (prefix, object_count, leaf_count) increments a live object
+    adds to the object_prefix table.
+
+    :param name: the object name
+    """
+    parent = name[:name.rfind('/') + 1]
+    if not parent:
+        yield '', 0, 1
+    for prefix in object_prefixes(name):
+        yield prefix, 1, int(prefix == parent)
+
+
 def update_new_item_from_existing(new_item, existing):
     """
     Compare the data and meta related timestamps of a new object item with
@@ -227,6 +273,8 @@ class ContainerBroker(DatabaseBroker):
     db_type = 'container'
     db_contains_type = 'object'
     db_reclaim_timestamp = 'created_at'
+    #: Create the object_prefix table in new databases
+    create_prefix_index = False
 
     @property
     def storage_policy_index(self):
@@ -251,6 +299,8 @@ class ContainerBroker(DatabaseBroker):
         self.create_policy_stat_table(conn, storage_policy_index)
         self.create_container_info_table(conn, put_timestamp,
                                          storage_policy_index)
+        if self.create_prefix_index:
+            self.create_object_prefix_table(conn)
 
     def create_object_table(self, conn):
         """
@@ -332,6 +382,112 @@ class ContainerBroker(DatabaseBroker):
             VALUES (?)
         """, (storage_policy_index,))
 
+    def create_object_prefix_table(self, conn):
+        """
+        Create the object_prefix table used for '/' delimited listings.
+
+        :param conn: DB connection object
+        """
+        conn.executescript(OBJECT_PREFIX_TABLE_SCRIPT)
+        self._has_prefix_index = True
+
+    def has_prefix_index(self, conn):
+        """
+        Returns True if the database has an object_prefix table.
+
+        :param conn: DB connection object
+        """
+        if getattr(self, '_has_prefix_index', None) is None:
+            self._has_prefix_index = conn.execute('''
+                SELECT count(*) FROM sqlite_master
+                WHERE type = 'table' AND name = 'object_prefix'
+            ''').fetchone()[0] > 0
+        return self._has_prefix_index
+
+    def _update_prefix_counts(self, curs, deltas):
+        """
+        Apply object count changes to the object_prefix table and drop the
+        prefixes that no longer have any live objects.
+
+        :param curs: DB cursor inside the merging transaction
+        :param deltas: dict mapping (prefix, storage_policy_index) to the
+                       [object_count, leaf_count] changes
+        """
+        changed = [(objects, leaves, prefix, policy_index)
+                   for (prefix, policy_index), (objects, leaves)
+                   in deltas.items() if objects or leaves]
+        if not changed:
+            return
+        curs.executemany('''
+            INSERT OR IGNORE INTO object_prefix
+                (name, storage_policy_index, depth)
+            VALUES (?, ?, ?)
+        ''', ((prefix, policy_index, prefix.count('/'))
+              for _objects, _leaves, prefix, policy_index in changed))
+        curs.executemany('''
+            UPDATE object_prefix SET object_count = object_count + ?,
+                leaf_count = leaf_count + ?
+            WHERE name = ? AND storage_policy_index = ?
+        ''', changed)
+        curs.executemany('''
+            DELETE FROM object_prefix
+            WHERE name = ? AND storage_policy_index = ?
+            AND object_count <= 0 AND leaf_count <= 0
+        ''', ((prefix, policy_index)
+              for objects, leaves, prefix, policy_index in changed
+              if objects < 0 or leaves < 0))
+
+    def build_prefix_index(self):
+        """
+        Create the object_prefix table if needed and (re)build it from the
+        live rows of the object table.
+
+        :returns: the number of prefixes in the index
+        """
+        self._commit_puts_stale_ok()
+        with self.get() as conn:
+            try:
+                rows = conn.execute('''
+                    SELECT name, storage_policy_index FROM object
+                    WHERE deleted = 0
+                ''')
+            except sqlite3.OperationalError as err:
+                if 'no such column: storage_policy_index' not in str(err):
+                    raise
+                self._migrate_add_storage_policy(conn)
+                rows = conn.execute('''
+                    SELECT name, storage_policy_index FROM object
+                    WHERE deleted = 0
+                ''')
+            counts = defaultdict(lambda: [0, 0])
+            for name, policy_index in rows:
+                for prefix, objects, leaves in object_prefix_counts(name):
+                    count = counts[(prefix, policy_index)]
+                    count[0] += objects
+                    count[1] += leaves
+            self.create_object_prefix_table(conn)
+            curs = conn.cursor()
+            curs.execute('BEGIN IMMEDIATE')
+            curs.execute('DELETE FROM object_prefix')
+            curs.executemany('''
+                INSERT INTO object_prefix (name, storage_policy_index, depth,
+                                           object_count, leaf_count)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ((prefix, policy_index, prefix.count('/'), objects, leaves)
+                  for (prefix, policy_index), (objects, leaves)
+                  in counts.items()))
+            conn.commit()
+        return len(counts)
+
+    def drop_prefix_index(self):
+        """
+        Remove the object_prefix table; listings fall back to walking the
+        object table.
+        """
+        with self.get() as conn:
+            conn.executescript('DROP TABLE IF EXISTS object_prefix;')
+        self._has_prefix_index = False
+
     def get_db_version(self, conn):
         if self._db_version == -1:
             self._db_version = 0
@@ -681,6 +837,12 @@ class ContainerBroker(DatabaseBroker):
         (marker, end_marker, prefix, delimiter, path) = utf8encode(
             marker, end_marker, prefix, delimiter, path)
         self._commit_puts_stale_ok()
+        if delimiter == '/' and path is None and not reverse and limit > 0:
+            with self.get() as conn:
+                if self.has_prefix_index(conn):
+                    return self._list_objects_by_prefix(
+                        conn, limit, marker, end_marker, prefix or '',
+                        storage_policy_index)
         if reverse:
             # Reverse the markers if we are reversing the listing.
             marker, end_marker = end_marker, marker
@@ -793,6 +955,114 @@ class ContainerBroker(DatabaseBroker):
                     break
             return results
 
+    def _list_objects_by_prefix(self, conn, limit, marker, end_marker, prefix,
+                                storage_policy_index):
+        """
+        '/' delimited listing using the object_prefix table; returns the same
+        entries list_objects_iter would.
+
+        The directories directly below the prefix come from the index and
+        every live object between two of them is listed as is, so the object
+        table is only read for the entries that are returned.
+        """
+        if prefix:
+            end_prefix = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        else:
+            end_prefix = None
+        upper = end_prefix
+        if end_marker and (end_prefix is None or end_marker < end_prefix):
+            upper = end_marker
+        if marker and marker >= prefix:
+            lower, lower_op = marker, '>'
+        else:
+            lower, lower_op = prefix, '>='
+        if upper is not None and lower >= upper:
+            return []
+
+        def objects_between(lower, lower_op, upper, limit):
+            query = '''SELECT name, created_at, size, content_type, etag
+                       FROM object WHERE name %s ?''' % lower_op
+            query_args = [lower]
+            if upper is not None:
+                query += ' AND name < ?'
+                query_args.append(upper)
+            query += ''' AND deleted = 0 AND storage_policy_index = ?
+                         ORDER BY name LIMIT ?'''
+            query_args.extend([storage_policy_index, limit])
+            curs = conn.execute(query, query_args)
+            curs.row_factory = None
+            return curs.fetchall()
+
+        def dir_is_listed(dir_name):
+            # only directories cut by the marker or end marker can be empty
+            dir_end = dir_name[:-1] + chr(ord('/') + 1)
+            if marker > dir_name:
+                start, start_op = marker, '>'
+            elif upper is None or dir_end <= upper:
+                return True
+            else:
+                start, start_op = dir_name, '>='
+            if upper is not None and upper < dir_end:
+                dir_end = upper
+            return bool(objects_between(start, start_op, dir_end, 1))
+
+        dirs = []
+        # the directory holding the marker, if the marker is inside one; it
+        # is not listed when it is the marker itself
+        end = marker.find('/', len(prefix)) if lower_op == '>' else -1
+        if end > 0:
+            marker_dir = marker[:end + 1]
+            if marker_dir != marker and dir_is_listed(marker_dir):
+                dirs.append(marker_dir)
+            else:
+                lower, lower_op = marker_dir[:-1] + chr(ord('/') + 1), '>='
+        query = '''SELECT name FROM object_prefix
+                   WHERE storage_policy_index = ? AND depth = ?
+                   AND name %s ? AND object_count > 0''' % lower_op
+        query_args = [storage_policy_index, prefix.count('/') + 1, lower]
+        if upper is not None:
+            query += ' AND name < ?'
+            query_args.append(upper)
+        query += ' ORDER BY name LIMIT ?'
+        query_args.append(limit)
+        # how many objects are listed between the directories, if known
+        leaves_left = None
+        if not prefix or prefix.endswith('/'):
+            leaves_left = 0
+            for (leaf_count,) in conn.execute('''
+                    SELECT leaf_count FROM object_prefix
+                    WHERE name = ? AND storage_policy_index = ?
+                    ''', (prefix, storage_policy_index)):
+                leaves_left = leaf_count
+            if leaves_left and marker and marker >= prefix:
+                # some of them may be before the marker
+                leaves_left = None
+        for (dir_name,) in conn.execute(query, query_args).fetchall():
+            # names starting with '/' are not under a directory when
+            # listing without a prefix
+            if dir_name == '/':
+                leaves_left = None
+                continue
+            if dir_name == marker:
+                continue
+            if dir_is_listed(dir_name):
+                dirs.append(dir_name)
+
+        results = []
+        for dir_name in dirs + [None]:
+            gap_upper = upper if dir_name is None else dir_name
+            if leaves_left != 0 and (gap_upper is None or lower < gap_upper):
+                leaves = objects_between(lower, lower_op, gap_upper,
+                                         limit - len(results))
+                if leaves_left is not None:
+                    leaves_left -= len(leaves)
+                results.extend(self._transform_record(row) for row in leaves)
+            if dir_name is None or len(results) >= limit:
+                break
+            results.append([dir_name, '0', 0, None, ''])
+            lower, lower_op = dir_name[:-1] + chr(ord('/') + 1), '>='
+        return results[:limit]
+
     def _transform_record(self, record):
         """
         Decode the created_at timestamp into separate data, content-type and
@@ -822,6 +1092,53 @@ class ContainerBroker(DatabaseBroker):
         for item in item_list:
             if isinstance(item['name'], six.text_type):
                 item['name'] = item['name'].encode('utf-8')
+            item.setdefault('storage_policy_index', 0)  # legacy
+
+        def _select_existing_staged(curs, query_mod):
+            # Stage the names in a temp table and find the existing records
+            # with a single join rather than one IN query per
+            # SQLITE_ARG_LIMIT items. CROSS JOIN keeps sqlite from choosing
+            # the unindexed staging table as the inner loop.
+            curs.execute('CREATE TEMP TABLE IF NOT EXISTS merge_staging '
+                         '(name TEXT, policy_index INTEGER)')
+            curs.execute('DELETE FROM merge_staging')
+            curs.executemany(
+                'INSERT INTO merge_staging (name, policy_index) '
+                'VALUES (?, ?)',
+                ((rec['name'], rec['storage_policy_index'])
+                 for rec in item_list))
+            records = {}
+            rowids = {}
+            for row in curs.execute(
+                    'SELECT object.ROWID, object.name, created_at, size, '
+                    'content_type, etag, deleted, storage_policy_index '
+                    'FROM merge_staging CROSS JOIN object ON ' + query_mod +
+                    ' object.name = merge_staging.name AND '
+                    'storage_policy_index = merge_staging.policy_index'):
+                row = tuple(row)
+                records[(row[1], row[7])] = row[1:]
+                rowids[(row[1], row[7])] = row[0]
+            curs.execute('DELETE FROM merge_staging')
+            return records, rowids
+
+        def _prefix_deltas(records, to_delete, to_add):
+            deltas = defaultdict(lambda: [0, 0])
+
+            def add(name, policy_index, sign):
+                for prefix, objects, leaves in object_prefix_counts(name):
+                    delta = deltas[(prefix, policy_index)]
+                    delta[0] += sign * objects
+                    delta[1] += sign * leaves
+
+            for item_ident in to_delete:
+                name, deleted, policy_index = (
+                    records[item_ident][i] for i in (0, 5, 6))
+                if not int(deleted):
+                    add(name, policy_index, -1)
+            for item in to_add.values():
+                if not int(item['deleted']):
+                    add(item['name'], item['storage_policy_index'], 1)
+            return deltas
 
         def _really_merge_items(conn):
             curs = conn.cursor()
@@ -829,25 +1146,28 @@ class ContainerBroker(DatabaseBroker):
                 query_mod = ' deleted IN (0, 1) AND '
             else:
                 query_mod = ''
+            prefix_index = self.has_prefix_index(conn)
             curs.execute('BEGIN IMMEDIATE')
-            # Get sqlite records for objects in item_list that already exist.
-            # We must chunk it up to avoid sqlite's limit of 999 args.
-            records = {}
-            for offset in range(0, len(item_list), SQLITE_ARG_LIMIT):
-                chunk = [rec['name'] for rec in
-                         item_list[offset:offset + SQLITE_ARG_LIMIT]]
-                records.update(
-                    ((rec[0], rec[6]), rec) for rec in curs.execute(
-                        'SELECT name, created_at, size, content_type,'
-                        'etag, deleted, storage_policy_index '
-                        'FROM object WHERE ' + query_mod + ' name IN (%s)' %
-                        ','.join('?' * len(chunk)), chunk))
+            if len(item_list) > SQLITE_ARG_LIMIT:
+                records, rowids = _select_existing_staged(curs, query_mod)
+            else:
+                # Get sqlite records for objects in item_list that already
+                # exist.
+                records = {}
+                rowids = None
+                if item_list:
+                    records.update(
+                        ((rec[0], rec[6]), rec) for rec in curs.execute(
+                            'SELECT name, created_at, size, content_type,'
+                            'etag, deleted, storage_policy_index '
+                            'FROM object WHERE ' + query_mod +
+                            ' name IN (%s)' % ','.join('?' * len(item_list)),
+                            [rec['name'] for rec in item_list]))
             # Sort item_list into things that need adding and deleting, based
             # on results of created_at query.
             to_delete = {}
             to_add = {}
             for item in item_list:
-                item.setdefault('storage_policy_index', 0)  # legacy
                 item_ident = (item['name'], item['storage_policy_index'])
                 existing = self._record_to_dict(records.get(item_ident))
                 if update_new_item_from_existing(item, existing):
@@ -856,7 +1176,11 @@ class ContainerBroker(DatabaseBroker):
                     if item_ident in to_add:  # duplicate entries in item_list
                         update_new_item_from_existing(item, to_add[item_ident])
                     to_add[item_ident] = item
-            if to_delete:
+            if to_delete and rowids is not None:
+                curs.executemany(
+                    'DELETE FROM object WHERE ROWID=?',
+                    ((rowids[item_ident],) for item_ident in to_delete))
+            elif to_delete:
                 curs.executemany(
                     'DELETE FROM object WHERE ' + query_mod +
                     'name=? AND storage_policy_index=?',
@@ -871,6 +1195,9 @@ class ContainerBroker(DatabaseBroker):
                       rec['content_type'], rec['etag'], rec['deleted'],
                       rec['storage_policy_index'])
                      for rec in to_add.itervalues()))
+            if prefix_index:
+                self._update_prefix_counts(
+                    curs, _prefix_deltas(records, to_delete, to_add))
             if source:
                 # for replication we rely on the remote end sending merges in
                 # order with no gaps to increment sync_points
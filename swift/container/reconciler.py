@@ -11,13 +11,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import signal
+import sys
 import time
 from collections import defaultdict
 import socket
 import itertools
 import logging
+from hashlib import md5
 
-from eventlet import GreenPile, GreenPool, Timeout
+from eventlet import GreenPile, GreenPool, Timeout, patcher
+import six
 
 from swift.common import constraints
 from swift.common.daemon import Daemon
@@ -27,7 +32,8 @@ from swift.common.direct_client import (
 from swift.common.internal_client import InternalClient, UnexpectedResponse
 from swift.common.utils import get_logger, split_path, quorum_size, \
     FileLikeIter, Timestamp, last_modified_date_to_timestamp, \
-    LRUCache, decode_timestamps
+    LRUCache, decode_timestamps, dump_recon_cache, load_checkpoint, \
+    dump_checkpoint
 
 MISPLACED_OBJECTS_ACCOUNT = '.misplaced_objects'
 MISPLACED_OBJECTS_CONTAINER_DIVISOR = 3600  # 1 hour
@@ -333,6 +339,14 @@ def direct_delete_container_entry(container_ring, account_name, container_name,
 class ContainerReconciler(Daemon):
     """
     Move objects that are in the wrong storage policy.
+
+    With ``processes`` set to more than one, each pass forks that many
+    workers; every queue entry is handled by exactly one of them, picked by
+    the hash of its name. Each worker works through its entries with up to
+    ``concurrency`` green threads and every ``checkpoint_interval`` entries
+    saves the queue position it reached, so a restarted reconciler resumes
+    where the interrupted pass stopped instead of listing the whole queue
+    again.
     """
 
     def __init__(self, conf):
@@ -346,6 +360,12 @@ class ContainerReconciler(Daemon):
         self.swift = InternalClient(conf_path,
                                     'Swift Container Reconciler',
                                     request_tries)
+        self.processes = int(conf.get('processes', 0))
+        self.concurrency = int(conf.get('concurrency', 1))
+        self.checkpoint_interval = int(conf.get('checkpoint_interval', 1000))
+        self.recon_cache_path = conf.get('recon_cache_path',
+                                         '/var/cache/swift')
+        self.rcache = os.path.join(self.recon_cache_path, 'container.recon')
         self.stats = defaultdict(int)
         self.last_stat_time = time.time()
 
@@ -686,11 +706,12 @@ class ContainerReconciler(Daemon):
                     continue  # we've already hit this one this pass
                 yield container
 
-    def _iter_objects(self, container):
+    def _iter_objects(self, container, marker=''):
         """
         Generate a list of objects to process.
 
         :param container: the name of the container to process
+        :param marker: only objects after this name are listed
 
         If the given container is empty and older than reclaim_age this
         processor will attempt to reap it.
@@ -699,53 +720,150 @@ class ContainerReconciler(Daemon):
         found_obj = False
         try:
             for raw_obj in self.swift.iter_objects(
-                    MISPLACED_OBJECTS_ACCOUNT, container):
+                    MISPLACED_OBJECTS_ACCOUNT, container, marker=marker):
                 found_obj = True
                 yield raw_obj
         except UnexpectedResponse as err:
             self.logger.error('Error listing objects in container %s (%s)',
                               container, err)
         if float(container) < time.time() - self.reclaim_age and \
-                not found_obj:
+                not found_obj and not marker:
             # Try to delete old empty containers so the queue doesn't
             # grow without bound. It's ok if there's a conflict.
             self.swift.delete_container(
                 MISPLACED_OBJECTS_ACCOUNT, container,
                 acceptable_statuses=(2, 404, 409, 412))
 
-    def reconcile(self):
+    def _checkpoint_file(self, process):
+        return os.path.join(self.recon_cache_path,
+                            'container-reconciler-%d.checkpoint' % process)
+
+    def is_process_entry(self, container, obj, process):
+        """
+        Returns True if the queue entry is handled by the given worker
+        process.
+        """
+        if self.processes <= 1:
+            return True
+        if isinstance(obj, six.text_type):
+            obj = obj.encode('utf-8')
+        entry_hash = md5('%s/%s' % (container, obj)).hexdigest()
+        return int(entry_hash, 16) % self.processes == process
+
+    def reconcile_entry(self, container, raw_obj):
+        """
+        Reconcile one queue entry and pop it from the queue once it is
+        fully processed.
+        """
+        try:
+            obj_info = parse_raw_obj(raw_obj)
+        except Exception:
+            self.stats_log('invalid_record',
+                           'invalid queue record: %r', raw_obj,
+                           level=logging.ERROR, exc_info=True)
+            return
+        finished = self.reconcile_object(obj_info)
+        if finished:
+            self.pop_queue(container, raw_obj['name'],
+                           obj_info['q_ts'],
+                           obj_info['q_record'])
+
+    def reconcile(self, process=0):
         """
         Main entry point for processing misplaced objects.
 
         Iterate over all queue entries and delegate to reconcile_object.
+
+        :param process: the index of the worker process; only the queue
+                        entries belonging to it are handled
         """
         self.logger.debug('pulling items from the queue')
+        checkpoint_file = self._checkpoint_file(process)
+        checkpoint = load_checkpoint(checkpoint_file, self.logger)
+        done = set(checkpoint.get('done', []))
+        if checkpoint:
+            self.logger.info('resuming from checkpoint %s', checkpoint_file)
+        pool = GreenPool(max(self.concurrency, 1))
         for container in self._iter_containers():
-            for raw_obj in self._iter_objects(container):
-                try:
-                    obj_info = parse_raw_obj(raw_obj)
-                except Exception:
-                    self.stats_log('invalid_record',
-                                   'invalid queue record: %r', raw_obj,
-                                   level=logging.ERROR, exc_info=True)
+            if container in done:
+                continue
+            marker = ''
+            if container == checkpoint.get('container'):
+                marker = checkpoint.get('marker', '').encode('utf8')
+            since_checkpoint = 0
+            for raw_obj in self._iter_objects(container, marker):
+                if not self.is_process_entry(container, raw_obj['name'],
+                                             process):
                     continue
-                finished = self.reconcile_object(obj_info)
-                if finished:
-                    self.pop_queue(container, raw_obj['name'],
-                                   obj_info['q_ts'],
-                                   obj_info['q_record'])
+                pool.spawn(self.reconcile_entry, container, raw_obj)
+                since_checkpoint += 1
+                if self.checkpoint_interval and \
+                        since_checkpoint >= self.checkpoint_interval:
+                    # only entries that are finished may be skipped when
+                    # resuming
+                    pool.waitall()
+                    dump_checkpoint({'done': sorted(done),
+                                     'container': container,
+                                     'marker': raw_obj['name']},
+                                    checkpoint_file, self.logger)
+                    since_checkpoint = 0
+            pool.waitall()
+            done.add(container)
+            if self.checkpoint_interval:
+                dump_checkpoint({'done': sorted(done)}, checkpoint_file,
+                                self.logger)
             self.log_stats()
             self.logger.debug('finished container %s', container)
+        # the pass is complete, the next one starts from the beginning
+        dump_checkpoint({}, checkpoint_file, self.logger)
 
-    def run_once(self, *args, **kwargs):
+    def reconcile_process(self, process=0):
         """
-        Process every entry in the queue.
+        Run one pass of a worker process and report its throughput to recon.
         """
+        begin = time.time()
         try:
-            self.reconcile()
+            self.reconcile(process)
         except:  # noqa
             self.logger.exception('Unhandled Exception trying to reconcile')
         self.log_stats(force=True)
+        elapsed = time.time() - begin
+        entries = sum(self.stats[metric] for metric in
+                      ('success', 'retry', 'invalid_record'))
+        dump_recon_cache({'container_reconciler_stats': {str(process): {
+            'entries': entries,
+            'success': self.stats['success'],
+            'retry': self.stats['retry'],
+            'elapsed': elapsed,
+            'entries_per_second': entries / elapsed if elapsed else 0.0,
+            'time': time.time(),
+        }}}, self.rcache, self.logger)
+
+    def run_once(self, *args, **kwargs):
+        """
+        Process every entry in the queue.
+        """
+        begin = time.time()
+        if self.processes > 1:
+            pids = []
+            for process in range(self.processes):
+                pid = os.fork()
+                if pid:
+                    pids.append(pid)
+                else:
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    patcher.monkey_patch(all=False, socket=True, thread=True)
+                    self.stats = defaultdict(int)
+                    self.reconcile_process(process)
+                    sys.exit()
+            for pid in pids:
+                os.waitpid(pid, 0)
+        else:
+            self.reconcile_process()
+        elapsed = time.time() - begin
+        self.logger.info('Reconciler pass completed: %.02fs', elapsed)
+        dump_recon_cache({'container_reconciler_pass': elapsed},
+                         self.rcache, self.logger)
 
     def run_forever(self, *args, **kwargs):
         while True:
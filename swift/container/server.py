@@ -112,6 +112,11 @@ class ContainerController(BaseStorageServer):
             self.save_headers.append('x-versions-location')
         swift.common.db.DB_PREALLOCATION = \
             config_true_value(conf.get('db_preallocation', 'f'))
+        #: Whether new container DBs get an object_prefix table to speed up
+        #: '/' delimited listings; existing DBs can be indexed offline with
+        #: swift.cli.container_prefix_index.
+        self.create_prefix_index = \
+            config_true_value(conf.get('create_prefix_index', 'f'))
         self.sync_store = ContainerSyncStore(self.root,
                                              self.logger,
                                              self.mount_check)
@@ -132,7 +137,9 @@ class ContainerController(BaseStorageServer):
         kwargs.setdefault('account', account)
         kwargs.setdefault('container', container)
         kwargs.setdefault('logger', self.logger)
-        return ContainerBroker(db_path, **kwargs)
+        broker = ContainerBroker(db_path, **kwargs)
+        broker.create_prefix_index = self.create_prefix_index
+        return broker
 
     def get_and_validate_policy_index(self, req):
         """
@@ -26,9 +26,12 @@
 
 from six.moves.urllib.parse import quote
 
+import collections
 import os
 import time
 import functools
+import random
+from copy import deepcopy
 import inspect
 import itertools
 import operator
@@ -43,7 +46,7 @@ from swift.common.wsgi import make_pre_authed_env
 from swift.common.utils import Timestamp, config_true_value, \
     public, split_path, list_from_csv, GreenthreadSafeIterator, \
     GreenAsyncPile, quorum_size, parse_content_type, \
-    document_iters_to_http_response_body
+    document_iters_to_http_response_body, LRUCache
 from swift.common.bufferedhttp import http_connect
 from swift.common.exceptions import ChunkReadTimeout, ChunkWriteTimeout, \
     ConnectionTimeout, RangeAlreadyComplete
@@ -330,6 +333,183 @@ def get_account_info(env, app, swift_source=None):
     return info
 
 
+class InfoCache(object):
+    """
+    Bounded, per-worker LRU cache of account and container info dicts that
+    sits in front of memcache.
+
+    Entries live for at most ttl seconds (negative_ttl for 404 infos), less
+    a random jitter so that workers don't all go back to memcache at once.
+    Since other workers and proxies only see changes once their entries
+    expire, ttl bounds how long stale ACLs and quotas may be served.
+
+    :param maxsize: maximum number of info dicts to keep
+    :param ttl: seconds to keep an info dict for
+    :param negative_ttl: seconds to keep the info of a missing account or
+                         container for
+    :param jitter: fraction of the ttl to randomly shorten each entry by
+    :param logger: logger used to report info_cache hit/miss metrics
+    """
+
+    def __init__(self, maxsize=1000, ttl=5.0, negative_ttl=1.0, jitter=0.2,
+                 logger=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.jitter = jitter
+        self.logger = logger
+        self._lru = LRUCache(maxsize=maxsize, maxtime=max(ttl, negative_ttl))
+
+    def _increment(self, cache_key, result):
+        if self.logger:
+            self.logger.increment('info_cache.%s.%s' % (
+                cache_key.split('/', 1)[0], result))
+
+    def get(self, cache_key):
+        """
+        :param cache_key: the memcache key of the info
+        :returns: a copy of the cached info dict or None
+        """
+        link = self._lru.mapping.get((cache_key,))
+        if link is not None:
+            try:
+                expires_at, info = self._lru.get_cached(link, cache_key)
+            except KeyError:
+                pass
+            else:
+                if expires_at > time.time():
+                    self._increment(cache_key, 'hit')
+                    return deepcopy(info)
+        self._increment(cache_key, 'miss')
+        return None
+
+    def set(self, cache_key, info):
+        """
+        :param cache_key: the memcache key of the info
+        :param info: the info dict to cache (a copy is stored)
+        """
+        if info.get('status') == HTTP_NOT_FOUND:
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        ttl *= 1 - random.random() * self.jitter
+        self._lru.set_cache((time.time() + ttl, deepcopy(info)), cache_key)
+
+    def invalidate(self, cache_key):
+        """
+        :param cache_key: the memcache key of the info to drop
+        """
+        if (cache_key,) in self._lru.mapping:
+            self._lru.set_cache((0, None), cache_key)
+
+
+class NodeScores(object):
+    """
+    Per-worker, exponentially decaying latency and error scores of backend
+    devices, used by the "score" sorting_method.
+
+    Every response time and error of a device is weighted by how recent it
+    is; a sample loses half its weight every half_life seconds. The score of
+    a device is its weighted mean response time plus error_penalty seconds
+    per (decayed) error, scaled down while the device has few recent
+    samples, so a device that was slow once gets tried again later and
+    devices without samples sort first.
+
+    The most recent response times of each server type are also kept to
+    derive the delay after which a concurrent GET asks the next node (see
+    :meth:`percentile`).
+
+    :param half_life: seconds after which a sample has half its weight
+    :param error_penalty: seconds added to a device's score per error
+    :param sample_size: number of recent response times kept per server
+                        type for percentiles
+    """
+
+    def __init__(self, half_life=60.0, error_penalty=1.0, sample_size=1000):
+        self.half_life = half_life
+        self.error_penalty = error_penalty
+        # device key -> [last update, weight, weighted latency, errors]
+        self._scores = {}
+        self.sample_size = sample_size
+        # server type -> [recent timings, samples since last percentiles,
+        #                 {percent: timing}]
+        self._samples = {}
+
+    def _key(self, node):
+        return (node['ip'], node['port'], node['device'])
+
+    def _decayed(self, key, now):
+        entry = self._scores.get(key)
+        if entry is None:
+            entry = self._scores[key] = [now, 0.0, 0.0, 0.0]
+        elif now > entry[0]:
+            factor = 0.5 ** ((now - entry[0]) / self.half_life)
+            entry[0] = now
+            entry[1] *= factor
+            entry[2] *= factor
+            entry[3] *= factor
+        return entry
+
+    def record_timing(self, node, timing, server_type):
+        """
+        Add the time it took a device to respond.
+        """
+        entry = self._decayed(self._key(node), time.time())
+        entry[1] += 1.0
+        entry[2] += timing
+        samples = self._samples.get(server_type)
+        if samples is None:
+            samples = self._samples[server_type] = [
+                collections.deque(maxlen=self.sample_size), 0, {}]
+        samples[0].append(timing)
+        samples[1] += 1
+
+    def record_error(self, node):
+        """
+        Add an error (or timeout) of a device.
+        """
+        entry = self._decayed(self._key(node), time.time())
+        entry[3] += 1.0
+
+    def score(self, node, now=None):
+        """
+        Returns the expected cost in seconds of sending a request to the
+        device; lower is better.
+        """
+        key = self._key(node)
+        if key not in self._scores:
+            return 0.0
+        weight, latency, errors = \
+            self._decayed(key, now or time.time())[1:]
+        score = errors * self.error_penalty
+        if weight:
+            score += latency / weight * min(weight, 1.0)
+        return score
+
+    def sort_key(self, now=None):
+        now = now or time.time()
+        return lambda node: self.score(node, now)
+
+    def percentile(self, percent, server_type):
+        """
+        Returns the given percentile of the recent response times of a
+        server type, or None while there are fewer than 100 samples. The
+        percentiles are only recomputed every 100 samples.
+        """
+        samples = self._samples.get(server_type)
+        if samples is None or len(samples[0]) < 100:
+            return None
+        timings, since_percentiles, percentiles = samples
+        if since_percentiles >= 100:
+            percentiles.clear()
+            samples[1] = 0
+        if percent not in percentiles:
+            ordered = sorted(timings)
+            index = min(int(len(ordered) * percent / 100.0),
+                        len(ordered) - 1)
+            percentiles[percent] = ordered[index]
+        return percentiles[percent]
+
+
 def _get_cache_key(account, container):
     """
     Get the keys for both memcache (cache_key) and env (env_key)
@@ -396,12 +576,15 @@ def _set_info_cache(app, env, account, container, resp):
     else:
         cache_time = None
 
-    # Next actually set both memcache and the env cache
+    # Next actually set memcache, the worker's info cache and the env cache
     memcache = getattr(app, 'memcache', None) or env.get('swift.cache')
+    info_cache = getattr(app, 'info_cache', None)
     if not cache_time:
         env.pop(env_key, None)
         if memcache:
             memcache.delete(cache_key)
+        if info_cache:
+            info_cache.invalidate(cache_key)
         return
 
     if container:
@@ -410,6 +593,8 @@ def _set_info_cache(app, env, account, container, resp):
         info = headers_to_account_info(resp.headers, resp.status_int)
     if memcache:
         memcache.set(cache_key, info, time=cache_time)
+    if info_cache:
+        info_cache.set(cache_key, info)
     env[env_key] = info
 
 
@@ -452,12 +637,32 @@ def clear_info_cache(app, env, account, container=None):
     _set_info_cache(app, env, account, container, None)
 
 
+def _decode_cached_info(info):
+    """
+    Encode the unicode values JSON gives back from memcache as utf-8 in
+    place.
+    """
+    for key in info:
+        if isinstance(info[key], six.text_type):
+            info[key] = info[key].encode("utf-8")
+        if isinstance(info[key], dict):
+            for subkey, value in info[key].items():
+                if isinstance(value, six.text_type):
+                    info[key][subkey] = value.encode("utf-8")
+
+
 def _get_info_cache(app, env, account, container=None):
     """
-    Get the cached info from env or memcache (if used) in that order
+    Get the cached info from env, the worker's info cache or memcache (if
+    used) in that order
     Used for both account and container info
     A private function used by get_info
 
+    When container info has to come from memcache and the account info is
+    not in env yet, both are fetched in a single batch (if the cache client
+    supports get_many) and the account info is left in env for later
+    lookups during the same request.
+
     :param  app: the application object
     :param  env: the environment used by the current request
     :returns: the cached info or None if not cached
@@ -466,19 +671,29 @@ def _get_info_cache(app, env, account, container=None):
     cache_key, env_key = _get_cache_key(account, container)
     if env_key in env:
         return env[env_key]
-    memcache = getattr(app, 'memcache', None) or env.get('swift.cache')
-    if memcache:
-        info = memcache.get(cache_key)
+    info_cache = getattr(app, 'info_cache', None)
+    if info_cache:
+        info = info_cache.get(cache_key)
         if info:
-            for key in info:
-                if isinstance(info[key], six.text_type):
-                    info[key] = info[key].encode("utf-8")
-                if isinstance(info[key], dict):
-                    for subkey, value in info[key].items():
-                        if isinstance(value, six.text_type):
-                            info[key][subkey] = value.encode("utf-8")
             env[env_key] = info
-        return info
+            return info
+    memcache = getattr(app, 'memcache', None) or env.get('swift.cache')
+    if memcache:
+        keys = [(cache_key, env_key)]
+        account_keys = _get_cache_key(account, None)
+        if container and account_keys[1] not in env and \
+                hasattr(memcache, 'get_many'):
+            keys.append(account_keys)
+            infos = memcache.get_many([key for key, _junk in keys])
+        else:
+            infos = [memcache.get(cache_key)]
+        for (info_cache_key, info_env_key), info in zip(keys, infos):
+            if info:
+                _decode_cached_info(info)
+                if info_cache:
+                    info_cache.set(info_cache_key, info)
+                env[info_env_key] = info
+        return infos[0]
     return None
 
 
@@ -992,6 +1207,8 @@ class ResumingGetter(object):
                 possible_source = conn.getresponse()
                 # See NOTE: swift_conn at top of file about this.
                 possible_source.swift_conn = conn
+            self.app.set_node_response_timing(
+                node, time.time() - start_node_timing, self.server_type)
         except (Exception, Timeout):
             self.app.exception_occurred(
                 node, self.server_type,
@@ -1062,7 +1279,7 @@ class ResumingGetter(object):
         for node in nodes:
             pile.spawn(self._make_node_request, node, node_timeout,
                        self.app.logger.thread_locals)
-            _timeout = self.app.concurrency_timeout \
+            _timeout = self.app.get_concurrency_timeout(self.server_type) \
                 if pile.inflight < self.concurrency else None
             if pile.waitfirst(_timeout):
                 break
@@ -2500,7 +2500,7 @@ class ECObjectController(BaseObjectController):
         # the same as the request body sent proxy -> object, we
         # can't rely on the object-server to do the etag checking -
         # so we have to do it here.
-        etag_hasher = md5()
+        etag_hasher = self.app.md5_hasher()
 
         min_conns = policy.quorum
         putters = self._get_put_connections(
@@ -32,11 +32,12 @@ from swift.common.ring import Ring
 from swift.common.utils import cache_from_env, get_logger, \
     get_remote_client, split_path, config_true_value, generate_trans_id, \
     affinity_key_function, affinity_locality_predicate, list_from_csv, \
-    register_swift_info
+    register_swift_info, get_md5_hasher
 from swift.common.constraints import check_utf8, valid_api_version
 from swift.proxy.controllers import AccountController, ContainerController, \
     ObjectControllerRouter, InfoController
-from swift.proxy.controllers.base import get_container_info, NodeIter
+from swift.proxy.controllers.base import get_container_info, NodeIter, \
+    InfoCache, NodeScores
 from swift.common.swob import HTTPBadRequest, HTTPForbidden, \
     HTTPMethodNotAllowed, HTTPNotFound, HTTPPreconditionFailed, \
     HTTPServerError, HTTPException, Request, HTTPServiceUnavailable
@@ -97,6 +98,8 @@ class Application(object):
         self.client_chunk_size = int(conf.get('client_chunk_size', 65536))
         self.trans_id_suffix = conf.get('trans_id_suffix', '')
         self.post_quorum_timeout = float(conf.get('post_quorum_timeout', 0.5))
+        self.md5_hasher = get_md5_hasher(conf.get('md5_backend', 'hashlib'),
+                                         self.logger)
         self.error_suppression_interval = \
             int(conf.get('error_suppression_interval', 60))
         self.error_suppression_limit = \
@@ -118,6 +121,17 @@ class Application(object):
             policy.load_ring(swift_dir)
         self.obj_controller_router = ObjectControllerRouter()
         self.memcache = memcache
+        # an info_cache_size of 0 disables the in-process info cache
+        info_cache_size = int(conf.get('info_cache_size', 0))
+        if info_cache_size > 0:
+            self.info_cache = InfoCache(
+                maxsize=info_cache_size,
+                ttl=float(conf.get('info_cache_ttl', 5)),
+                negative_ttl=float(conf.get('info_cache_negative_ttl', 1)),
+                jitter=float(conf.get('info_cache_jitter', 0.2)),
+                logger=self.logger)
+        else:
+            self.info_cache = None
         mimetypes.init(mimetypes.knownfiles +
                        [os.path.join(swift_dir, 'mime.types')])
         self.account_autocreate = \
@@ -151,6 +165,11 @@ class Application(object):
             config_true_value(conf.get('concurrent_gets'))
         self.concurrency_timeout = float(conf.get('concurrency_timeout',
                                                   self.conn_timeout))
+        self.concurrency_timeout_percentile = float(
+            conf.get('concurrency_timeout_percentile', 0))
+        self.node_scores = NodeScores(
+            half_life=float(conf.get('node_score_half_life', 60)),
+            error_penalty=float(conf.get('node_score_error_penalty', 1)))
         value = conf.get('request_node_count', '2 * replicas').lower().split()
         if len(value) == 1:
             rnc_value = int(value[0])
@@ -438,6 +457,8 @@ class Application(object):
             nodes.sort(key=key_func)
         elif self.sorting_method == 'affinity':
             nodes.sort(key=self.read_affinity_sort_key)
+        elif self.sorting_method == 'score':
+            nodes.sort(key=self.node_scores.sort_key())
         return nodes
 
     def set_node_timing(self, node, timing):
@@ -447,6 +468,27 @@ class Application(object):
         timing = round(timing, 3)  # sort timings to the millisecond
         self.node_timings[node['ip']] = (timing, now + self.timing_expiry)
 
+    def set_node_response_timing(self, node, timing, server_type):
+        """
+        Record how long a backend took to respond to a request, from
+        connecting to having the response headers.
+        """
+        self.node_scores.record_timing(node, timing, server_type)
+
+    def get_concurrency_timeout(self, server_type):
+        """
+        Returns how long a concurrent GET waits for a response before asking
+        the next node: the concurrency_timeout_percentile of the recent
+        response times of the server type if configured, but never more
+        than concurrency_timeout.
+        """
+        if self.concurrency_timeout_percentile:
+            timeout = self.node_scores.percentile(
+                self.concurrency_timeout_percentile, server_type)
+            if timeout is not None:
+                return min(timeout, self.concurrency_timeout)
+        return self.concurrency_timeout
+
     def _error_limit_node_key(self, node):
         return "{ip}:{port}/{device}".format(**node)
 
@@ -487,6 +529,7 @@ class Application(object):
         error_stats = self._error_limiting.setdefault(node_key, {})
         error_stats['errors'] = self.error_suppression_limit + 1
         error_stats['last_error'] = time()
+        self.node_scores.record_error(node)
         self.logger.error(_('%(msg)s %(ip)s:%(port)s/%(device)s'),
                           {'msg': msg, 'ip': node['ip'],
                           'port': node['port'], 'device': node['device']})
@@ -496,6 +539,7 @@ class Application(object):
         error_stats = self._error_limiting.setdefault(node_key, {})
         error_stats['errors'] = error_stats.get('errors', 0) + 1
         error_stats['last_error'] = time()
+        self.node_scores.record_error(node)
 
     def error_occurred(self, node, msg):
         """